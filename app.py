@@ -1,89 +1,216 @@
 import streamlit as st
-import psycopg2
-from psycopg2 import Error
 import hashlib
-from streamlit_option_menu import option_menu
-import pandas as pd
-from sqlalchemy import create_engine
+import importlib
 from datetime import datetime
-import io
+import logging
 import os
-import re
-import toml
-
-# Carregar variáveis de ambiente
-
-username = st.secrets["database"]['user']
-password = st.secrets["database"]['password']
-host = st.secrets["database"]['host']
-database = st.secrets["database"]['name']
-port = st.secrets["database"]['port']
-
-# Verifique se todas as variáveis de ambiente estão carregadas
-if not all([username, password, host, port, database]):
-    st.error("Erro: Variáveis de ambiente do banco de dados não estão definidas corretamente.")
-    st.stop()
-
-# Configurações de conexão com o banco de dados para autenticação
-db_config = {
-    'host': host,
-    'port': port,
-    'user': username,
-    'password': password,
-    'database': database
-}
+import threading
+import time
+
+import consultas
+import db
+import metricas
+import paralelo
+import tendencias
+
+logger = logging.getLogger(__name__)
+
+# Módulos pesados (pandas, SQLAlchemy, pyarrow, openpyxl, xlsxwriter) e as páginas que
+# dependem deles só são importados depois do login: a tela de login não espera por eles
+# (o aquecimento em segundo plano já os carrega enquanto o usuário digita)
+if st.session_state.get('logged_in', False):
+    import pandas as pd
+    from streamlit_option_menu import option_menu
+
+    import busca_dominios
+    import cache
+    import dominios
+    import exportacao
+    import indice_canonico
+    import indice_targets
+    import ingestao
+    import pipeline_upload
+    import replica
+    import tipos
+
+# Módulos do bloco acima importados pelo aquecimento (o streamlit_option_menu fica de fora:
+# ele registra um componente e deve ser importado pela execução do script)
+MODULOS_PAGINAS = [
+    'pandas', 'busca_dominios', 'cache', 'dominios', 'exportacao',
+    'indice_canonico', 'indice_targets', 'ingestao', 'pipeline_upload', 'replica', 'tipos'
+]
+
+# Função para ler a seção de tendências dos secrets: 'views = true' e, opcionalmente,
+# 'intervalo' (segundos entre verificações de novos meses das visões materializadas)
+def config_tendencias():
+    return st.secrets.get("tendencias", {})
+
+# Função para manter a réplica sincronizada em segundo plano (uma thread por processo;
+# entre processos, a trava de arquivo garante uma única sincronização por vez)
+@st.cache_resource
+def iniciar_sincronizacao_replica():
+    import replica
+    intervalo = st.secrets.get("replica", {}).get("intervalo", 3600)
+
+    def sincronizar_periodicamente():
+        while True:
+            try:
+                replica.sincronizar()
+            except Exception:
+                logger.exception("Erro ao sincronizar a réplica local")
+            time.sleep(intervalo)
+
+    thread = threading.Thread(target=sincronizar_periodicamente, name="sincronizacao-replica", daemon=True)
+    thread.start()
+    return thread
+
+# Função para configurar a réplica local, se houver 'diretorio' na seção [replica] dos
+# secrets, e iniciar a sua sincronização (chamada após o login ou pelo aquecimento)
+def iniciar_replica():
+    diretorio = st.secrets.get("replica", {}).get("diretorio")
+    if not diretorio:
+        return
+    import replica
+    replica.configurar(diretorio)
+    iniciar_sincronizacao_replica()
+
+# Função para manter as visões de tendências em segundo plano (uma thread por processo;
+# entre processos, a trava consultiva do PostgreSQL garante uma atualização por vez)
+@st.cache_resource
+def iniciar_manutencao_tendencias():
+    intervalo = config_tendencias().get("intervalo", 3600)
 
-# Função de conexão com o PostgreSQL usando psycopg2
-def create_db_connection():
+    def manter_periodicamente():
+        # Import local: a thread pode ter sido iniciada antes do login
+        import cache
+        while True:
+            try:
+                situacao = tendencias.manter_views()
+                if situacao:
+                    usar_views_tendencias.clear()
+                if situacao == 'atualizadas':
+                    # A tabela recebeu um mês novo: os resultados em cache ficaram antigos
+                    cache.limpar(obter_cache_resultados())
+                    cache.limpar(obter_cache_indices())
+                    cache.limpar(obter_cache_etapas())
+            except Exception:
+                logger.exception("Erro ao manter as visões de tendências")
+            time.sleep(intervalo)
+
+    thread = threading.Thread(target=manter_periodicamente, name="manutencao-tendencias", daemon=True)
+    thread.start()
+    return thread
+
+# Tempo (em segundos) em cache da verificação das visões de tendências
+TTL_VIEWS_TENDENCIAS = 600
+
+# Função para verificar se as consultas de tendências podem usar as visões materializadas
+@st.cache_data(ttl=TTL_VIEWS_TENDENCIAS, show_spinner=False)
+def usar_views_tendencias():
+    if not config_tendencias().get("views", False):
+        return False
     try:
-        conn = psycopg2.connect(**db_config)
-        return conn
-    except Error as e:
-        st.error(f"Erro ao conectar ao banco de dados PostgreSQL: {e}")
-        return None
+        return tendencias.views_prontas()
+    except Exception:
+        logger.exception("Erro ao verificar as visões de tendências")
+        return False
+
+# Configurações padrão do aquecimento (podem ser sobrescritas na seção [aquecimento] dos secrets)
+CONFIG_AQUECIMENTO_PADRAO = {
+    'ativo': True,   # Aquecer o processo na primeira execução do app
+    'conexoes': 2    # Conexões do pool abertas antecipadamente (limitadas ao tamanho do pool)
+}
 
-# Função de conexão usando SQLAlchemy (para pandas)
+# Função para aquecer o processo em segundo plano (uma thread por processo): importa os
+# módulos das páginas e abre as primeiras conexões do pool enquanto a tela de login é exibida
 @st.cache_resource
-def get_engine():
-    try:
-        engine = create_engine(f"postgresql+psycopg2://{username}:{password}@{host}:{port}/{database}")
-        # Teste a conexão
-        engine.connect()
-        return engine
-    except Exception as e:
-        st.error(f"Erro ao conectar ao banco de dados: {e}")
+def iniciar_aquecimento():
+    config = {**CONFIG_AQUECIMENTO_PADRAO, **st.secrets.get("aquecimento", {})}
+
+    def aquecer():
+        inicio = time.perf_counter()
+        try:
+            for modulo in MODULOS_PAGINAS:
+                importlib.import_module(modulo)
+            iniciar_replica()
+            conexoes = db.aquecer(config['conexoes'])
+            logger.info("Aquecimento concluído em %.2fs (%d conexões abertas)", time.perf_counter() - inicio, conexoes)
+        except Exception:
+            logger.exception("Erro ao aquecer o processo")
+
+    thread = threading.Thread(target=aquecer, name="aquecimento", daemon=True)
+    thread.start()
+    return thread
+
+# Função para configurar o processo a partir dos secrets (executada no início de cada
+# execução do app; nada é conectado aqui, e as tarefas em segundo plano iniciam uma única vez)
+def configurar_aplicacao():
+    config_db = st.secrets["database"]
+    db_config = {
+        'host': config_db['host'],
+        'port': config_db['port'],
+        'user': config_db['user'],
+        'password': config_db['password'],
+        'database': config_db['name']
+    }
+
+    # Verifique se todas as variáveis de ambiente estão carregadas
+    if not all(db_config.values()):
+        st.error("Erro: Variáveis de ambiente do banco de dados não estão definidas corretamente.")
         st.stop()
 
-engine = get_engine()
+    # Registrar a configuração no pool compartilhado (nenhuma conexão é aberta aqui;
+    # as opções do pool podem ser ajustadas na seção [pool] dos secrets)
+    db.configurar(db_config, **st.secrets.get("pool", {}))
+
+    # Réplica local em Parquet (opcional): seção [replica] dos secrets com 'diretorio'
+    # e, opcionalmente, 'intervalo' (segundos entre verificações de novos meses)
+    # (o import da réplica carrega o pyarrow: antes do login, fica com o aquecimento)
+    if st.session_state.get('logged_in', False):
+        iniciar_replica()
+
+    # Visões materializadas de tendências (opcional): seção [tendencias] dos secrets
+    if config_tendencias().get("views", False):
+        iniciar_manutencao_tendencias()
+
+    # Instrumentação (opcional): seção [metricas] dos secrets com 'max_requisicoes',
+    # 'arquivo_prometheus' e 'arquivo_log'
+    metricas.configurar(**st.secrets.get("metricas", {}))
+
+    # Leituras concorrentes e pré-carregamento (opcional): seção [paralelo] dos secrets
+    # com 'max_leituras' e 'max_pre_carregamentos' (threads por processo)
+    paralelo.configurar(**st.secrets.get("paralelo", {}))
+
+    # Aquecimento em segundo plano (opcional): seção [aquecimento] dos secrets com
+    # 'ativo' e 'conexoes'
+    if st.secrets.get("aquecimento", {}).get("ativo", CONFIG_AQUECIMENTO_PADRAO['ativo']):
+        iniciar_aquecimento()
 
 # Função para autenticar usuários
 def login_user(username, password):
-    conn = create_db_connection()
-    if conn:
-        try:
+    try:
+        with metricas.etapa('login'), db.conexao_dbapi() as conn:
             cursor = conn.cursor()
             hashed_password = hashlib.sha256(password.encode()).hexdigest()
             query = "SELECT id FROM semrush_prod.users WHERE username = %s AND password = %s"
             cursor.execute(query, (username, hashed_password))
             result = cursor.fetchone()
             cursor.close()
-            conn.close()
-            if result:
-                st.session_state['logged_in'] = True
-                st.session_state['user_id'] = result[0]  # ID do usuário
-                st.session_state['username'] = username  # Salva o nome de usuário na sessão
-                return True
-            else:
-                return False
-        except Error as e:
-            st.error(f"Erro ao verificar as credenciais: {e}")
+        if result:
+            st.session_state['logged_in'] = True
+            st.session_state['user_id'] = result[0]  # ID do usuário
+            st.session_state['username'] = username  # Salva o nome de usuário na sessão
+            return True
+        else:
             return False
+    except db.erros() as e:
+        st.error(f"Erro ao verificar as credenciais: {e}")
+        return False
 
 # Função para criar um novo usuário
 def create_user(username, email, password, secret_question, secret_answer):
-    conn = create_db_connection()
-    if conn:
-        try:
+    try:
+        with metricas.etapa('cadastro'), db.conexao_dbapi() as conn:
             hashed_password = hashlib.sha256(password.encode()).hexdigest()
             hashed_secret_answer = hashlib.sha256(secret_answer.encode()).hexdigest()
             cursor = conn.cursor()
@@ -94,16 +221,14 @@ def create_user(username, email, password, secret_question, secret_answer):
             cursor.execute(query, (username, email, hashed_password, secret_question, hashed_secret_answer))
             conn.commit()
             cursor.close()
-            conn.close()
-            st.success("Usuário cadastrado com sucesso!")
-        except Error as e:
-            st.error(f"Erro ao inserir o usuário no banco de dados: {e}")
+        st.success("Usuário cadastrado com sucesso!")
+    except db.erros() as e:
+        st.error(f"Erro ao inserir o usuário no banco de dados: {e}")
 
 # Função para recuperação de senha
 def recover_password(username, secret_question, secret_answer, new_password):
-    conn = create_db_connection()
-    if conn:
-        try:
+    try:
+        with metricas.etapa('recuperar_senha'), db.conexao_dbapi() as conn:
             cursor = conn.cursor()
             query = """
             SELECT id FROM semrush_prod.users WHERE username = %s AND secret_question = %s AND secret_answer = %s
@@ -121,40 +246,330 @@ def recover_password(username, secret_question, secret_answer, new_password):
                 st.error("As informações fornecidas estão incorretas.")
 
             cursor.close()
-            conn.close()
-        except Error as e:
-            st.error(f"Erro ao recuperar a senha: {e}")
+    except db.erros() as e:
+        st.error(f"Erro ao recuperar a senha: {e}")
+
+# Tempo (em segundos) que o esquema da tabela permanece em cache
+TTL_ESQUEMA = 600
+
+# Função para ler nomes e tipos das colunas da tabela a partir do catálogo
+@metricas.medir('esquema', cacheado=True)
+@st.cache_data(ttl=TTL_ESQUEMA, show_spinner=False)
+def obter_esquema():
+    metricas.registrar_falha_cache()
+    query, params = consultas.montar_consulta_esquema()
+    with db.conexao() as connection:
+        return pd.read_sql(query, connection, params=params)
+
+# Função para obter a lista de colunas disponíveis (usada pelas duas páginas)
+def obter_colunas():
+    try:
+        return obter_esquema()['column_name'].tolist()
+    except Exception as e:
+        st.error(f"Erro ao buscar colunas do banco de dados: {e}")
+        return []
+
+# Função para invalidar o cache do esquema e os caches com dados da tabela
+# (resultados, índices e etapas do upload; ex.: após alterações na tabela)
+def invalidar_esquema():
+    obter_esquema.clear()
+    cache.limpar(obter_cache_resultados())
+    cache.limpar(obter_cache_indices())
+    cache.limpar(obter_cache_etapas())
+
+# Função para obter os tipos declarados no banco ({coluna: data_type}) usados na
+# normalização dos resultados e nos arquivos Parquet (vazio se o catálogo falhar)
+def tipos_tabela():
+    try:
+        esquema = obter_esquema()
+    except Exception:
+        logger.exception("Erro ao ler os tipos das colunas da tabela")
+        return {}
+    return dict(zip(esquema['column_name'], esquema['data_type']))
+
+# Função para obter o esquema do Arrow da tabela usado nos arquivos Parquet;
+# sem ele, a exportação unifica os tipos dos blocos
+def esquema_parquet_tabela():
+    tipos_db = tipos_tabela()
+    return exportacao.esquema_arrow(tipos_db) if tipos_db else None
+
+# Limite padrão (em MB) e tempo de vida (em segundos) do cache de resultados de consultas;
+# ajustáveis em [cache] limite_mb_resultados e ttl_resultados
+LIMITE_MB_CACHE_RESULTADOS = 256
+TTL_RESULTADOS = 600
+
+# Função para obter o cache de resultados de consultas (compartilhado pelo processo)
+# Os DataFrames guardados são compartilhados entre as sessões e não devem ser alterados
+@st.cache_resource
+def obter_cache_resultados():
+    config = st.secrets.get("cache", {})
+    limite_mb = config.get("limite_mb_resultados", LIMITE_MB_CACHE_RESULTADOS)
+    return cache.criar_cache(limite_mb * 1024 * 1024, ttl=config.get("ttl_resultados", TTL_RESULTADOS))
+
+# Limite padrão (em MB) e tempo de vida (em segundos) do cache dos índices em memória
+# (trigramas de 'targets' e aliases de domínios); ajustáveis em [cache] limite_mb_indices
+# e ttl_indices
+LIMITE_MB_CACHE_INDICES = 256
+TTL_INDICES = 600
+
+# Função para obter o cache dos índices (compartilhado pelo processo)
+# Separado dos resultados: os índices custam mais para construir e não devem ser
+# descartados pela rotatividade das consultas
+@st.cache_resource
+def obter_cache_indices():
+    config = st.secrets.get("cache", {})
+    limite_mb = config.get("limite_mb_indices", LIMITE_MB_CACHE_INDICES)
+    return cache.criar_cache(limite_mb * 1024 * 1024, ttl=config.get("ttl_indices", TTL_INDICES))
+
+# Função para executar uma consulta já normalizada (a chave do cache é o SQL + parâmetros)
+# Os tipos do resultado são normalizados uma vez, antes de ir para o cache
+@metricas.medir('consulta_dados', cacheado=True)
+def executar_consulta(query, params):
+    def consultar():
+        with db.conexao() as connection:
+            return tipos.normalizar_tipos(pd.read_sql(query, connection, params=params), tipos_tabela())
+
+    chave = cache.hash_conteudo('consulta', query, params)
+    return cache.memoizar(obter_cache_resultados(), chave, consultar)
+
+# Função para ler uma página da réplica local, com o mesmo cache de resultados das
+# consultas (a chave inclui a versão da réplica: uma nova sincronização gera novas chaves)
+@metricas.medir('consulta_replica', cacheado=True)
+def ler_replica(display_date, targets_filter, selected_columns, limite, apos, ordenar_por, descendente):
+    def ler():
+        return tipos.normalizar_tipos(replica.ler_dados(
+            display_date, targets_filter, selected_columns, limite, apos, ordenar_por, descendente
+        ), tipos_tabela())
+
+    chave = cache.hash_conteudo('replica', replica.versao(), display_date, targets_filter, selected_columns,
+                                limite, apos, ordenar_por, descendente)
+    return cache.memoizar(obter_cache_resultados(), chave, ler)
+
+# Função para consultar dados na réplica local (quando cobre a data) ou no PostgreSQL
+@metricas.medir('dados')
+def _consultar_dados(display_date, targets_filter, selected_columns, limite, apos,
+                     ordenar_por=None, descendente=False):
+    if replica.cobre(display_date):
+        return ler_replica(display_date, targets_filter, selected_columns, limite, apos, ordenar_por, descendente)
+    query, params = consultas.montar_consulta_dados(
+        display_date=display_date,
+        targets_filter=targets_filter,
+        selected_columns=selected_columns,
+        limite=limite,
+        apos=apos,
+        ordenar_por=ordenar_por,
+        descendente=descendente
+    )
+    return executar_consulta(query, params)
+
+# Função para obter os dados de uma data sem filtro de targets junto com um índice
+# de trigramas sobre 'targets' (construído uma vez por consulta e versão dos dados).
+# O índice é None quando o resultado não cabe no limite de linhas.
+@metricas.medir('dados_indexados', cacheado=True)
+def _dados_indexados(display_date, selected_columns, limite, versao):
+    def construir():
+        base = _consultar_dados(display_date, None, list(selected_columns), limite, None)
+        if consultas.proximo_cursor(base, limite) is not None:
+            return base, None
+        return base, indice_targets.construir_indice(base['targets'])
+
+    chave = cache.hash_conteudo('dados_indexados', display_date, selected_columns, limite, versao)
+    return cache.memoizar(obter_cache_indices(), chave, construir)
 
 # Função para buscar dados (pandas + SQLAlchemy)
-@st.cache_data
-def get_data(display_date=None, targets_filter=None, selected_columns=None):
-    try:
-        query = "SELECT * FROM semrush_prod.traffic_analytics_month"
-        with engine.connect() as connection:
-            df = pd.read_sql(query, connection)
+# Filtros, projeção de colunas, limite e paginação são resolvidos no PostgreSQL
+# (ou na réplica local); com data selecionada, o filtro de targets usa o índice.
+# Os erros não são exibidos aqui (a busca roda no pool de leituras): ver resultado_leitura
+def get_data(display_date=None, targets_filter=None, selected_columns=None,
+             limite=consultas.LIMITE_PADRAO, apos=None, ordenar_por=None, descendente=False):
+    df = None
+    ordem_padrao = ordenar_por in (None, consultas.CHAVE_PAGINACAO[0]) and not descendente
+    if display_date and targets_filter and apos is None and ordem_padrao:
+        base, indice = _dados_indexados(
+            display_date, tuple(selected_columns or ()), consultas.LIMITE_PADRAO, replica.versao()
+        )
+        if indice is not None:
+            with metricas.etapa('filtro_indice') as registro:
+                df = base.iloc[indice_targets.linhas(indice, targets_filter)[:limite]]
+                registro['linhas'] = len(df)
+    if df is None:
+        df = _consultar_dados(
+            display_date, targets_filter, selected_columns, limite, apos, ordenar_por, descendente
+        )
 
-        # Aplicar filtro de data se selecionado
-        if display_date:
-            df['display_date'] = pd.to_datetime(df['display_date'], errors='coerce').dt.date
-            df = df[df['display_date'] == display_date]
+    # Cursor para buscar a próxima página (None quando não há mais linhas)
+    cursor = consultas.proximo_cursor(df, limite, ordenar_por)
 
-        # Aplicar filtro de targets se selecionado
-        if targets_filter:
-            df = df[df['targets'].str.contains(targets_filter, case=False, na=False)]
+    # Remover as colunas da chave de paginação que não foram selecionadas
+    # (sempre em um novo DataFrame: o resultado em cache não é alterado)
+    if selected_columns:
+        df = df[[col for col in df.columns if col in selected_columns]]
+    else:
+        df = df.copy(deep=False)
 
-        # Filtrar colunas selecionadas
-        if selected_columns:
-            df = df[selected_columns]
+    df.attrs['proximo_cursor'] = cursor
+    return df
 
-        return df
+# Função para esperar uma leitura disparada no pool, exibindo o erro na página
+# (retorna 'padrao' em caso de erro)
+def resultado_leitura(futuro, mensagem, padrao):
+    try:
+        return futuro.result()
     except Exception as e:
-        st.error(f"Erro ao buscar dados do banco: {e}")
-        return pd.DataFrame()  # Retorna DataFrame vazio em caso de erro
+        st.error(f"{mensagem}: {e}")
+        return padrao
+
+# Função para obter a mesma data no mês anterior
+def mes_anterior(data):
+    return (pd.Timestamp(data) - pd.DateOffset(months=1)).date()
+
+# Função para contar as linhas que atendem aos filtros; retorna (total, exato)
+@metricas.medir('contagem', cacheado=True)
+@st.cache_data(ttl=TTL_ESQUEMA, show_spinner=False)
+def _contar_linhas(display_date, targets_filter, versao):
+    metricas.registrar_falha_cache()
+    if replica.cobre(display_date):
+        return replica.contar(display_date, targets_filter), True
+    query, params, exato = consultas.montar_consulta_contagem(display_date, targets_filter)
+    with db.conexao() as connection:
+        return int(connection.exec_driver_sql(query, params).scalar() or 0), exato
+
+# Função para contar as linhas com os filtros normalizados
+# (os erros não são exibidos aqui, como em get_data)
+def contar_linhas(display_date=None, targets_filter=None):
+    display_date, targets_filter, _ = consultas.normalizar_filtros(display_date, targets_filter)
+    return _contar_linhas(display_date, targets_filter, replica.versao())
+
+# Função para listar as colunas pelas quais a grade pode ser ordenada no servidor
+# (colunas NOT NULL que iniciam algum índice da tabela; vale também para a réplica)
+@metricas.medir('colunas_indexadas', cacheado=True)
+@st.cache_data(ttl=TTL_ESQUEMA, show_spinner=False)
+def obter_colunas_indexadas():
+    metricas.registrar_falha_cache()
+    query, params = consultas.montar_consulta_colunas_indexadas()
+    with db.conexao() as connection:
+        return pd.read_sql(query, connection, params=params)['column_name'].tolist()
+
+def obter_colunas_ordenaveis():
+    try:
+        indexadas = set(obter_colunas_indexadas())
+    except Exception as e:
+        st.error(f"Erro ao buscar os índices da tabela: {e}")
+        indexadas = set()
+    colunas = [col for col in obter_colunas() if col in indexadas]
+    return colunas or [consultas.CHAVE_PAGINACAO[0]]
+
+# Função para obter o índice dos valores distintos de 'targets' (autocompletar)
+@metricas.medir('indice_targets', cacheado=True)
+def _indice_targets_distintos(versao):
+    def construir():
+        if replica.cobre():
+            valores = replica.ler_targets_distintos()
+        else:
+            query, params = consultas.montar_consulta_targets_distintos()
+            with db.conexao() as connection:
+                valores = pd.read_sql(query, connection, params=params)['targets']
+        return indice_targets.construir_indice(valores)
+
+    return cache.memoizar(obter_cache_indices(), cache.hash_conteudo('indice_targets', versao), construir)
+
+# Função para sugerir domínios a partir do texto digitado
+def sugerir_targets(texto, limite=10):
+    try:
+        return indice_targets.sugerir(_indice_targets_distintos(replica.versao()), texto, limite)
+    except Exception as e:
+        st.error(f"Erro ao buscar sugestões de domínios: {e}")
+        return []
+
+# Função para obter o índice de aliases dos domínios (hosts e seções -> 'targets' canônico),
+# construído sobre os mesmos valores distintos do índice de sugestões
+@metricas.medir('indice_canonico', cacheado=True)
+def _indice_canonico(versao):
+    return cache.memoizar(
+        obter_cache_indices(),
+        cache.hash_conteudo('indice_canonico', versao),
+        lambda: indice_canonico.construir_indice(_indice_targets_distintos(versao)['valores'])
+    )
+
+# Função para obter o índice de aliases (None em caso de erro: vale só a extração das URLs)
+def obter_indice_canonico():
+    try:
+        return _indice_canonico(replica.versao())
+    except Exception as e:
+        st.error(f"Erro ao carregar o índice de domínios: {e}")
+        return None
+
+# Função para perguntar se os domínios devem ser normalizados pelo índice de aliases
+def opcao_normalizar_dominios():
+    return st.checkbox(
+        "Normalizar domínios (subdomínios como m., amp. e www2., seções e domínios-pai)",
+        value=True,
+        help="Leva cada URL ao domínio conhecido da tabela; sem esta opção, vale só a extração das URLs"
+    )
+
+# Função para aplicar a sugestão escolhida ao filtro de targets
+def aplicar_sugestao_targets():
+    sugestao = st.session_state.get('sugestao_targets')
+    if sugestao:
+        st.session_state['filtro_targets'] = sugestao
+
+# Função para ler em blocos todas as linhas que atendem aos filtros (sem limite de linhas)
+def blocos_filtrados(display_date=None, targets_filter=None, selected_columns=None):
+    query, params = consultas.montar_consulta_dados(
+        display_date=display_date,
+        targets_filter=targets_filter,
+        selected_columns=selected_columns,
+        limite=None
+    )
+    for bloco in exportacao.ler_em_blocos(query, params):
+        if selected_columns:
+            bloco = bloco[[col for col in bloco.columns if col in selected_columns]]
+        yield bloco
+
+# Função para gerar um arquivo de exportação registrando linhas e bytes gravados
+def exportar_medido(blocos, formato, esquema=None):
+    with metricas.etapa('exportacao', formato=formato) as registro:
+        arquivo = exportacao.exportar(metricas.contar_blocos(blocos, registro), formato, esquema)
+        registro['bytes'] = os.fstat(arquivo.fileno()).st_size
+        return arquivo
+
+# Função para gerar o conteúdo de um download sob demanda (bytes; o arquivo temporário é fechado)
+def gerar_download(gerar_blocos, formato, esquema=None):
+    with exportar_medido(gerar_blocos(), formato, esquema) as arquivo:
+        return arquivo.read()
+
+# Função para exibir um botão de download com geração sob demanda
+# (o arquivo é gravado em disco, bloco a bloco, somente quando o usuário clica;
+# 'esquema' fixa os tipos do Parquet)
+def botao_download(container, label, gerar_blocos, nome_base, formato, esquema=None):
+    extensao, mime = exportacao.FORMATOS[formato]
+    container.download_button(
+        label=label,
+        data=lambda: gerar_download(gerar_blocos, formato, esquema),
+        file_name=f'{nome_base}.{extensao}',
+        mime=mime,
+        on_click='ignore'
+    )
 
 # Função principal para exibir a interface de dados
 def visualizacao_de_dados():
     st.title("Visualização de Dados - Banco de Dados")
 
+    modo = st.radio("Modo:", options=["Mês", "Tendências"], horizontal=True)
+    if modo == "Tendências":
+        visualizacao_tendencias()
+        return
+
+    # Leituras independentes usadas adiante na página começam juntas: o esquema (filtros),
+    # os índices (ordenação da grade) e o índice de sugestões do filtro já digitado.
+    # As chamadas seguintes esperam a leitura em andamento no cache, sem repeti-la
+    leituras = {'esquema': obter_esquema}
+    if st.session_state.get('filtros_aplicados'):
+        leituras['indexadas'] = obter_colunas_indexadas
+    if st.session_state.get('filtro_targets'):
+        leituras['sugestoes'] = lambda: _indice_targets_distintos(replica.versao())
+    paralelo.iniciar_varias(leituras)
+
     # Container para os filtros
     with st.container():
         col1, col2 = st.columns([1, 3])
@@ -172,17 +587,22 @@ def visualizacao_de_dados():
             targets_filter = st.text_input(
                 "Filtro de Targets (Domínios):",
                 value="",
-                help="Digite o domínio ou parte dele para buscar (ex: 'uol')"
+                help="Digite o domínio ou parte dele para buscar (ex: 'uol')",
+                key='filtro_targets'
             )
 
-        # Busca inicial para obter todas as colunas
-        try:
-            initial_query = "SELECT * FROM semrush_prod.traffic_analytics_month"
-            initial_df = pd.read_sql(initial_query, engine)
-            available_columns = initial_df.columns.tolist()
-        except Exception as e:
-            st.error(f"Erro ao buscar colunas do banco de dados: {e}")
-            available_columns = []
+            # Sugestões de domínios para o texto digitado
+            sugestoes = sugerir_targets(targets_filter) if targets_filter else []
+            if sugestoes:
+                st.selectbox(
+                    "Sugestões de domínios:",
+                    options=[''] + sugestoes,
+                    key='sugestao_targets',
+                    on_change=aplicar_sugestao_targets
+                )
+
+        # Colunas disponíveis a partir do esquema em cache
+        available_columns = obter_colunas()
 
         # Definir as colunas padrão
         default_columns = ['targets', 'display_date', 'rank', 'users', 'bounce_rate']
@@ -195,100 +615,440 @@ def visualizacao_de_dados():
             default=default_columns
         )
 
-        # Botão para aplicar filtros
-        apply_filters = st.button("Aplicar Filtros")
+        # Botão para aplicar filtros (os filtros aplicados ficam na sessão para a paginação)
+        if st.button("Aplicar Filtros"):
+            st.session_state['filtros_aplicados'] = {
+                'display_date': display_date,
+                'targets_filter': targets_filter,
+                'selected_columns': columns
+            }
+
+    # Exibir os dados com base nos filtros aplicados
+    filtros = st.session_state.get('filtros_aplicados')
+    if filtros:
+        grade_paginada(**filtros)
+    else:
+        st.info("Aplique os filtros para visualizar os dados.")
 
-    # Buscar os dados com base nos filtros aplicados
-    if apply_filters:
-        with st.spinner("Buscando dados..."):
-            data = get_data(display_date=display_date, targets_filter=targets_filter, selected_columns=columns)
+# Quantidade padrão de meses do período de tendências e de domínios no resumo
+MESES_TENDENCIAS = 12
+LIMITE_RESUMO_TENDENCIAS = 1000
 
-        if not data.empty:
-            st.success(f"Dados filtrados com sucesso!")
-            st.dataframe(data)
+# Função para buscar as tendências no período: (resumo por domínio, totais por mês)
+# As agregações são feitas no banco; só o resultado agregado chega ao pandas
+def get_tendencias(data_inicio, data_fim, targets_filter=None, limite=LIMITE_RESUMO_TENDENCIAS):
+    try:
+        usar_views = usar_views_tendencias()
+        # As duas agregações são independentes e rodam ao mesmo tempo
+        leituras = paralelo.iniciar_varias({
+            'resumo': lambda: executar_consulta(*consultas.montar_consulta_resumo_tendencias(
+                data_inicio, data_fim, targets_filter, limite, usar_views
+            )),
+            'totais': lambda: executar_consulta(*consultas.montar_consulta_totais_tendencias(
+                data_inicio, data_fim, targets_filter, usar_views
+            ))
+        })
+        return leituras['resumo'].result(), leituras['totais'].result()
+    except Exception as e:
+        st.error(f"Erro ao buscar as tendências: {e}")
+        return pd.DataFrame(), pd.DataFrame()
 
-            # Opções de download
-            try:
-                csv = data.to_csv(index=False).encode('utf-8')
-                excel = io.BytesIO()
-                with pd.ExcelWriter(excel, engine='xlsxwriter') as writer:
-                    data.to_excel(writer, index=False, sheet_name='Dados')
-                excel.seek(0)
-
-                # Botões de download
-                col1, col2 = st.columns(2)
-                col1.download_button(
-                    label="Baixar dados filtrados em CSV",
-                    data=csv,
-                    file_name=f'dados_filtrados.csv',
-                    mime='text/csv'
-                )
-                col2.download_button(
-                    label="Baixar dados filtrados em XLSX",
-                    data=excel,
-                    file_name=f'dados_filtrados.xlsx',
-                    mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-                )
-            except Exception as e:
-                st.error(f"Erro ao gerar arquivos de download: {e}")
-        else:
-            st.warning("Nenhum dado encontrado com os filtros aplicados.")
-    else:
-        st.info("Aplique os filtros para visualizar os dados.")
+# Função para buscar a série mensal de alguns domínios no período
+def get_series_tendencias(data_inicio, data_fim, targets):
+    try:
+        return executar_consulta(*consultas.montar_consulta_series_tendencias(
+            data_inicio, data_fim, sorted(targets), usar_views_tendencias()
+        ))
+    except Exception as e:
+        st.error(f"Erro ao buscar as séries dos domínios: {e}")
+        return pd.DataFrame()
 
-# Função para extrair domínio das URLs
-def extrair_dominio(url):
-    if not isinstance(url, str):
-        return None
-    # Verificar se a URL é do G1
-    if 'g1.globo.com' in url:
-        # Regex para verificar se é uma página específica do estado
-        match_estado = re.search(r'g1\.globo\.com/([a-z]{2})/', url)
-        if match_estado:
-            estado = match_estado.group(1)
-            return f"g1.globo.com/{estado}"  # Retorna o estado específico
-        else:
-            return 'g1.globo.com'  # Caso contrário, retorna o domínio geral
-    else:
-        # Regex para extrair o domínio principal e suas terminações
-        match = re.search(r'https?://(?:www\d*\.)?([a-zA-Z0-9-]+(?:\.[a-zA-Z]{2,})+)', url)
-        if match:
-            return match.group(1)  # Retorna o domínio principal
-        return None
+# Função para exibir o modo de tendências: totais por mês, resumo por domínio
+# no período e a série mensal dos domínios escolhidos
+def visualizacao_tendencias():
+    with st.container():
+        col1, col2, col3 = st.columns([2, 2, 1])
+
+        hoje = datetime.today().date()
+        inicio_padrao = (pd.Timestamp(hoje) - pd.DateOffset(months=MESES_TENDENCIAS - 1)).date().replace(day=1)
+        with col1:
+            periodo = st.date_input(
+                "Período:",
+                value=(inicio_padrao, hoje),
+                help="Selecione o mês inicial e o mês final"
+            )
+        with col2:
+            targets_filter = st.text_input(
+                "Filtro de Targets (Domínios):",
+                value="",
+                help="Digite o domínio ou parte dele para buscar (ex: 'uol')",
+                key='filtro_tendencias'
+            )
+        with col3:
+            limite = st.number_input(
+                "Domínios no resumo:",
+                min_value=10,
+                max_value=consultas.LIMITE_PADRAO,
+                value=LIMITE_RESUMO_TENDENCIAS,
+                step=100
+            )
+
+        if st.button("Aplicar Filtros", key='aplicar_tendencias'):
+            if len(periodo) != 2:
+                st.warning("Selecione a data inicial e a data final do período.")
+            else:
+                st.session_state['tendencias_aplicadas'] = {
+                    'data_inicio': periodo[0].replace(day=1),
+                    'data_fim': periodo[1],
+                    'targets_filter': targets_filter,
+                    'limite': int(limite)
+                }
+
+    filtros = st.session_state.get('tendencias_aplicadas')
+    if not filtros:
+        st.info("Aplique os filtros para visualizar as tendências.")
+        return
+
+    with st.spinner("Calculando tendências..."):
+        resumo, totais = get_tendencias(**filtros)
+
+    if resumo.empty:
+        st.warning("Nenhum dado encontrado no período selecionado.")
+        return
+
+    # Totais por mês (todos os domínios que atendem ao filtro)
+    st.subheader("Totais por mês")
+    st.line_chart(totais, x='display_date', y='soma_users')
+    st.dataframe(totais, hide_index=True)
+
+    # Resumo por domínio no período (ordenado pela soma de users)
+    st.subheader("Resumo por domínio")
+    st.dataframe(resumo, hide_index=True)
+
+    colunas_download = st.columns(len(exportacao.FORMATOS))
+    for coluna, formato in zip(colunas_download, exportacao.FORMATOS):
+        botao_download(
+            coluna,
+            f"Baixar resumo em {formato}",
+            lambda: exportacao.blocos_dataframe(resumo),
+            'tendencias_resumo',
+            formato
+        )
+
+    # Série mensal dos domínios escolhidos (padrão: os cinco maiores do resumo)
+    st.subheader("Série mensal por domínio")
+    escolhidos = st.multiselect(
+        "Domínios:",
+        options=resumo['targets'].tolist(),
+        default=resumo['targets'].head(5).tolist()
+    )
+    if escolhidos:
+        series = get_series_tendencias(filtros['data_inicio'], filtros['data_fim'], escolhidos)
+        if not series.empty:
+            metrica = st.radio("Métrica:", options=['users', 'rank', 'crescimento_users'], horizontal=True)
+            grafico = series.pivot(index='display_date', columns='targets', values=metrica)
+            st.line_chart(grafico)
+            st.dataframe(series, hide_index=True)
+
+# Opções de linhas por página da grade
+TAMANHOS_PAGINA = [50, 100, 500, 1000]
+
+# Função para voltar à primeira página da grade
+def reiniciar_grade():
+    st.session_state['grade'] = None
+
+# Função para navegar entre as páginas da grade
+def mudar_pagina(delta):
+    grade = st.session_state.get('grade')
+    if grade:
+        grade['pagina'] = max(0, grade['pagina'] + delta)
+
+# Função para pré-carregar em segundo plano as leituras mais prováveis depois da página
+# atual: a próxima página e a primeira página (com a contagem) do mês anterior
+def pre_carregar_grade(parametros, proximo):
+    if proximo is not None:
+        paralelo.pre_carregar(
+            cache.hash_conteudo('pagina', parametros, proximo), get_data, apos=proximo, **parametros
+        )
+    if parametros['display_date']:
+        anteriores = {**parametros, 'display_date': mes_anterior(parametros['display_date'])}
+        paralelo.pre_carregar(cache.hash_conteudo('pagina', anteriores, None), get_data, **anteriores)
+        paralelo.pre_carregar(
+            cache.hash_conteudo('contagem', anteriores['display_date'], anteriores['targets_filter']),
+            contar_linhas, anteriores['display_date'], anteriores['targets_filter']
+        )
+
+# Função para exibir a grade paginada no servidor
+# Cada página é buscada por chave (keyset) a partir do cursor da página anterior;
+# somente a página visível é enviada ao navegador e a seguinte fica pré-carregada
+def grade_paginada(display_date=None, targets_filter=None, selected_columns=None):
+    # A contagem não depende da ordenação nem da página: começa antes dos widgets da grade
+    contagem = paralelo.iniciar(contar_linhas, display_date, targets_filter)
+
+    col1, col2, col3 = st.columns([2, 1, 1])
+    ordenar_por = col1.selectbox(
+        "Ordenar por:",
+        options=obter_colunas_ordenaveis(),
+        on_change=reiniciar_grade
+    )
+    descendente = col2.radio(
+        "Ordem:",
+        options=["Crescente", "Decrescente"],
+        horizontal=True,
+        on_change=reiniciar_grade
+    ) == "Decrescente"
+    tamanho = col3.selectbox(
+        "Linhas por página:",
+        options=TAMANHOS_PAGINA,
+        index=1,
+        on_change=reiniciar_grade
+    )
+
+    # Reiniciar a paginação quando os filtros ou a ordenação mudam
+    chave = (
+        consultas.normalizar_filtros(display_date, targets_filter, selected_columns),
+        ordenar_por, descendente, tamanho
+    )
+    grade = st.session_state.get('grade')
+    if not grade or grade['chave'] != chave:
+        grade = {'chave': chave, 'pagina': 0, 'cursores': [None]}
+        st.session_state['grade'] = grade
+
+    parametros = {
+        'display_date': display_date,
+        'targets_filter': targets_filter,
+        'selected_columns': selected_columns,
+        'limite': tamanho,
+        'ordenar_por': ordenar_por,
+        'descendente': descendente
+    }
+
+    # Garantir que a página pedida não passe da última disponível
+    grade['pagina'] = min(grade['pagina'], len(grade['cursores']) - 1)
+    pagina = grade['pagina']
+
+    # A página e a contagem são lidas ao mesmo tempo
+    with st.spinner("Buscando dados..."):
+        dados = paralelo.iniciar(get_data, apos=grade['cursores'][pagina], **parametros)
+        data = resultado_leitura(dados, "Erro ao buscar dados do banco", pd.DataFrame())
+        total, exato = resultado_leitura(contagem, "Erro ao contar as linhas", (0, False))
+
+    if data.empty:
+        st.warning("Nenhum dado encontrado com os filtros aplicados.")
+        return
+
+    # Registrar o cursor da próxima página e pré-carregá-la (e o mês anterior) no cache
+    proximo = data.attrs.get('proximo_cursor')
+    if proximo is not None and len(grade['cursores']) == pagina + 1:
+        grade['cursores'].append(proximo)
+    pre_carregar_grade(parametros, proximo)
+
+    total_paginas = max(-(-total // tamanho), pagina + 1)
+    prefixo_total = "" if exato else "aprox. "
+    st.success(f"Dados filtrados com sucesso! {prefixo_total}{total} linhas encontradas.")
+    st.dataframe(data)
+
+    nav1, nav2, nav3 = st.columns([1, 2, 1])
+    nav1.button("◀ Anterior", on_click=mudar_pagina, args=(-1,), disabled=pagina == 0)
+    nav2.write(f"Página {pagina + 1} de {prefixo_total}{total_paginas}")
+    nav3.button("Próxima ▶", on_click=mudar_pagina, args=(1,), disabled=proximo is None)
+
+    # Opções de download: os arquivos só são gerados quando o botão é clicado,
+    # lendo do banco em blocos todas as linhas que atendem aos filtros
+    def gerar_blocos():
+        return blocos_filtrados(display_date, targets_filter, selected_columns)
+
+    esquema = esquema_parquet_tabela()
+    colunas_download = st.columns(len(exportacao.FORMATOS))
+    for coluna, formato in zip(colunas_download, exportacao.FORMATOS):
+        botao_download(
+            coluna,
+            f"Baixar dados filtrados em {formato}",
+            gerar_blocos,
+            'dados_filtrados',
+            formato,
+            esquema
+        )
+
+# Função para buscar informações de domínios com cache por conjunto de domínios e data
+# (o hash dos domínios forma a chave; a lista em si não entra no hash)
+@metricas.medir('busca_dominios', cacheado=True)
+def _buscar_info_cacheado(chave, dominios, colunas, display_date):
+    return cache.memoizar(
+        obter_cache_resultados(),
+        cache.hash_conteudo('dominios', chave, colunas, display_date),
+        lambda: tipos.normalizar_tipos(
+            busca_dominios.buscar_info_dominios(dominios, list(colunas), display_date), tipos_tabela()
+        )
+    )
 
 # Função para buscar informações do banco de dados com base no domínio e na data
-@st.cache_data
-def buscar_info_dominio(dominios, db_columns, display_date):
+def buscar_info_dominio(dominios, db_columns, display_date=None):
     try:
-        # Escapar aspas simples para evitar SQL injection
-        dominios_escapados = [dom.replace("'", "''") for dom in dominios]
-        # Criação de placeholders para parâmetros
-        placeholders = ', '.join([f"'{d}'" for d in dominios_escapados])
-        columns_str = ', '.join(db_columns)
-        # Formatar a data para o formato SQL (assumindo YYYY-MM-DD)
-        display_date_str = display_date.strftime('%Y-%m-%d')
-        query = f"""
-            SELECT dominio, {columns_str}
-            FROM semrush_prod.traffic_analytics_month
-            WHERE dominio IN ({placeholders})
-            AND display_date = '{display_date_str}'
-        """
-        df = pd.read_sql(query, engine)
-        return df
+        dominios = sorted(set(d for d in dominios if d))
+        chave = busca_dominios.chave_dominios(dominios)
+        display_date = consultas.valor_parametro(display_date) if display_date else None
+        return _buscar_info_cacheado(chave, dominios, tuple(db_columns), display_date)
     except Exception as e:
         st.error(f"Erro ao buscar informações do domínio: {e}")
         return pd.DataFrame()
-    
-# Função que busca informações no banco de dados com filtro por display_date
-def buscar_info_dominio(dominios, colunas, display_date=None):
-    query = "SELECT * FROM semrush_prod.traffic_analytics_month WHERE targets IN ({})".format(
-        ', '.join(["'{}'".format(d) for d in dominios])
+
+# Função para pré-carregar em segundo plano a busca dos mesmos domínios no mês anterior
+def pre_carregar_busca_mes_anterior(dominios, db_columns, display_date):
+    dominios = sorted(set(d for d in dominios if d))
+    chave = busca_dominios.chave_dominios(dominios)
+    anterior = consultas.valor_parametro(mes_anterior(display_date))
+    paralelo.pre_carregar(
+        cache.hash_conteudo('dominios', chave, tuple(db_columns), anterior),
+        _buscar_info_cacheado, chave, dominios, tuple(db_columns), anterior
     )
-    
-    if display_date:
-        query += " AND display_date = '{}'".format(display_date)
 
-    return pd.read_sql(query, engine)
+# Função para buscar informações de todos os domínios em um período (uma linha por domínio e mês)
+@metricas.medir('busca_dominios_periodo', cacheado=True)
+def buscar_info_dominio_periodo(dominios, db_columns, data_inicio, data_fim):
+    try:
+        dominios = sorted(set(d for d in dominios if d))
+        data_inicio = consultas.valor_parametro(data_inicio)
+        data_fim = consultas.valor_parametro(data_fim)
+        return cache.memoizar(
+            obter_cache_resultados(),
+            cache.hash_conteudo('dominios_periodo', busca_dominios.chave_dominios(dominios),
+                                tuple(db_columns), data_inicio, data_fim),
+            lambda: tipos.normalizar_tipos(busca_dominios.buscar_info_dominios_periodo(
+                dominios, list(db_columns), data_inicio, data_fim
+            ), tipos_tabela())
+        )
+    except Exception as e:
+        st.error(f"Erro ao buscar informações dos domínios no período: {e}")
+        return pd.DataFrame()
+
+# Formatos do resultado de uma busca por período: nome exibido -> formato
+FORMATOS_PERIODO = {
+    "Largo (uma coluna por mês)": 'largo',
+    "Longo (uma linha por mês)": 'longo',
+}
+
+# Limite padrão (em MB) e tempo de vida (em segundos) do cache das etapas do upload;
+# ajustáveis em [cache] limite_mb_etapas e ttl_etapas
+LIMITE_MB_CACHE_ETAPAS = 512
+TTL_ETAPAS = 600
+
+# Função para obter o cache das etapas do upload (compartilhado pelo processo)
+# As etapas guardam respostas do banco: expiram como os resultados de consultas e são
+# descartadas junto com eles
+@st.cache_resource
+def obter_cache_etapas():
+    config = st.secrets.get("cache", {})
+    limite_mb = config.get("limite_mb_etapas", LIMITE_MB_CACHE_ETAPAS)
+    return cache.criar_cache(limite_mb * 1024 * 1024, ttl=config.get("ttl_etapas", TTL_ETAPAS))
+
+# Tamanho (em bytes) a partir do qual o upload é processado em blocos por padrão
+LIMITE_UPLOAD_EM_MEMORIA = 50 * 1024 * 1024
+
+# Função para fechar (e assim remover do disco) o arquivo do último processamento em blocos
+def descartar_arquivo_processado():
+    processado = st.session_state.pop('arquivo_processado', None)
+    if processado:
+        processado[1].close()
+
+# Função para processar o arquivo enviado em blocos (leitura, extração, banco e gravação)
+def upload_em_blocos(uploaded_file):
+    try:
+        colunas_arquivo = ingestao.ler_colunas(uploaded_file, uploaded_file.name)
+    except Exception as e:
+        st.error(f"Ocorreu um erro ao ler o cabeçalho do arquivo: {e}")
+        return
+
+    url_columns = [col for col in colunas_arquivo if 'url' in col.lower()]
+    if not url_columns:
+        st.error("Nenhuma coluna com 'url' encontrada. Por favor, verifique o arquivo.")
+        return
+
+    selected_url_col = st.selectbox("Selecione a coluna que contém as URLs:", url_columns)
+    indice = obter_indice_canonico() if opcao_normalizar_dominios() else None
+
+    # Colunas do arquivo que serão mantidas na saída (as demais nem são lidas)
+    colunas_mantidas = st.multiselect(
+        "Selecione as colunas do arquivo que devem ser mantidas:",
+        options=[col for col in colunas_arquivo if col != selected_url_col],
+        default=[col for col in colunas_arquivo if col != selected_url_col]
+    )
+
+    display_date = st.date_input(
+        "Selecione a data para filtrar os dados:",
+        value=datetime.today().date(),
+        help="Selecione a data no formato YYYY-MM-DD"
+    )
+
+    available_db_columns = [col for col in obter_colunas() if col != 'targets']
+    db_columns_selected = st.multiselect(
+        "Selecione as colunas do banco de dados que deseja preencher no seu arquivo:",
+        options=available_db_columns,
+        default=[col for col in ['users', 'bounce_rate'] if col in available_db_columns]
+    )
+
+    download_format = st.radio(
+        "Selecione o formato para download:",
+        options=list(exportacao.FORMATOS)
+    )
+
+    if not db_columns_selected:
+        st.warning("Por favor, selecione pelo menos uma coluna do banco de dados para preencher.")
+        return
+
+    if st.button("Processar arquivo"):
+        # O arquivo do processamento anterior (deste ou de outro upload) é descartado
+        descartar_arquivo_processado()
+        barra = st.progress(0.0, text="Processando arquivo...")
+        try:
+            blocos = ingestao.ler_em_blocos(
+                uploaded_file,
+                uploaded_file.name,
+                usecols=[selected_url_col] + colunas_mantidas,
+                progresso=lambda fracao: barra.progress(fracao, text=f"Processando arquivo... {fracao:.0%}")
+            )
+            enriquecidos = ingestao.enriquecer_em_blocos(
+                blocos,
+                selected_url_col,
+                lambda dominios: buscar_info_dominio(dominios, db_columns_selected, display_date),
+                db_columns_selected,
+                extrair=(lambda urls: indice_canonico.canonicalizar(indice, urls)) if indice else dominios.extrair_dominios
+            )
+            st.session_state['arquivo_processado'] = (
+                uploaded_file.file_id,
+                exportar_medido(enriquecidos, download_format),
+                download_format
+            )
+            barra.progress(1.0, text="Arquivo processado com sucesso!")
+        except Exception as e:
+            st.error(f"Ocorreu um erro ao processar o arquivo: {e}")
+
+    # Oferecer o download do último processamento deste mesmo arquivo (o arquivo só
+    # é lido quando o botão é clicado); o de outro upload é fechado e removido
+    processado = st.session_state.get('arquivo_processado')
+    if processado and processado[0] != uploaded_file.file_id:
+        descartar_arquivo_processado()
+    elif processado:
+        _, arquivo, formato = processado
+        extensao, mime = exportacao.FORMATOS[formato]
+        try:
+            st.download_button(
+                label=f"Baixar arquivo preenchido em {formato}",
+                data=lambda: arquivo,
+                file_name=f'arquivo_preenchido.{extensao}',
+                mime=mime,
+                on_click='ignore'
+            )
+        except Exception as e:
+            st.error(f"Ocorreu um erro ao preparar o download: {e}")
+
+# Função para gerar (ou reaproveitar do cache) o arquivo final do upload
+def exportar_upload(cache_etapas, chave_mapeamento, df, formato):
+    with metricas.etapa('exportacao', cacheado=True, formato=formato) as registro:
+        conteudo = pipeline_upload.exportar(cache_etapas, chave_mapeamento, df, formato)[1]
+        registro['linhas'] = len(df)
+        registro['bytes'] = len(conteudo)
+        return conteudo
 
 def upload():
     st.title("Upload e Mapeamento de URLs")
@@ -306,14 +1066,37 @@ def upload():
 
     # Upload do arquivo
     uploaded_file = st.file_uploader("Faça o upload do seu arquivo (CSV ou XLSX)", type=['csv', 'xlsx'])
+    if uploaded_file is None:
+        descartar_arquivo_processado()
 
     if uploaded_file is not None:
+        # O esquema (colunas do banco) e o índice de domínios são lidos enquanto o arquivo é carregado
+        # (pré-carregamentos: ninguém espera por eles, então ficam fora da requisição da página)
+        paralelo.pre_carregar(cache.hash_conteudo('esquema'), obter_esquema)
+        paralelo.pre_carregar(cache.hash_conteudo('indice_canonico', replica.versao()), _indice_canonico, replica.versao())
+
+        # Arquivos grandes são processados em blocos, sem carregar tudo na memória
+        modo_streaming = st.checkbox(
+            "Processar em blocos (recomendado para arquivos grandes)",
+            value=uploaded_file.size > LIMITE_UPLOAD_EM_MEMORIA,
+            help="Lê, enriquece e grava o arquivo em blocos, mantendo o uso de memória constante"
+        )
+        if modo_streaming:
+            upload_em_blocos(uploaded_file)
+            return
+        descartar_arquivo_processado()
+
         try:
-            # Ler o arquivo com base na extensão e especificar a engine para Excel
-            if uploaded_file.name.endswith('.csv'):
-                df_uploaded = pd.read_csv(uploaded_file)
-            else:
-                df_uploaded = pd.read_excel(uploaded_file, engine='openpyxl')  # Especificar a engine
+            # Cada etapa é memorizada pela chave do seu conteúdo: ao mudar um widget,
+            # apenas as etapas posteriores a ele são recalculadas
+            cache_etapas = obter_cache_etapas()
+
+            # Ler o arquivo com base na extensão (CSV ou XLSX com openpyxl)
+            with metricas.etapa('leitura', cacheado=True) as registro:
+                chave_arquivo, df_uploaded = pipeline_upload.ler_arquivo(
+                    cache_etapas, uploaded_file.getvalue(), uploaded_file.name
+                )
+                metricas.registrar_resultado(registro, df_uploaded)
 
             st.success("Arquivo carregado com sucesso!")
             st.dataframe(df_uploaded.head())
@@ -324,34 +1107,70 @@ def upload():
                 st.error("Nenhuma coluna com 'url' encontrada. Por favor, verifique o arquivo.")
             else:
                 selected_url_col = st.selectbox("Selecione a coluna que contém as URLs:", url_columns)
-
-                # Extrair domínios das URLs
-                df_uploaded['targets'] = df_uploaded[selected_url_col].apply(extrair_dominio)
+                indice = obter_indice_canonico() if opcao_normalizar_dominios() else None
+
+                # Extrair domínios das URLs e os domínios únicos para consulta no banco
+                with metricas.etapa('extracao', cacheado=True) as registro:
+                    chave_extracao, (df_uploaded, dominios_unicos) = pipeline_upload.extrair(
+                        cache_etapas, chave_arquivo, df_uploaded, selected_url_col, indice
+                    )
+                    registro['linhas'] = len(df_uploaded)
                 st.write("Domínios extraídos:")
                 st.dataframe(df_uploaded[['targets']].head())
 
-                # Buscar domínios únicos para consulta no banco
-                dominios_unicos = df_uploaded['targets'].dropna().unique().tolist()
+                # Domínios fora da tabela: sugestões do domínio conhecido mais parecido,
+                # aplicadas somente às linhas marcadas pelo usuário
+                if indice:
+                    with metricas.etapa('sugestoes', cacheado=True) as registro:
+                        _, sugestoes = pipeline_upload.sugerir(cache_etapas, chave_extracao, dominios_unicos, indice)
+                        metricas.registrar_resultado(registro, sugestoes)
+                    if not sugestoes.empty:
+                        st.write(f"Sugestões para {len(sugestoes)} domínios não encontrados na tabela:")
+                        editadas = st.data_editor(
+                            sugestoes.assign(usar=False),
+                            hide_index=True,
+                            disabled=['dominio', 'sugestao', 'similaridade'],
+                            key='sugestoes_dominios'
+                        )
+                        aceitas = editadas[editadas['usar']]
+                        if not aceitas.empty:
+                            chave_extracao, (df_uploaded, dominios_unicos) = pipeline_upload.aplicar_sugestoes(
+                                cache_etapas, chave_extracao, df_uploaded,
+                                dict(zip(aceitas['dominio'], aceitas['sugestao']))
+                            )
+
                 st.write(f"Total de domínios únicos para consulta: {len(dominios_unicos)}")
 
-                # Selecionar a data para filtrar os dados do banco
-                display_date = st.date_input(
-                    "Selecione a data para filtrar os dados:",
-                    value=datetime.today().date(),  # Data padrão como hoje
-                    help="Selecione a data no formato YYYY-MM-DD"
+                # Uma data ou um intervalo de datas (todos os meses em uma única busca)
+                modo_periodo = st.radio(
+                    "Buscar dados de:",
+                    options=["Uma data", "Intervalo de datas"],
+                    horizontal=True
                 )
+                if modo_periodo == "Uma data":
+                    # Selecionar a data para filtrar os dados do banco
+                    display_date = st.date_input(
+                        "Selecione a data para filtrar os dados:",
+                        value=datetime.today().date(),  # Data padrão como hoje
+                        help="Selecione a data no formato YYYY-MM-DD"
+                    )
+                else:
+                    hoje = datetime.today().date()
+                    periodo = st.date_input(
+                        "Selecione o período:",
+                        value=((pd.Timestamp(hoje) - pd.DateOffset(years=1)).date(), hoje),
+                        help="Selecione a data inicial e a data final"
+                    )
+                    formato_periodo = st.radio(
+                        "Formato do resultado:",
+                        options=list(FORMATOS_PERIODO),
+                        horizontal=True
+                    )
 
                 # Seleção das colunas do banco para mapear
-                try:
-                    initial_query = "SELECT * FROM semrush_prod.traffic_analytics_month"
-                    with engine.connect() as connection:
-                        initial_df = pd.read_sql(initial_query, connection)
-                    available_db_columns = initial_df.columns.tolist()
-                    if 'targets' in available_db_columns:
-                        available_db_columns.remove('targets')  # Remover a coluna 'targets' para evitar duplicação
-                except Exception as e:
-                    st.error(f"Erro ao buscar colunas do banco de dados: {e}")
-                    available_db_columns = []
+                available_db_columns = obter_colunas()
+                if 'targets' in available_db_columns:
+                    available_db_columns.remove('targets')  # Remover a coluna 'targets' para evitar duplicação
 
                 db_columns_selected = st.multiselect(
                     "Selecione as colunas do banco de dados que deseja preencher no seu arquivo:",
@@ -359,17 +1178,36 @@ def upload():
                     default=['users', 'bounce_rate']  # Defina um padrão conforme necessário
                 )
 
-                if db_columns_selected:
-                    with st.spinner("Buscando informações no banco de dados..."):
+                if db_columns_selected and modo_periodo == "Intervalo de datas" and len(periodo) != 2:
+                    st.warning("Selecione a data inicial e a data final do período.")
+                elif db_columns_selected:
+                    with st.spinner("Buscando informações no banco de dados..."), \
+                            metricas.etapa('busca', cacheado=True) as registro:
                         # Buscar somente as colunas selecionadas
-                        df_info = buscar_info_dominio(dominios_unicos, db_columns_selected, display_date)
+                        if modo_periodo == "Uma data":
+                            chave_busca, df_info = pipeline_upload.buscar(
+                                cache_etapas, dominios_unicos, db_columns_selected, display_date, buscar_info_dominio
+                            )
+                            colunas_preenchidas = db_columns_selected
+                            pre_carregar_busca_mes_anterior(dominios_unicos, db_columns_selected, display_date)
+                        else:
+                            chave_busca, df_info = pipeline_upload.buscar_periodo(
+                                cache_etapas, dominios_unicos, db_columns_selected, periodo[0], periodo[1],
+                                FORMATOS_PERIODO[formato_periodo], buscar_info_dominio_periodo
+                            )
+                            colunas_preenchidas = [col for col in df_info.columns if col != 'targets']
+                        metricas.registrar_resultado(registro, df_info)
 
                     if not df_info.empty:
                         st.success("Informações do banco de dados obtidas com sucesso!")
-                        st.dataframe(df_info[db_columns_selected].head())
+                        st.dataframe(df_info[colunas_preenchidas].head())
 
-                        # Merge dos dados do arquivo com as informações do banco
-                        df_merged = df_uploaded.merge(df_info[['targets'] + db_columns_selected], on='targets', how='left')
+                        # Merge dos dados do arquivo com as informações do banco (um único join)
+                        with metricas.etapa('cruzamento', cacheado=True) as registro:
+                            chave_cruzamento, df_merged = pipeline_upload.cruzar(
+                                cache_etapas, chave_extracao, df_uploaded, chave_busca, df_info, colunas_preenchidas
+                            )
+                            metricas.registrar_resultado(registro, df_merged)
 
                         st.write("Arquivo com informações preenchidas:")
                         st.dataframe(df_merged.head())
@@ -379,7 +1217,7 @@ def upload():
 
                         # Criar um dicionário para mapear as colunas
                         mapping = {}
-                        for db_col in db_columns_selected:
+                        for db_col in colunas_preenchidas:
                             # Opção para selecionar a coluna do arquivo para preencher
                             file_col = st.selectbox(
                                 f"Selecione a coluna no arquivo para preencher com '{db_col}':", 
@@ -395,16 +1233,11 @@ def upload():
                                 mapping[db_col] = file_col
 
                         # Aplicar o mapeamento
-                        for db_col, file_col in mapping.items():
-                            if file_col.startswith("Nova coluna") or file_col not in df_merged.columns:
-                                # Criar a nova coluna com os dados do banco
-                                if 'Nova coluna para' in file_col and 'new_' in file_col:
-                                    # Evitar sobrescrever
-                                    col_name = mapping[db_col]
-                                    df_merged[col_name] = df_merged[db_col]
-                            else:
-                                # Preencher a coluna existente com os dados do banco
-                                df_merged[file_col] = df_merged[db_col]
+                        with metricas.etapa('mapeamento', cacheado=True) as registro:
+                            chave_mapeamento, df_merged = pipeline_upload.mapear(
+                                cache_etapas, chave_cruzamento, df_merged, mapping
+                            )
+                            registro['linhas'] = len(df_merged)
 
                         st.write("Arquivo final após mapeamento:")
                         st.dataframe(df_merged)
@@ -415,43 +1248,79 @@ def upload():
                         # Selecionar formato de download
                         download_format = st.radio(
                             "Selecione o formato para download:",
-                            options=['CSV', 'XLSX']
+                            options=list(exportacao.FORMATOS)
                         )
 
-                        if download_format == 'CSV':
-                            try:
-                                csv = df_merged.to_csv(index=False).encode('utf-8')
-                                st.download_button(
-                                    label="Baixar arquivo preenchido em CSV",
-                                    data=csv,
-                                    file_name='arquivo_preenchido.csv',
-                                    mime='text/csv'
-                                )
-                            except Exception as e:
-                                st.error(f"Erro ao gerar arquivo CSV: {e}")
-                        else:
-                            try:
-                                excel = io.BytesIO()
-                                with pd.ExcelWriter(excel, engine='xlsxwriter') as writer:
-                                    df_merged.to_excel(writer, index=False, sheet_name='Dados')
-                                excel.seek(0)
-                                st.download_button(
-                                    label="Baixar arquivo preenchido em XLSX",
-                                    data=excel,
-                                    file_name='arquivo_preenchido.xlsx',
-                                    mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-                                )
-                            except Exception as e:
-                                st.error(f"Erro ao gerar arquivo XLSX: {e}")
+                        extensao, mime = exportacao.FORMATOS[download_format]
+                        st.download_button(
+                            label=f"Baixar arquivo preenchido em {download_format}",
+                            data=lambda: exportar_upload(cache_etapas, chave_mapeamento, df_merged, download_format),
+                            file_name=f'arquivo_preenchido.{extensao}',
+                            mime=mime,
+                            on_click='ignore'
+                        )
                     else:
-                        st.warning("Nenhuma informação encontrada para os domínios fornecidos na data selecionada.")
+                        st.warning("Nenhuma informação encontrada para os domínios fornecidos na data ou no período selecionado.")
                 else:
                     st.warning("Por favor, selecione pelo menos uma coluna do banco de dados para preencher.")
         except Exception as e:
             st.error(f"Ocorreu um erro ao processar o arquivo: {e}")
 
+# Função para verificar se o usuário logado é administrador (seção [admin] dos secrets)
+def usuario_admin():
+    return st.session_state.get('username') in st.secrets.get("admin", {}).get("usuarios", [])
+
+# Função para exibir o painel de desempenho com as últimas requisições (somente administradores)
+def painel_desempenho():
+    with st.expander("Desempenho"):
+        requisicoes = metricas.ultimas_requisicoes()
+        if not requisicoes:
+            st.write("Nenhuma requisição registrada.")
+            return
+
+        resumo = pd.DataFrame([
+            {
+                'id': r['id'],
+                'início': r['inicio'],
+                'página': r['pagina'],
+                'usuário': r['usuario'],
+                'segundos': round(r['segundos'], 3),
+                'erro': r['erro'],
+            }
+            for r in reversed(requisicoes)
+        ])
+        st.dataframe(resumo, hide_index=True)
+
+        # Detalhamento das etapas de uma requisição (etapas internas recuadas)
+        por_id = {r['id']: r for r in requisicoes}
+        escolhida = st.selectbox("Requisição:", options=list(resumo['id']))
+        etapas = pd.DataFrame(por_id[escolhida]['etapas'])
+        if etapas.empty:
+            st.write("Requisição sem etapas medidas.")
+        else:
+            etapas['etapa'] = ['\u2003' * nivel + nome for nivel, nome in zip(etapas['nivel'], etapas['etapa'])]
+            etapas['segundos'] = etapas['segundos'].round(4)
+            etapas['espera_pool'] = etapas['espera_pool'].round(4)
+            st.dataframe(etapas.drop(columns=['nivel']), hide_index=True)
+
+        st.write("Pool de conexões:")
+        st.json(db.metricas_pool())
+        st.write(f"Pré-carregamentos em andamento: {paralelo.pre_carregamentos_em_andamento()}")
+
+        # Uso dos caches limitados por bytes, com o tamanho de cada entrada
+        for titulo, cache_processo in [
+            ("Cache de resultados:", obter_cache_resultados()),
+            ("Cache dos índices:", obter_cache_indices()),
+            ("Cache das etapas do upload:", obter_cache_etapas()),
+        ]:
+            st.write(titulo)
+            st.json(cache.estatisticas(cache_processo))
+            st.dataframe(pd.DataFrame(cache.entradas(cache_processo)), hide_index=True)
+
 # Função principal para o aplicativo
 def main():
+    configurar_aplicacao()
+
     # Função de logout
     def logout():
         st.session_state['logged_in'] = False
@@ -470,11 +1339,18 @@ def main():
                 icons=["bar-chart-line", "upload"],
                 menu_icon="cast"
             )
-
-        if selected == "Visualização de Dados":
-            visualizacao_de_dados()
-        elif selected == "Upload e Mapeamento de URLs":
-            upload()
+            # Invalidação explícita do esquema em cache
+            st.button("Recarregar colunas", on_click=invalidar_esquema)
+
+            if usuario_admin():
+                painel_desempenho()
+
+        # Cada execução da página é medida como uma requisição
+        with metricas.requisicao(selected, st.session_state['username']):
+            if selected == "Visualização de Dados":
+                visualizacao_de_dados()
+            elif selected == "Upload e Mapeamento de URLs":
+                upload()
 
     else:
         # Interface de login e registro
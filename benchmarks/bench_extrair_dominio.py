@@ -0,0 +1,74 @@
+# Benchmark da extração de domínios: serie.apply(extrair_dominio) x extrair_dominios(serie)
+#
+# Uso: python benchmarks/bench_extrair_dominio.py --linhas 300000 --distintas 20000
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dominios import extrair_dominio, extrair_dominios  # noqa: E402
+
+UFS = ['sp', 'rj', 'mg', 'rs', 'pr', 'ba', 'pe', 'ce', 'go', 'df']
+
+
+# Função para gerar uma lista de URLs sintéticas com repetições, seções do G1 e valores inválidos
+def gerar_urls(linhas, distintas, semente=42):
+    aleatorio = random.Random(semente)
+    base = []
+    for i in range(distintas):
+        tipo = i % 10
+        if tipo == 0:
+            base.append(f"https://g1.globo.com/{aleatorio.choice(UFS)}/noticia/{i}.ghtml")
+        elif tipo == 1:
+            base.append(f"https://g1.globo.com/economia/noticia/{i}.ghtml")
+        elif tipo == 2:
+            base.append(f"http://www{aleatorio.randint(1, 3)}.portal{i}.com.br/materia/{i}")
+        elif tipo == 3:
+            base.append(None)
+        else:
+            base.append(f"https://www.site{i % 5000}.com/pagina/{i}?ref=busca")
+    return pd.Series([aleatorio.choice(base) for _ in range(linhas)], dtype=object)
+
+
+# Função para medir o menor tempo entre algumas repetições
+def medir(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos), resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da extração de domínios")
+    parser.add_argument('--linhas', type=int, default=300000)
+    parser.add_argument('--distintas', type=int, default=20000)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+
+    urls = gerar_urls(args.linhas, args.distintas)
+
+    tempo_apply, esperado = medir(lambda: urls.apply(extrair_dominio), args.repeticoes)
+    tempo_lote, obtido = medir(lambda: extrair_dominios(urls), args.repeticoes)
+
+    # Valores ausentes podem vir como None ou NaN, conforme a versão do pandas
+    esperado = [None if pd.isna(valor) else valor for valor in esperado]
+    if esperado != obtido.tolist():
+        print("ERRO: extrair_dominios difere de apply(extrair_dominio)")
+        sys.exit(1)
+
+    print(f"linhas={args.linhas} distintas={args.distintas}")
+    print(f"apply(extrair_dominio): {tempo_apply:.3f}s ({args.linhas / tempo_apply:,.0f} linhas/s)")
+    print(f"extrair_dominios:       {tempo_lote:.3f}s ({args.linhas / tempo_lote:,.0f} linhas/s)")
+    print(f"aceleração: {tempo_apply / tempo_lote:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
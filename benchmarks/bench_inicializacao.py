@@ -0,0 +1,126 @@
+# Benchmark da inicialização a frio do app: tempo até a primeira renderização da tela de login
+#
+# Cada repetição roda em um processo novo (imports a frio, como em um worker recém-iniciado
+# ou em uma réplica que acabou de subir) e mede:
+#   - importar_streamlit_s: import do Streamlit (pago pelo servidor antes de qualquer sessão);
+#   - primeira_renderizacao_s: primeira execução do app.py até a tela de login (AppTest);
+#   - aquecimento_s: tempo, a partir da renderização, até o fim do aquecimento em segundo
+#     plano (módulos das páginas e conexões do pool), quando existe;
+#   - modulos_pesados: módulos pesados já carregados ao fim da primeira renderização.
+#
+# As credenciais vêm do secrets.toml do app; sem um banco acessível a tela de login é
+# renderizada do mesmo jeito (o aquecimento apenas registra o erro no log).
+#
+# Uso:
+#   python benchmarks/bench_inicializacao.py --secrets .streamlit/secrets.toml --repeticoes 5
+#   python benchmarks/bench_inicializacao.py --secrets .streamlit/secrets.toml --saida inicio.json
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tomllib
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULOS_PESADOS = ['pandas', 'numpy', 'pyarrow', 'sqlalchemy', 'psycopg2', 'openpyxl', 'xlsxwriter']
+
+
+# Função executada no processo filho: mede uma inicialização a frio e imprime o resultado em JSON
+def medir_inicializacao(caminho_secrets, timeout):
+    inicio = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    importar_streamlit = time.perf_counter() - inicio
+
+    app = AppTest.from_file(os.path.join(RAIZ, 'app.py'), default_timeout=timeout)
+    with open(caminho_secrets, 'rb') as arquivo:
+        for secao, valores in tomllib.load(arquivo).items():
+            app.secrets[secao] = valores
+
+    inicio = time.perf_counter()
+    app.run()
+    primeira_renderizacao = time.perf_counter() - inicio
+    carregados = [nome for nome in MODULOS_PESADOS if nome in sys.modules]
+
+    aquecimento = None
+    threads = [t for t in threading.enumerate() if t.name == 'aquecimento']
+    if threads:
+        threads[0].join(timeout)
+        aquecimento = time.perf_counter() - inicio
+
+    return {
+        'importar_streamlit_s': round(importar_streamlit, 4),
+        'primeira_renderizacao_s': round(primeira_renderizacao, 4),
+        'aquecimento_s': round(aquecimento, 4) if aquecimento is not None else None,
+        'login_renderizado': any(campo.label == 'Usuário' for campo in app.sidebar.text_input),
+        'excecoes': [str(excecao.value) for excecao in app.exception],
+        'modulos_pesados': carregados,
+    }
+
+
+# Função para resumir uma métrica das repetições (p50/p95/média)
+def resumir(valores):
+    valores = sorted(v for v in valores if v is not None)
+    if not valores:
+        return None
+
+    def percentil(p):
+        posicao = (len(valores) - 1) * p / 100
+        base = int(posicao)
+        proximo = min(base + 1, len(valores) - 1)
+        return valores[base] + (valores[proximo] - valores[base]) * (posicao - base)
+
+    return {'p50_s': round(percentil(50), 4), 'p95_s': round(percentil(95), 4),
+            'media_s': round(statistics.fmean(valores), 4)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da inicialização a frio do app")
+    parser.add_argument('--secrets', default=os.path.join(RAIZ, '.streamlit', 'secrets.toml'),
+                        help="secrets.toml com a seção [database] do app")
+    parser.add_argument('--repeticoes', type=int, default=5, help="Processos novos medidos")
+    parser.add_argument('--timeout', type=float, default=60, help="Segundos máximos por execução do app")
+    parser.add_argument('--saida', help="Arquivo JSON de saída (padrão: stdout)")
+    parser.add_argument('--filho', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.filho:
+        print(json.dumps(medir_inicializacao(args.secrets, args.timeout)))
+        return
+
+    execucoes = []
+    for repeticao in range(args.repeticoes):
+        processo = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--filho', '--secrets', args.secrets,
+             '--timeout', str(args.timeout)],
+            cwd=RAIZ, capture_output=True, text=True, check=True
+        )
+        execucoes.append(json.loads(processo.stdout.strip().splitlines()[-1]))
+        print(f"repetição {repeticao + 1}: primeira renderização em "
+              f"{execucoes[-1]['primeira_renderizacao_s']:.3f}s", file=sys.stderr)
+
+    relatorio = {
+        'executado_em': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'repeticoes': args.repeticoes,
+        'importar_streamlit': resumir([e['importar_streamlit_s'] for e in execucoes]),
+        'primeira_renderizacao': resumir([e['primeira_renderizacao_s'] for e in execucoes]),
+        'aquecimento': resumir([e['aquecimento_s'] for e in execucoes]),
+        'execucoes': execucoes,
+    }
+    texto = json.dumps(relatorio, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, 'w') as arquivo:
+            arquivo.write(texto)
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# Busca em lote das informações de domínios na tabela de tráfego
+#
+# Listas grandes são divididas em lotes, cada lote é enviado como um parâmetro
+# de array e os lotes são consultados em paralelo usando o pool de conexões.
+
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import consultas
+import db
+import replica
+
+# Quantidade de domínios por consulta
+TAMANHO_LOTE = 5000
+
+# Consultas simultâneas (não deve ultrapassar o tamanho do pool)
+MAX_CONSULTAS_PARALELAS = 4
+
+
+# Função para gerar uma chave estável para um conjunto de domínios
+def chave_dominios(dominios):
+    conteudo = '\n'.join(sorted(set(dominios)))
+    return hashlib.sha1(conteudo.encode('utf-8')).hexdigest()
+
+
+# Função para dividir uma lista em lotes de tamanho fixo
+def dividir_em_lotes(itens, tamanho=TAMANHO_LOTE):
+    return [itens[i:i + tamanho] for i in range(0, len(itens), tamanho)]
+
+
+# Função para consultar um único lote de domínios
+def _consultar_lote(query, params, lote):
+    with db.conexao() as connection:
+        return pd.read_sql(query, connection, params=(list(lote),) + params)
+
+
+# Função para buscar as colunas selecionadas de todos os domínios informados
+# (usa a réplica local quando ela já contém a data pedida)
+def buscar_info_dominios(dominios, colunas, display_date=None,
+                         tamanho_lote=TAMANHO_LOTE, max_paralelas=MAX_CONSULTAS_PARALELAS):
+    dominios = sorted(set(d for d in dominios if d))
+    colunas_resultado = ['targets'] + [c for c in colunas if c != 'targets']
+
+    if not dominios:
+        return pd.DataFrame(columns=colunas_resultado)
+
+    if replica.cobre(display_date):
+        return replica.ler_info_dominios(dominios, colunas, display_date)
+
+    query, params = consultas.montar_consulta_info_dominios(colunas, display_date)
+    return _consultar_em_lotes(query, params, dominios, colunas_resultado, tamanho_lote, max_paralelas)
+
+
+# Função para buscar as colunas selecionadas de todos os domínios em um período,
+# em uma única consulta por lote (uma linha por domínio e mês)
+def buscar_info_dominios_periodo(dominios, colunas, data_inicio, data_fim,
+                                 tamanho_lote=TAMANHO_LOTE, max_paralelas=MAX_CONSULTAS_PARALELAS):
+    dominios = sorted(set(d for d in dominios if d))
+    colunas_resultado = ['targets', 'display_date'] + [c for c in colunas if c not in ('targets', 'display_date')]
+
+    if not dominios:
+        return pd.DataFrame(columns=colunas_resultado)
+
+    if replica.cobre_periodo(data_inicio, data_fim):
+        return replica.ler_info_dominios_periodo(dominios, colunas, data_inicio, data_fim)
+
+    query, params = consultas.montar_consulta_info_dominios_periodo(colunas, data_inicio, data_fim)
+    return _consultar_em_lotes(query, params, dominios, colunas_resultado, tamanho_lote, max_paralelas)
+
+
+# Função para consultar os lotes de domínios em paralelo e juntar os resultados
+def _consultar_em_lotes(query, params, dominios, colunas_resultado, tamanho_lote, max_paralelas):
+    lotes = dividir_em_lotes(dominios, tamanho_lote)
+    if len(lotes) == 1:
+        return _consultar_lote(query, params, lotes[0])
+
+    with ThreadPoolExecutor(max_workers=min(max_paralelas, len(lotes))) as executor:
+        resultados = list(executor.map(lambda lote: _consultar_lote(query, params, lote), lotes))
+
+    resultados = [df for df in resultados if not df.empty]
+    if not resultados:
+        return pd.DataFrame(columns=colunas_resultado)
+    return pd.concat(resultados, ignore_index=True)
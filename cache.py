@@ -0,0 +1,183 @@
+# Cache LRU em memória com limite total em bytes
+#
+# Cada entrada guarda o tamanho estimado do valor; ao ultrapassar o limite, as
+# entradas usadas há mais tempo são descartadas. Opcionalmente, as entradas
+# expiram após um tempo de vida (TTL). O cache é seguro para uso entre threads
+# (sessões do Streamlit no mesmo processo): um valor ainda em cálculo para uma chave
+# é esperado pelas outras threads que pedem a mesma chave, em vez de recalculado.
+
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+
+import metricas
+
+
+# Função para criar um cache vazio com o limite informado (em bytes)
+# e, opcionalmente, o tempo de vida das entradas (em segundos)
+def criar_cache(limite_bytes, ttl=None):
+    return {
+        'itens': OrderedDict(),
+        'tamanhos': {},
+        'criados': {},
+        'total': 0,
+        'limite': limite_bytes,
+        'ttl': ttl,
+        'acertos': 0,
+        'falhas': 0,
+        'em_calculo': {},
+        'lock': threading.Lock(),
+    }
+
+
+# Função para estimar o tamanho de um valor em memória (em bytes)
+# Estruturas (dicionários, listas, conjuntos) são somadas item a item; objetos
+# compartilhados entre partes do valor são contados mais de uma vez
+def tamanho_em_bytes(valor):
+    if isinstance(valor, pd.DataFrame):
+        return int(valor.memory_usage(index=True, deep=True).sum())
+    if isinstance(valor, (pd.Series, pd.Index)):
+        return int(valor.memory_usage(deep=True))
+    if isinstance(valor, np.ndarray):
+        if valor.dtype == object:
+            return valor.nbytes + sum(sys.getsizeof(item) for item in valor.ravel())
+        return valor.nbytes
+    if isinstance(valor, (bytes, bytearray)):
+        return len(valor)
+    if isinstance(valor, dict):
+        return sys.getsizeof(valor) + sum(tamanho_em_bytes(k) + tamanho_em_bytes(v) for k, v in valor.items())
+    if isinstance(valor, (tuple, list, set, frozenset)):
+        return sys.getsizeof(valor) + sum(tamanho_em_bytes(item) for item in valor)
+    return sys.getsizeof(valor)
+
+
+# Função para gerar um hash estável do conteúdo de um ou mais valores
+def hash_conteudo(*partes):
+    resumo = hashlib.sha1()
+    for parte in partes:
+        if isinstance(parte, pd.DataFrame):
+            resumo.update(repr(list(parte.columns)).encode('utf-8'))
+            resumo.update(pd.util.hash_pandas_object(parte, index=True).to_numpy().tobytes())
+        elif isinstance(parte, pd.Series):
+            resumo.update(repr(parte.name).encode('utf-8'))
+            resumo.update(pd.util.hash_pandas_object(parte, index=True).to_numpy().tobytes())
+        elif isinstance(parte, (bytes, bytearray)):
+            resumo.update(parte)
+        else:
+            resumo.update(repr(parte).encode('utf-8'))
+        resumo.update(b'\x00')
+    return resumo.hexdigest()
+
+
+# Função para remover uma entrada (chamada com o lock adquirido)
+def _remover(cache, chave):
+    del cache['itens'][chave]
+    del cache['criados'][chave]
+    cache['total'] -= cache['tamanhos'].pop(chave)
+
+
+# Função para verificar se uma entrada passou do tempo de vida
+def _expirada(cache, chave):
+    return cache['ttl'] is not None and time.monotonic() - cache['criados'][chave] > cache['ttl']
+
+
+# Função para buscar um valor; retorna (encontrado, valor)
+def obter(cache, chave):
+    with cache['lock']:
+        if chave in cache['itens'] and _expirada(cache, chave):
+            _remover(cache, chave)
+        if chave in cache['itens']:
+            cache['itens'].move_to_end(chave)
+            cache['acertos'] += 1
+            return True, cache['itens'][chave]
+        cache['falhas'] += 1
+        return False, None
+
+
+# Função para guardar um valor, descartando as entradas mais antigas se necessário
+# (valores maiores que o limite inteiro não são guardados)
+def guardar(cache, chave, valor):
+    tamanho = tamanho_em_bytes(valor)
+    with cache['lock']:
+        if chave in cache['itens']:
+            _remover(cache, chave)
+        if tamanho > cache['limite']:
+            return
+        while cache['itens'] and cache['total'] + tamanho > cache['limite']:
+            _remover(cache, next(iter(cache['itens'])))
+        cache['itens'][chave] = valor
+        cache['tamanhos'][chave] = tamanho
+        cache['criados'][chave] = time.monotonic()
+        cache['total'] += tamanho
+
+
+# Função para obter um valor do cache ou calculá-lo e guardá-lo
+# 'guardar_se' (opcional) decide se o valor calculado deve ser guardado
+# (a falha é registrada na etapa em medição, quando houver)
+# Só uma thread calcula cada chave por vez: as demais esperam o mesmo resultado
+# (ou a mesma exceção), como a página que pede os dados já em pré-carregamento
+def memoizar(cache, chave, calcular, guardar_se=None):
+    encontrado, valor = obter(cache, chave)
+    if encontrado:
+        return valor
+
+    with cache['lock']:
+        calculo = cache['em_calculo'].get(chave)
+        if calculo is None:
+            calculo = cache['em_calculo'][chave] = Future()
+            responsavel = True
+        else:
+            responsavel = False
+    if not responsavel:
+        return calculo.result()
+
+    metricas.registrar_falha_cache()
+    try:
+        valor = calcular()
+        if guardar_se is None or guardar_se(valor):
+            guardar(cache, chave, valor)
+        calculo.set_result(valor)
+        return valor
+    except BaseException as e:
+        calculo.set_exception(e)
+        raise
+    finally:
+        with cache['lock']:
+            cache['em_calculo'].pop(chave, None)
+
+
+# Função para remover todas as entradas (cálculos em andamento não são interrompidos)
+def limpar(cache):
+    with cache['lock']:
+        cache['itens'].clear()
+        cache['tamanhos'].clear()
+        cache['criados'].clear()
+        cache['total'] = 0
+
+
+# Função para resumir o uso do cache
+def estatisticas(cache):
+    with cache['lock']:
+        return {
+            'entradas': len(cache['itens']),
+            'bytes': cache['total'],
+            'limite': cache['limite'],
+            'acertos': cache['acertos'],
+            'falhas': cache['falhas'],
+        }
+
+
+# Função para listar as entradas (da mais recente para a mais antiga) com tamanho e idade
+def entradas(cache):
+    agora = time.monotonic()
+    with cache['lock']:
+        return [
+            {'chave': chave, 'bytes': cache['tamanhos'][chave], 'idade_s': round(agora - cache['criados'][chave], 1)}
+            for chave in reversed(cache['itens'])
+        ]
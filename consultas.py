@@ -0,0 +1,390 @@
+# Construção das consultas SQL sobre a tabela semrush_prod.traffic_analytics_month
+#
+# As funções deste módulo não acessam o banco: apenas montam o texto SQL e os
+# parâmetros (no estilo %s do psycopg2), de forma que filtros, projeção de
+# colunas, limite e paginação sejam resolvidos pelo PostgreSQL.
+
+ESQUEMA = "semrush_prod"
+NOME_TABELA = "traffic_analytics_month"
+TABELA = f"{ESQUEMA}.{NOME_TABELA}"
+
+# Colunas usadas na ordenação estável e na paginação por chave (keyset)
+CHAVE_PAGINACAO = ('display_date', 'targets')
+
+# Limite padrão de linhas devolvidas por consulta
+LIMITE_PADRAO = 100000
+
+# Visões materializadas (opcionais) das tendências mensais
+VIEW_MENSAL = f"{ESQUEMA}.traffic_analytics_tendencias_mensais"
+VIEW_TOTAIS = f"{ESQUEMA}.traffic_analytics_totais_mensais"
+
+
+# Função para citar um identificador (nome de coluna) com segurança
+def citar_coluna(nome):
+    return '"' + str(nome).replace('"', '""') + '"'
+
+
+# Função para escapar os curingas do LIKE/ILIKE em um termo digitado pelo usuário
+def escapar_like(termo):
+    return termo.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+# Função para converter datas em texto ISO antes de enviá-las como parâmetro
+def valor_parametro(valor):
+    if hasattr(valor, 'isoformat'):
+        return valor.isoformat()
+    if hasattr(valor, 'item'):
+        # Escalares do numpy não são adaptados pelo psycopg2
+        return valor.item()
+    return valor
+
+
+# Função para montar a consulta de nomes e tipos das colunas da tabela
+# (lê apenas o catálogo, sem tocar nas linhas da tabela)
+def montar_consulta_esquema():
+    query = """
+        SELECT column_name, data_type
+        FROM information_schema.columns
+        WHERE table_schema = %s AND table_name = %s
+        ORDER BY ordinal_position
+    """
+    return query, (ESQUEMA, NOME_TABELA)
+
+
+# Função para montar a consulta de informações de um lote de domínios
+# A lista de domínios é enviada como um único parâmetro de array (= ANY(%s))
+def montar_consulta_info_dominios(colunas, display_date=None):
+    colunas_consulta = ['targets'] + [c for c in colunas if c != 'targets']
+    select = ', '.join(citar_coluna(c) for c in colunas_consulta)
+
+    query = f"SELECT {select} FROM {TABELA} WHERE targets = ANY(%s)"
+    params = []
+    if display_date:
+        query += " AND display_date = %s"
+        params.append(valor_parametro(display_date))
+    return query, tuple(params)
+
+
+# Função para montar a consulta de informações de um lote de domínios em um período
+# (uma linha por domínio e mês, com 'display_date' logo após 'targets')
+def montar_consulta_info_dominios_periodo(colunas, data_inicio, data_fim):
+    colunas_consulta = ['targets', 'display_date'] + [c for c in colunas if c not in ('targets', 'display_date')]
+    select = ', '.join(citar_coluna(c) for c in colunas_consulta)
+
+    query = (
+        f"SELECT {select} FROM {TABELA} WHERE targets = ANY(%s) "
+        "AND display_date BETWEEN %s AND %s ORDER BY targets, display_date"
+    )
+    return query, (valor_parametro(data_inicio), valor_parametro(data_fim))
+
+
+# Função para montar a consulta dos valores distintos de 'targets'
+def montar_consulta_targets_distintos():
+    return f"SELECT DISTINCT targets FROM {TABELA} WHERE targets IS NOT NULL", ()
+
+
+# Função para normalizar os filtros, garantindo a mesma chave de cache
+# para consultas equivalentes (espaços, maiúsculas e colunas repetidas)
+def normalizar_filtros(display_date=None, targets_filter=None, selected_columns=None):
+    display_date = valor_parametro(display_date) if display_date else None
+
+    targets_filter = (targets_filter or '').strip().lower() or None
+
+    colunas = []
+    for coluna in selected_columns or []:
+        if coluna not in colunas:
+            colunas.append(coluna)
+
+    return display_date, targets_filter, tuple(colunas)
+
+
+# Função para obter as colunas de ordenação: a coluna escolhida seguida da chave
+# de paginação, o que garante uma ordem total para a paginação por chave
+def chave_ordenacao(ordenar_por=None):
+    if not ordenar_por:
+        return list(CHAVE_PAGINACAO)
+    return [ordenar_por] + [c for c in CHAVE_PAGINACAO if c != ordenar_por]
+
+
+# Função para montar as condições WHERE dos filtros de data e de targets
+def _condicoes_filtros(display_date, targets_filter):
+    condicoes = []
+    params = []
+
+    if display_date:
+        condicoes.append("display_date = %s")
+        params.append(display_date)
+
+    if targets_filter:
+        condicoes.append("targets ILIKE %s")
+        params.append(f"%{escapar_like(targets_filter)}%")
+
+    return condicoes, params
+
+
+# Função para montar as condições que excluem as linhas com nulos na chave de paginação
+# A comparação de linhas do PostgreSQL nunca é verdadeira com um nulo, então essas
+# linhas não seriam alcançadas pelo cursor; sem domínio (targets), a linha também fica
+# fora das visões de tendências e do índice de targets
+def _condicoes_chave_preenchida():
+    return [f"{coluna} IS NOT NULL" for coluna in CHAVE_PAGINACAO]
+
+
+# Função para montar a consulta de dados com filtros, projeção, limite e keyset
+# (somente linhas com a chave de paginação preenchida, ver _condicoes_chave_preenchida)
+# A ordenação por outra coluna deve usar colunas indexadas e sem valores nulos
+# (a comparação de linhas do PostgreSQL descarta linhas com nulos na chave)
+def montar_consulta_dados(display_date=None, targets_filter=None, selected_columns=None,
+                          limite=LIMITE_PADRAO, apos=None, ordenar_por=None, descendente=False):
+    display_date, targets_filter, colunas = normalizar_filtros(
+        display_date, targets_filter, selected_columns
+    )
+    chave = chave_ordenacao(ordenar_por)
+
+    # Projeção: colunas selecionadas + colunas da chave de ordenação ausentes
+    if colunas:
+        colunas_consulta = list(colunas) + [c for c in chave if c not in colunas]
+        select = ', '.join(citar_coluna(c) for c in colunas_consulta)
+    else:
+        select = '*'
+
+    condicoes, params = _condicoes_filtros(display_date, targets_filter)
+    condicoes += _condicoes_chave_preenchida()
+
+    # Paginação por chave: continua a partir da última linha da página anterior
+    if apos is not None:
+        colunas_chave = ', '.join(citar_coluna(c) for c in chave)
+        marcadores = ', '.join(['%s'] * len(chave))
+        operador = '<' if descendente else '>'
+        condicoes.append(f"({colunas_chave}) {operador} ({marcadores})")
+        params.extend(valor_parametro(v) for v in apos)
+
+    query = f"SELECT {select} FROM {TABELA} WHERE " + " AND ".join(condicoes)
+    direcao = 'DESC' if descendente else 'ASC'
+    query += " ORDER BY " + ', '.join(f"{citar_coluna(c)} {direcao}" for c in chave)
+    if limite:
+        query += " LIMIT %s"
+        params.append(int(limite))
+
+    return query, tuple(params)
+
+
+# Função para montar a contagem de linhas que atendem aos filtros, com as mesmas
+# exclusões da consulta de dados (linhas com nulos na chave de paginação não contam)
+# Sem filtros, usa a estimativa do catálogo (pg_class.reltuples) para evitar
+# percorrer a tabela inteira; o segundo valor indica se a contagem é exata
+# (a estimativa inclui as linhas com nulos na chave)
+def montar_consulta_contagem(display_date=None, targets_filter=None):
+    display_date, targets_filter, _ = normalizar_filtros(display_date, targets_filter)
+    condicoes, params = _condicoes_filtros(display_date, targets_filter)
+
+    if not condicoes:
+        query = "SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE oid = %s::regclass"
+        return query, (TABELA,), False
+
+    condicoes += _condicoes_chave_preenchida()
+    query = f"SELECT COUNT(*) FROM {TABELA} WHERE " + " AND ".join(condicoes)
+    return query, tuple(params), True
+
+
+# Função para montar a consulta das colunas que iniciam algum índice da tabela e não
+# aceitam nulos (colunas pelas quais a ordenação no servidor é eficiente e a paginação
+# por chave é correta: com nulos, a comparação de linhas não avança o cursor)
+def montar_consulta_colunas_indexadas():
+    query = """
+        SELECT DISTINCT a.attname AS column_name
+        FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+        WHERE i.indrelid = %s::regclass AND a.attnotnull
+    """
+    return query, (TABELA,)
+
+
+# Função para obter o cursor da próxima página a partir da última linha retornada
+def proximo_cursor(df, limite=LIMITE_PADRAO, ordenar_por=None):
+    chave = chave_ordenacao(ordenar_por)
+    if df.empty or not limite or len(df) < limite:
+        return None
+    if not all(c in df.columns for c in chave):
+        return None
+    ultima = df.iloc[-1]
+    return tuple(valor_parametro(ultima[c]) for c in chave)
+
+
+# --- Tendências (vários meses) ---
+#
+# As séries são agregadas no PostgreSQL: por domínio e mês (users somados e o
+# melhor rank), com crescimento mês a mês e variação de rank calculados com
+# funções de janela. O mês anterior ao período entra na janela apenas para que o
+# primeiro mês também tenha crescimento; meses ausentes não contam como anteriores.
+# Com usar_views=True, a leitura parte das visões materializadas, bem mais
+# estreitas que a tabela.
+
+
+# Função para montar a agregação mensal por domínio (targets, display_date, users, rank)
+def _sql_mensal(usar_views, condicoes):
+    where = " WHERE " + " AND ".join(condicoes) if condicoes else ""
+    if usar_views:
+        return f"SELECT targets, display_date, users, rank FROM {VIEW_MENSAL}{where}"
+    return (
+        "SELECT targets, display_date, SUM(users) AS users, MIN(rank) AS rank "
+        f"FROM {TABELA}{where} GROUP BY targets, display_date"
+    )
+
+
+# Função para montar a agregação por mês de uma fonte com uma linha por domínio e mês
+def _sql_agregar_totais(fonte):
+    return (
+        "SELECT display_date, COUNT(*) AS qtd_targets, SUM(users) AS soma_users, AVG(users) AS media_users "
+        f"FROM {fonte} GROUP BY display_date"
+    )
+
+
+# Função para montar a agregação mensal de todos os domínios (display_date, qtd_targets, soma, média)
+def _sql_totais(usar_views, condicoes, targets_filter):
+    if usar_views and not targets_filter:
+        where = " WHERE " + " AND ".join(condicoes) if condicoes else ""
+        return f"SELECT display_date, qtd_targets, soma_users, media_users FROM {VIEW_TOTAIS}{where}"
+    return _sql_agregar_totais(f"({_sql_mensal(usar_views, condicoes)}) mensal")
+
+
+# Função para montar as condições do período (incluindo o mês anterior) e do filtro de targets
+def _condicoes_periodo(data_inicio, data_fim, targets_filter, targets=None):
+    condicoes = ["display_date BETWEEN %s::date - INTERVAL '1 month' AND %s::date"]
+    params = [valor_parametro(data_inicio), valor_parametro(data_fim)]
+    if targets_filter:
+        condicoes.append("targets ILIKE %s")
+        params.append(f"%{escapar_like(targets_filter)}%")
+    if targets is not None:
+        condicoes.append("targets = ANY(%s)")
+        params.append(list(targets))
+    return condicoes, params
+
+
+# Expressão que devolve o valor do mês anterior (ou NULL quando o mês anterior não existe)
+def _anterior(coluna, janela='w'):
+    return (
+        f"CASE WHEN LAG(display_date) OVER {janela} = display_date - INTERVAL '1 month' "
+        f"THEN LAG({coluna}) OVER {janela} END"
+    )
+
+
+# Função para montar a série mensal de cada domínio com valores do mês anterior
+def _sql_series(usar_views, condicoes):
+    return f"""
+        SELECT targets, display_date, users, rank,
+               {_anterior('users')} AS users_anterior,
+               {_anterior('rank')} AS rank_anterior
+        FROM ({_sql_mensal(usar_views, condicoes)}) mensal
+        WINDOW w AS (PARTITION BY targets ORDER BY display_date)
+    """
+
+
+# Função para montar o resumo por domínio no período: soma e média de users,
+# valores do primeiro e do último mês, crescimento e variação de rank
+# (variação de rank positiva indica melhora de posição)
+def montar_consulta_resumo_tendencias(data_inicio, data_fim, targets_filter=None,
+                                      limite=LIMITE_PADRAO, usar_views=False):
+    targets_filter = (targets_filter or '').strip().lower() or None
+    condicoes, params = _condicoes_periodo(data_inicio, data_fim, targets_filter)
+    query = f"""
+        SELECT targets, meses, soma_users, media_users, users_inicio, users_fim,
+               users_fim::float8 / NULLIF(users_inicio, 0) - 1 AS crescimento_periodo,
+               crescimento_medio_mensal,
+               rank_inicio, rank_fim, rank_inicio - rank_fim AS variacao_rank
+        FROM (
+            SELECT targets,
+                   COUNT(*) AS meses,
+                   SUM(users) AS soma_users,
+                   AVG(users) AS media_users,
+                   (ARRAY_AGG(users ORDER BY display_date))[1] AS users_inicio,
+                   (ARRAY_AGG(users ORDER BY display_date DESC))[1] AS users_fim,
+                   AVG((users - users_anterior)::float8 / NULLIF(users_anterior, 0)) AS crescimento_medio_mensal,
+                   (ARRAY_AGG(rank ORDER BY display_date))[1] AS rank_inicio,
+                   (ARRAY_AGG(rank ORDER BY display_date DESC))[1] AS rank_fim
+            FROM ({_sql_series(usar_views, condicoes)}) series
+            WHERE display_date >= %s::date
+            GROUP BY targets
+        ) resumo
+        ORDER BY soma_users DESC NULLS LAST, targets
+    """
+    params.append(valor_parametro(data_inicio))
+    if limite:
+        query += " LIMIT %s"
+        params.append(int(limite))
+    return query, tuple(params)
+
+
+# Função para montar a série mensal de uma lista de domínios no período,
+# com crescimento mês a mês de users e variação de rank
+def montar_consulta_series_tendencias(data_inicio, data_fim, targets, usar_views=False):
+    condicoes, params = _condicoes_periodo(data_inicio, data_fim, None, targets=targets)
+    query = f"""
+        SELECT targets, display_date, users, rank,
+               (users - users_anterior)::float8 / NULLIF(users_anterior, 0) AS crescimento_users,
+               rank_anterior - rank AS variacao_rank
+        FROM ({_sql_series(usar_views, condicoes)}) series
+        WHERE display_date >= %s::date
+        ORDER BY targets, display_date
+    """
+    params.append(valor_parametro(data_inicio))
+    return query, tuple(params)
+
+
+# Função para montar os totais por mês no período (domínios, soma e média de users)
+# com o crescimento mês a mês da soma
+def montar_consulta_totais_tendencias(data_inicio, data_fim, targets_filter=None, usar_views=False):
+    targets_filter = (targets_filter or '').strip().lower() or None
+    condicoes, params = _condicoes_periodo(data_inicio, data_fim, targets_filter)
+    query = f"""
+        SELECT display_date, qtd_targets, soma_users, media_users, crescimento_users
+        FROM (
+            SELECT display_date, qtd_targets, soma_users, media_users,
+                   soma_users::float8 / NULLIF({_anterior('soma_users')}, 0) - 1 AS crescimento_users
+            FROM ({_sql_totais(usar_views, condicoes, targets_filter)}) totais
+            WINDOW w AS (ORDER BY display_date)
+        ) com_crescimento
+        WHERE display_date >= %s::date
+        ORDER BY display_date
+    """
+    params.append(valor_parametro(data_inicio))
+    return query, tuple(params)
+
+
+# Função para montar os comandos de criação das visões materializadas
+# (os índices únicos permitem REFRESH ... CONCURRENTLY, sem bloquear leituras)
+def montar_comandos_criar_views():
+    nome_mensal = VIEW_MENSAL.split('.')[-1]
+    nome_totais = VIEW_TOTAIS.split('.')[-1]
+    return [
+        f"CREATE MATERIALIZED VIEW IF NOT EXISTS {VIEW_MENSAL} AS {_sql_mensal(False, ['targets IS NOT NULL'])}",
+        f"CREATE UNIQUE INDEX IF NOT EXISTS {nome_mensal}_chave ON {VIEW_MENSAL} (display_date, targets)",
+        f"CREATE INDEX IF NOT EXISTS {nome_mensal}_targets ON {VIEW_MENSAL} (targets, display_date)",
+        f"CREATE MATERIALIZED VIEW IF NOT EXISTS {VIEW_TOTAIS} AS {_sql_agregar_totais(VIEW_MENSAL)}",
+        f"CREATE UNIQUE INDEX IF NOT EXISTS {nome_totais}_chave ON {VIEW_TOTAIS} (display_date)",
+    ]
+
+
+# Função para montar os comandos de atualização das visões (a mensal antes dos totais)
+def montar_comandos_atualizar_views():
+    return [f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}" for view in (VIEW_MENSAL, VIEW_TOTAIS)]
+
+
+# Função para montar a consulta das visões materializadas já criadas e populadas
+def montar_consulta_views_existentes():
+    query = """
+        SELECT schemaname || '.' || matviewname AS nome
+        FROM pg_matviews
+        WHERE schemaname || '.' || matviewname = ANY(%s) AND ispopulated
+    """
+    return query, ([VIEW_MENSAL, VIEW_TOTAIS],)
+
+
+# Função para montar a consulta das datas mais recentes da tabela e das visões
+# (as visões estão desatualizadas quando a tabela tem um mês mais novo)
+def montar_consulta_datas_views():
+    query = f"""
+        SELECT (SELECT MAX(display_date) FROM {TABELA}) AS tabela,
+               (SELECT MAX(display_date) FROM {VIEW_TOTAIS}) AS views
+    """
+    return query, ()
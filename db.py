@@ -0,0 +1,164 @@
+# Camada única de acesso ao PostgreSQL
+#
+# Um único engine do SQLAlchemy, criado sob demanda, mantém um pool de conexões
+# limitado e verificado (pre-ping) que atende tanto as leituras com pandas
+# quanto as funções de autenticação que usam o cursor do psycopg2.
+#
+# O SQLAlchemy (e o psycopg2) só são importados na criação do engine: a tela de
+# login é exibida sem carregá-los, e o aquecimento abre as primeiras conexões em
+# segundo plano antes da primeira consulta.
+
+import threading
+import time
+from contextlib import contextmanager
+
+import metricas
+
+# Configurações padrão do pool (podem ser sobrescritas na seção [pool] dos secrets)
+CONFIG_POOL_PADRAO = {
+    'pool_size': 5,             # Conexões mantidas abertas
+    'max_overflow': 10,         # Conexões extras permitidas em picos
+    'pool_timeout': 30,         # Segundos aguardando uma conexão livre
+    'pool_recycle': 1800,       # Segundos até reciclar uma conexão
+    'statement_timeout': 60000  # Milissegundos por comando no PostgreSQL
+}
+
+_db_config = None
+_pool_config = dict(CONFIG_POOL_PADRAO)
+_engine = None
+_lock = threading.Lock()
+
+# Métricas acumuladas de uso do pool
+_metricas = {
+    'checkouts': 0,
+    'espera_total': 0.0,
+    'espera_max': 0.0,
+    'overflow_max': 0
+}
+
+
+# Função para registrar as credenciais e as opções do pool
+# (não abre conexões; o engine é criado no primeiro acesso)
+def configurar(db_config, **opcoes_pool):
+    global _db_config, _pool_config, _engine
+    novo_pool = dict(CONFIG_POOL_PADRAO)
+    novo_pool.update({k: v for k, v in opcoes_pool.items() if k in CONFIG_POOL_PADRAO})
+
+    with _lock:
+        if db_config == _db_config and novo_pool == _pool_config:
+            return
+        _db_config = dict(db_config)
+        _pool_config = novo_pool
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
+
+
+# Função para obter o engine compartilhado, criando-o na primeira chamada
+def get_engine():
+    global _engine
+    if _engine is not None:
+        return _engine
+
+    with _lock:
+        if _engine is None:
+            if _db_config is None:
+                raise RuntimeError("Banco de dados não configurado. Chame db.configurar() antes do primeiro acesso.")
+            from sqlalchemy import create_engine
+            from sqlalchemy.engine import URL
+            url = URL.create(
+                "postgresql+psycopg2",
+                username=_db_config['user'],
+                password=_db_config['password'],
+                host=_db_config['host'],
+                port=_db_config['port'],
+                database=_db_config['database']
+            )
+            _engine = create_engine(
+                url,
+                pool_size=_pool_config['pool_size'],
+                max_overflow=_pool_config['max_overflow'],
+                pool_timeout=_pool_config['pool_timeout'],
+                pool_recycle=_pool_config['pool_recycle'],
+                pool_pre_ping=True,
+                connect_args={'options': f"-c statement_timeout={int(_pool_config['statement_timeout'])}"}
+            )
+    return _engine
+
+
+# Função para obter as exceções do banco, importadas sob demanda (uso: except db.erros() as e)
+# A expressão do except só é avaliada quando ocorre uma exceção
+def erros():
+    from psycopg2 import Error
+    from sqlalchemy.exc import SQLAlchemyError
+    return (Error, SQLAlchemyError)
+
+
+# Função para abrir as primeiras conexões do pool antes da primeira consulta (aquecimento)
+# As conexões voltam ao pool abertas; o limite é o tamanho do pool
+def aquecer(conexoes=1):
+    engine = get_engine()
+    abertas = []
+    try:
+        for _ in range(min(conexoes, _pool_config['pool_size'])):
+            abertas.append(engine.connect())
+    finally:
+        for connection in abertas:
+            connection.close()
+    return len(abertas)
+
+
+# Função para registrar o tempo de espera de uma retirada do pool
+def _registrar_checkout(inicio, engine):
+    espera = time.perf_counter() - inicio
+    with _lock:
+        _metricas['checkouts'] += 1
+        _metricas['espera_total'] += espera
+        _metricas['espera_max'] = max(_metricas['espera_max'], espera)
+        _metricas['overflow_max'] = max(_metricas['overflow_max'], engine.pool.overflow())
+    metricas.registrar_espera_pool(espera)
+
+
+# Conexão do SQLAlchemy (para pandas) retirada do pool
+@contextmanager
+def conexao():
+    engine = get_engine()
+    inicio = time.perf_counter()
+    connection = engine.connect()
+    _registrar_checkout(inicio, engine)
+    try:
+        yield connection
+    finally:
+        connection.close()
+
+
+# Conexão DBAPI do psycopg2 (para cursores) retirada do mesmo pool
+# Ao sair do bloco a conexão volta ao pool; transações não confirmadas são desfeitas
+@contextmanager
+def conexao_dbapi():
+    engine = get_engine()
+    inicio = time.perf_counter()
+    conn = engine.raw_connection()
+    _registrar_checkout(inicio, engine)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+# Função para consultar as métricas do pool
+def metricas_pool():
+    with _lock:
+        metricas = dict(_metricas)
+    engine = _engine
+    if engine is not None:
+        metricas['em_uso'] = engine.pool.checkedout()
+        metricas['overflow'] = max(engine.pool.overflow(), 0)
+        metricas['tamanho'] = engine.pool.size()
+    else:
+        metricas['em_uso'] = 0
+        metricas['overflow'] = 0
+        metricas['tamanho'] = 0
+    metricas['overflow_max'] = max(metricas['overflow_max'], 0)
+    metricas['espera_media'] = metricas['espera_total'] / metricas['checkouts'] if metricas['checkouts'] else 0.0
+    return metricas
@@ -0,0 +1,96 @@
+# Extração de domínios a partir de URLs
+#
+# Regras especiais por portal (ex.: seções estaduais do G1) ficam na tabela
+# REGRAS_DOMINIO; para incluir um novo portal basta adicionar uma entrada.
+
+import re
+
+import numpy as np
+import pandas as pd
+
+# Regras especiais: se a URL contém o 'marcador', o domínio retornado é
+# '<dominio>/<secao>' quando 'padrao_secao' encontra a seção, ou apenas '<dominio>'.
+# A primeira regra cujo marcador aparece na URL é aplicada. O padrão deve ter
+# um único grupo de captura, nomeado 'secao'.
+REGRAS_DOMINIO = [
+    {
+        'marcador': 'g1.globo.com',
+        'padrao_secao': r'g1\.globo\.com/(?P<secao>[a-z]{2})/',  # Página específica do estado
+        'dominio': 'g1.globo.com'
+    },
+]
+
+# Regex para extrair o domínio principal e suas terminações
+PADRAO_DOMINIO = r'https?://(?:www\d*\.)?(?P<dominio>[a-zA-Z0-9-]+(?:\.[a-zA-Z]{2,})+)'
+
+_regex_dominio = re.compile(PADRAO_DOMINIO)
+_regras_compiladas = [
+    (regra['marcador'], re.compile(regra['padrao_secao']), regra['dominio'])
+    for regra in REGRAS_DOMINIO
+]
+
+
+# Função para extrair domínio de uma única URL
+def extrair_dominio(url):
+    if not isinstance(url, str):
+        return None
+    for marcador, regex_secao, dominio in _regras_compiladas:
+        if marcador in url:
+            match_secao = regex_secao.search(url)
+            if match_secao:
+                return f"{dominio}/{match_secao.group(1)}"
+            return dominio
+    match = _regex_dominio.search(url)
+    if match:
+        return match.group(1)  # Retorna o domínio principal
+    return None
+
+
+# Função para aplicar um padrão com um grupo de captura a um array de textos
+# (None onde não há correspondência)
+def _extrair_grupo(textos, padrao):
+    extraidos = pd.Series(textos, dtype=object).str.extract(padrao, expand=False)
+    return np.where(extraidos.isna(), None, extraidos.astype(object))
+
+
+# Função para marcar os textos que contêm um trecho literal
+def _contem(textos, trecho):
+    return pd.Series(textos, dtype=object).str.contains(trecho, regex=False).to_numpy(dtype=bool)
+
+
+# Função para extrair os domínios de uma coluna inteira de URLs
+# Cada URL distinta é processada uma única vez e o resultado é replicado
+# para as linhas repetidas; o retorno é equivalente a serie.apply(extrair_dominio)
+def extrair_dominios(urls):
+    serie = urls if isinstance(urls, pd.Series) else pd.Series(urls)
+
+    codigos, unicos = pd.factorize(serie)
+    unicos = np.asarray(unicos, dtype=object)
+    resultado = np.full(len(unicos), None, dtype=object)
+
+    # Apenas textos são considerados; demais valores resultam em None
+    eh_texto = np.fromiter((isinstance(valor, str) for valor in unicos), dtype=bool, count=len(unicos))
+    posicoes_texto = np.flatnonzero(eh_texto)
+    textos = unicos[posicoes_texto]
+    pendentes = np.ones(len(textos), dtype=bool)
+
+    for regra in REGRAS_DOMINIO:
+        if not pendentes.any():
+            break
+        contem = np.zeros(len(textos), dtype=bool)
+        contem[pendentes] = _contem(textos[pendentes], regra['marcador'])
+        if not contem.any():
+            continue
+        secoes = _extrair_grupo(textos[contem], regra['padrao_secao'])
+        resultado[posicoes_texto[contem]] = [
+            regra['dominio'] if secao is None else f"{regra['dominio']}/{secao}"
+            for secao in secoes
+        ]
+        pendentes &= ~contem
+
+    if pendentes.any():
+        resultado[posicoes_texto[pendentes]] = _extrair_grupo(textos[pendentes], PADRAO_DOMINIO)
+
+    # Código -1 (valores ausentes) aponta para o None adicionado ao final
+    resultado = np.append(resultado, None)
+    return pd.Series(resultado[codigos], index=serie.index, name=serie.name, dtype=object)
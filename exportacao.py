@@ -0,0 +1,253 @@
+# Exportação de dados em CSV, CSV compactado (gzip), XLSX e Parquet
+#
+# Os escritores consomem um iterável de DataFrames (blocos) e gravam cada bloco
+# assim que ele chega, de modo que a memória usada depende do tamanho do bloco
+# e não do total de linhas exportadas.
+
+import gzip
+import io
+import os
+import tempfile
+
+import pandas as pd
+import xlsxwriter
+
+import db
+
+# Linhas por bloco lido do banco ou fatiado de um DataFrame
+TAMANHO_BLOCO = 50000
+
+# Limite de linhas de uma planilha do Excel (incluindo o cabeçalho)
+LIMITE_LINHAS_XLSX = 1048576
+
+# Formatos disponíveis: nome exibido -> (extensão, tipo MIME)
+FORMATOS = {
+    'CSV': ('csv', 'text/csv'),
+    'CSV (gzip)': ('csv.gz', 'application/gzip'),
+    'XLSX': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+
+
+# Função para ler o resultado de uma consulta em blocos usando cursor no servidor
+def ler_em_blocos(query, params=None, tamanho_bloco=TAMANHO_BLOCO):
+    with db.conexao() as connection:
+        connection = connection.execution_options(stream_results=True, max_row_buffer=tamanho_bloco)
+        for bloco in pd.read_sql(query, connection, params=params, chunksize=tamanho_bloco):
+            yield bloco
+
+
+# Função para fatiar um DataFrame já carregado em blocos
+def blocos_dataframe(df, tamanho_bloco=TAMANHO_BLOCO):
+    if df.empty:
+        yield df
+        return
+    for inicio in range(0, len(df), tamanho_bloco):
+        yield df.iloc[inicio:inicio + tamanho_bloco]
+
+
+# Função para gravar os blocos em CSV (opcionalmente compactado com gzip)
+def escrever_csv(blocos, destino, comprimir=False):
+    arquivo = gzip.GzipFile(fileobj=destino, mode='wb') if comprimir else destino
+    texto = io.TextIOWrapper(arquivo, encoding='utf-8', newline='')
+    try:
+        cabecalho = True
+        for bloco in blocos:
+            bloco.to_csv(texto, index=False, header=cabecalho)
+            cabecalho = False
+        texto.flush()
+    finally:
+        # Desacopla o wrapper para não fechar o arquivo de destino
+        texto.detach()
+        if comprimir:
+            arquivo.close()
+
+
+# Função para converter valores ausentes em células vazias do Excel
+def _valor_celula(valor):
+    if valor is None or valor is pd.NaT:
+        return None
+    if isinstance(valor, float) and valor != valor:
+        return None
+    return valor
+
+
+# Função para gravar os blocos em XLSX com o modo de memória constante do xlsxwriter
+def escrever_xlsx(blocos, destino, nome_aba='Dados'):
+    workbook = xlsxwriter.Workbook(destino, {
+        'constant_memory': True,
+        'in_memory': False,
+        'strings_to_urls': False,  # URLs como texto (sem o limite de 65.530 links por aba)
+        'default_date_format': 'yyyy-mm-dd',
+        'remove_timezone': True,
+    })
+    try:
+        worksheet = None
+        colunas = None
+        linha = 0
+        abas = 0
+        for bloco in blocos:
+            if colunas is None:
+                colunas = list(bloco.columns)
+            for valores in bloco.astype(object).itertuples(index=False, name=None):
+                # Abre uma nova aba quando a atual atinge o limite do Excel
+                if worksheet is None or linha >= LIMITE_LINHAS_XLSX:
+                    abas += 1
+                    worksheet = workbook.add_worksheet(nome_aba if abas == 1 else f"{nome_aba}_{abas}")
+                    worksheet.write_row(0, 0, colunas)
+                    linha = 1
+                worksheet.write_row(linha, 0, [_valor_celula(v) for v in valores])
+                linha += 1
+        if worksheet is None:
+            worksheet = workbook.add_worksheet(nome_aba)
+            worksheet.write_row(0, 0, colunas or [])
+    finally:
+        workbook.close()
+
+
+# Função para obter o tipo do Arrow/Parquet de um tipo declarado no PostgreSQL
+# (information_schema.columns.data_type); tipos não listados são gravados como texto
+def tipo_arrow_db(tipo):
+    import pyarrow as pa
+    tipos = {
+        'smallint': pa.int16(),
+        'integer': pa.int32(),
+        'bigint': pa.int64(),
+        'real': pa.float32(),
+        'double precision': pa.float64(),
+        'numeric': pa.float64(),
+        'boolean': pa.bool_(),
+        'date': pa.date32(),
+        'timestamp without time zone': pa.timestamp('us'),
+        'timestamp with time zone': pa.timestamp('us', tz='UTC'),
+        'text': pa.string(),
+        'character varying': pa.string(),
+        'character': pa.string(),
+    }
+    return tipos.get(tipo, pa.string())
+
+
+# Função para montar o esquema do Arrow das colunas a partir dos tipos declarados no
+# banco ({coluna: data_type}); usado para fixar os tipos dos arquivos Parquet
+def esquema_arrow(tipos_db):
+    import pyarrow as pa
+    return pa.schema([pa.field(coluna, tipo_arrow_db(tipo)) for coluna, tipo in tipos_db.items()])
+
+
+# Função para converter um bloco em tabela do Arrow (sem o índice e sem os metadados do pandas,
+# que descreveriam os tipos do bloco e não os da coluna no arquivo)
+def _tabela_arrow(bloco):
+    import pyarrow as pa
+    return pa.Table.from_pandas(bloco, preserve_index=False).replace_schema_metadata(None)
+
+
+# Função para unificar os esquemas dos blocos promovendo os tipos (nulo -> texto,
+# int8 -> int16 -> double, ...); colunas com tipos incompatíveis viram texto
+def _unificar_esquemas(esquemas):
+    import pyarrow as pa
+    try:
+        return pa.unify_schemas(esquemas, promote_options='permissive')
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        nomes = list(dict.fromkeys(nome for esquema in esquemas for nome in esquema.names))
+        campos = []
+        for nome in nomes:
+            tipos_coluna = [pa.schema([esquema.field(nome)]) for esquema in esquemas if nome in esquema.names]
+            try:
+                campos.append(pa.unify_schemas(tipos_coluna, promote_options='permissive').field(nome))
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                campos.append(pa.field(nome, pa.string()))
+        return pa.schema(campos)
+
+
+# Função para ajustar uma tabela ao esquema do arquivo (ordem das colunas, colunas ausentes e tipos)
+def _ajustar_tabela(tabela, esquema):
+    import pyarrow as pa
+    colunas = [
+        tabela.column(campo.name) if campo.name in tabela.column_names else pa.nulls(len(tabela), campo.type)
+        for campo in esquema
+    ]
+    return pa.Table.from_arrays(colunas, names=esquema.names).cast(esquema)
+
+
+# Função para gravar os blocos em Parquet
+# O esquema do arquivo não pode vir só do primeiro bloco: uma coluna nula nos primeiros
+# meses ou um inteiro compacto que cresce depois quebrariam a gravação dos blocos seguintes.
+# - com 'esquema' (pa.Schema com os tipos declarados no banco, ver esquema_arrow)
+#   cobrindo todas as colunas, cada bloco é convertido para ele e gravado direto;
+# - caso contrário, os blocos vão para arquivos temporários do Arrow e são gravados numa
+#   segunda passada, com o esquema unificado de todos os blocos (os tipos de 'esquema',
+#   quando informado, prevalecem)
+def escrever_parquet(blocos, destino, esquema=None):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    tipos_declarados = {campo.name: campo.type for campo in esquema} if esquema is not None else {}
+    blocos = iter(blocos)
+    primeiro = next(blocos, None)
+    if primeiro is None:
+        return
+    tabela = _tabela_arrow(primeiro)
+
+    if all(nome in tipos_declarados for nome in tabela.column_names):
+        esquema_arquivo = pa.schema([pa.field(nome, tipos_declarados[nome]) for nome in tabela.column_names])
+        with pq.ParquetWriter(destino, esquema_arquivo) as writer:
+            writer.write_table(_ajustar_tabela(tabela, esquema_arquivo))
+            for bloco in blocos:
+                writer.write_table(_ajustar_tabela(_tabela_arrow(bloco), esquema_arquivo))
+        return
+
+    with tempfile.TemporaryDirectory(prefix='parquet_') as diretorio:
+        caminhos = []
+        esquemas = []
+        while tabela is not None:
+            caminho = os.path.join(diretorio, f"{len(caminhos)}.arrow")
+            with pa.OSFile(caminho, 'wb') as arquivo, pa.ipc.new_file(arquivo, tabela.schema) as escritor:
+                escritor.write_table(tabela)
+            caminhos.append(caminho)
+            esquemas.append(tabela.schema)
+            bloco = next(blocos, None)
+            tabela = _tabela_arrow(bloco) if bloco is not None else None
+
+        esquema_arquivo = _unificar_esquemas(esquemas)
+        esquema_arquivo = pa.schema([
+            pa.field(campo.name, tipos_declarados.get(campo.name, campo.type)) for campo in esquema_arquivo
+        ])
+        with pq.ParquetWriter(destino, esquema_arquivo) as writer:
+            for caminho in caminhos:
+                with pa.memory_map(caminho) as arquivo:
+                    writer.write_table(_ajustar_tabela(pa.ipc.open_file(arquivo).read_all(), esquema_arquivo))
+
+
+# Função para gravar os blocos no formato escolhido em um arquivo binário aberto
+# ('esquema' é usado apenas pelo Parquet)
+def escrever(blocos, formato, destino, esquema=None):
+    if formato == 'CSV':
+        escrever_csv(blocos, destino)
+    elif formato == 'CSV (gzip)':
+        escrever_csv(blocos, destino, comprimir=True)
+    elif formato == 'XLSX':
+        escrever_xlsx(blocos, destino)
+    elif formato == 'Parquet':
+        escrever_parquet(blocos, destino, esquema)
+    else:
+        raise ValueError(f"Formato de exportação desconhecido: {formato}")
+
+
+# Função para gerar a exportação em um arquivo temporário no disco
+# Retorna o arquivo reaberto somente para leitura (io.BufferedReader, aceito pelo
+# st.download_button); o nome é removido logo após a reabertura, então o espaço
+# em disco é liberado quando o objeto retornado é fechado
+def exportar(blocos, formato, esquema=None):
+    destino = tempfile.NamedTemporaryFile(prefix='exportacao_', delete=False)
+    try:
+        with destino:
+            escrever(blocos, formato, destino, esquema)
+        return open(destino.name, 'rb')
+    finally:
+        os.unlink(destino.name)
+
+
+# Função para gerar a exportação e devolver o conteúdo em bytes (fecha o arquivo temporário)
+def exportar_bytes(blocos, formato, esquema=None):
+    with exportar(blocos, formato, esquema) as arquivo:
+        return arquivo.read()
@@ -0,0 +1,296 @@
+# Índice de aliases para levar os hosts das URLs ao 'targets' canônico da tabela
+#
+# O índice é construído uma vez sobre os valores distintos de 'targets'. Cada URL
+# é resolvida pelo seu host e pela primeira parte do caminho, nesta ordem:
+#   1. host + seção (ex.: g1.globo.com/sp, uol.com.br/esporte), para qualquer
+#      'targets' com seção, não só os das regras de dominios.REGRAS_DOMINIO;
+#   2. host sem prefixos de acesso (www, www2, m., amp., mobile., wap.);
+#   3. domínios-pai do host até o domínio registrável, respeitando sufixos públicos
+#      compostos (blog.folha.uol.com.br -> folha.uol.com.br -> uol.com.br).
+# URLs sem alias ficam com o domínio de dominios.extrair_dominios.
+#
+# Para os domínios que continuam fora da tabela, o MinHash dos trigramas (com LSH
+# em bandas) sugere o domínio conhecido mais parecido. Os trigramas e as
+# assinaturas são calculados em lote com numpy, sem laços por caractere.
+
+import re
+
+import numpy as np
+import pandas as pd
+
+import cache
+import dominios
+import indice_targets
+
+# Sufixos públicos com mais de um rótulo (o domínio registrável tem um rótulo a mais)
+SUFIXOS_PUBLICOS = frozenset({
+    'com.br', 'net.br', 'org.br', 'gov.br', 'edu.br', 'art.br', 'blog.br', 'eco.br',
+    'emp.br', 'esp.br', 'etc.br', 'ind.br', 'inf.br', 'jus.br', 'leg.br', 'mil.br',
+    'mp.br', 'nom.br', 'rec.br', 'tur.br', 'tv.br', 'wiki.br',
+    'com.ar', 'gob.ar', 'org.ar', 'com.mx', 'gob.mx', 'org.mx', 'com.co', 'gov.co',
+    'com.pe', 'gob.pe', 'com.uy', 'gub.uy', 'com.py', 'gov.py', 'cl.cl', 'gob.cl',
+    'co.uk', 'org.uk', 'gov.uk', 'ac.uk', 'com.au', 'net.au', 'org.au', 'gov.au',
+    'co.jp', 'ne.jp', 'or.jp', 'co.nz', 'co.za', 'com.pt', 'gov.pt', 'org.pt',
+    'com.es', 'org.es', 'com.cn', 'com.hk', 'com.sg', 'com.tr', 'co.in', 'co.kr',
+    # Sufixos de plataformas em que cada subdomínio é um site diferente
+    'blogspot.com', 'blogspot.com.br', 'wordpress.com', 'github.io', 'wixsite.com',
+    'appspot.com', 'herokuapp.com', 'netlify.app', 'vercel.app',
+})
+
+# Prefixos de acesso removidos do início do host (podem se repetir: m.www.site.com),
+# desde que sobre um host com pelo menos um ponto
+PADRAO_PREFIXO_ACESSO = re.compile(r'^(?:(?:www\d*|m|amp|mobile|wap)\.)+(?=[^.]+\.[^.])')
+
+# Host (com pelo menos um ponto) e primeira parte do caminho de uma URL
+_regex_url = re.compile(
+    r'^\s*(?:[a-zA-Z][a-zA-Z0-9+.-]*://)?(?:[^@/?#\s]*@)?'
+    r'(?P<host>[^/:?#@\s]+\.[^/:?#@\s]+?)\.?(?::\d+)?(?:/(?P<secao>[^/?#\s]+))?(?:[/?#]|\s*$)'
+)
+
+# Valores por assinatura MinHash; cada par de valores (32 + 32 bits) forma uma banda do LSH
+NUM_HASHES = 16
+# Baldes com mais domínios que isto são ignorados (trigramas comuns, pouco informativos)
+MAX_POR_BALDE = 50
+# Candidatos de cada domínio confirmados pela similaridade exata e similaridade
+# mínima (Jaccard dos trigramas) para sugerir um domínio
+CANDIDATOS_CONFIRMADOS = 5
+SIMILARIDADE_MINIMA = 0.5
+# Bytes considerados de cada domínio e domínios por lote no cálculo das assinaturas
+TAMANHO_MAXIMO = 64
+TAMANHO_LOTE = 8192
+SEMENTE = 20240601
+
+# Código de 6 bits por caractere (0 = fim do texto); '^' e '$' marcam início e fim
+_ALFABETO = np.full(256, 63, dtype=np.int64)
+_ALFABETO[0] = 0
+for _posicao, _caractere in enumerate('abcdefghijklmnopqrstuvwxyz0123456789-.^$/_', start=1):
+    _ALFABETO[ord(_caractere)] = _posicao
+_SENTINELA = 64 ** 3
+
+# Tabela de hash por trigrama (tabulação): uma linha aleatória por trigrama possível;
+# a linha sentinela (posições sem trigrama) tem o maior valor e nunca é o mínimo
+_estado = {'tabela': None}
+
+
+# Função para obter a tabela de hash dos trigramas (criada no primeiro uso)
+def _tabela_hash():
+    if _estado['tabela'] is None:
+        gerador = np.random.default_rng(SEMENTE)
+        tabela = gerador.integers(0, np.iinfo(np.uint32).max, size=(_SENTINELA + 1, NUM_HASHES),
+                                  dtype=np.uint32, endpoint=False)
+        tabela[_SENTINELA] = np.iinfo(np.uint32).max
+        _estado['tabela'] = tabela
+    return _estado['tabela']
+
+
+# Função para remover os prefixos de acesso e normalizar um host
+def normalizar_host(host):
+    return PADRAO_PREFIXO_ACESSO.sub('', host.strip().lower().rstrip('.'), count=1)
+
+
+# Função para obter a quantidade de rótulos do sufixo público de um host (já separado)
+def _rotulos_sufixo(rotulos):
+    for tamanho in (3, 2):
+        if len(rotulos) > tamanho and '.'.join(rotulos[-tamanho:]) in SUFIXOS_PUBLICOS:
+            return tamanho
+    return 1
+
+
+# Função para obter o domínio registrável de um host (ex.: blog.site.com.br -> site.com.br)
+def dominio_registravel(host):
+    rotulos = host.split('.')
+    return '.'.join(rotulos[-_rotulos_sufixo(rotulos) - 1:])
+
+
+# Função para obter o nome comparado nas sugestões: o host sem o sufixo público
+# (site.com e site.com.br ficam iguais; trigramas de sufixos comuns não pesam)
+def nome_sem_sufixo(host):
+    rotulos = host.split('.')
+    tamanho = _rotulos_sufixo(rotulos)
+    return '.'.join(rotulos[:-tamanho]) if len(rotulos) > tamanho else host
+
+
+# Função para listar o host e seus domínios-pai até o domínio registrável
+def ancestrais(host):
+    registravel = dominio_registravel(host)
+    hosts = [host]
+    while hosts[-1] != registravel and '.' in hosts[-1]:
+        hosts.append(hosts[-1].split('.', 1)[1])
+    return hosts
+
+
+# Função para calcular as assinaturas MinHash (n x NUM_HASHES) de uma lista de textos
+def assinaturas(textos):
+    tabela = _tabela_hash()
+    resultado = np.empty((len(textos), NUM_HASHES), dtype=np.uint32)
+    for inicio in range(0, len(textos), TAMANHO_LOTE):
+        lote = textos[inicio:inicio + TAMANHO_LOTE]
+        brutos = np.array(
+            [f'^{texto}$'.encode('ascii', 'replace')[:TAMANHO_MAXIMO] for texto in lote],
+            dtype=f'S{TAMANHO_MAXIMO}'
+        )
+        codigos = _ALFABETO[brutos.view(np.uint8).reshape(len(lote), TAMANHO_MAXIMO)]
+        trigramas = codigos[:, :-2] * 4096 + codigos[:, 1:-1] * 64 + codigos[:, 2:]
+        # Posições que passam do fim do texto não formam trigramas
+        trigramas[codigos[:, 2:] == 0] = _SENTINELA
+        resultado[inicio:inicio + len(lote)] = tabela[trigramas].min(axis=1)
+    return resultado
+
+
+# Função para obter os trigramas de um nome, com as marcas de início e fim
+def _trigramas_nome(nome):
+    return indice_targets.trigramas(f'^{nome}$')
+
+
+# Função para calcular a similaridade de Jaccard entre dois conjuntos de trigramas
+def _jaccard(trigramas_a, trigramas_b):
+    comuns = len(trigramas_a & trigramas_b)
+    uniao = len(trigramas_a) + len(trigramas_b) - comuns
+    return comuns / uniao if uniao else 0.0
+
+
+# Função para montar a tabela (banda, chave do balde, id) das assinaturas
+def _bandas(assinaturas_, coluna_id):
+    chaves = np.ascontiguousarray(assinaturas_).view(np.uint64)
+    num_bandas = chaves.shape[1]
+    return pd.DataFrame({
+        'banda': np.tile(np.arange(num_bandas, dtype=np.int8), len(chaves)),
+        'chave': chaves.ravel(),
+        coluna_id: np.repeat(np.arange(len(chaves), dtype=np.int64), num_bandas),
+    })
+
+
+# Função para construir o índice a partir dos valores de 'targets' (podem se repetir)
+def construir_indice(targets):
+    distintos = pd.unique(pd.Series(targets, dtype=object).dropna().astype(str).to_numpy(dtype=object))
+
+    # Alias normalizado -> target canônico (o próprio target tem prioridade)
+    aliases = {}
+    for target in distintos:
+        host, _, secao = target.partition('/')
+        host = normalizar_host(host)
+        chave = f"{host}/{secao.lower()}" if secao else host
+        if chave == target or chave not in aliases:
+            aliases[chave] = target
+
+    # Hosts conhecidos (sem seção) para as sugestões por similaridade
+    hosts = np.array(sorted(chave for chave in aliases if '/' not in chave), dtype=object)
+    nomes = np.array([nome_sem_sufixo(host) for host in hosts], dtype=object)
+    assinaturas_hosts = assinaturas(nomes)
+    bandas = _bandas(assinaturas_hosts, 'id')
+    tamanhos = bandas.groupby(['banda', 'chave'])['id'].transform('size')
+    bandas = bandas[tamanhos.to_numpy() <= MAX_POR_BALDE]
+
+    return {
+        'chave': cache.hash_conteudo('indice_canonico', pd.Series(distintos, dtype=object)),
+        'aliases': aliases,
+        'conhecidos': frozenset(distintos),
+        'secoes': frozenset(chave.partition('/')[2] for chave in aliases if '/' in chave),
+        'hosts': hosts,
+        'nomes': nomes,
+        'assinaturas': assinaturas_hosts,
+        'bandas': bandas,
+    }
+
+
+# Função para procurar o primeiro candidato presente no índice de aliases
+def _primeiro_alias(aliases, candidatos):
+    for candidato in candidatos:
+        target = aliases.get(candidato)
+        if target is not None:
+            return target
+    return None
+
+
+# Função para resolver um host e a seção do caminho pelo índice de aliases
+# Retorna (target pela seção, target pelo host); cada um pode ser None
+def resolver(indice, host, secao=None):
+    aliases = indice['aliases']
+    host = normalizar_host(host)
+    secao = secao.lower() if secao and secao.lower() in indice['secoes'] else None
+
+    # Caminho rápido: o próprio host é um alias e não há seção a procurar
+    pelo_host = aliases.get(host)
+    if pelo_host is not None and secao is None:
+        return None, pelo_host
+
+    hosts = ancestrais(host)
+    pela_secao = _primeiro_alias(aliases, [f"{h}/{secao}" for h in hosts]) if secao else None
+    return pela_secao, pelo_host or _primeiro_alias(aliases, hosts[1:])
+
+
+# Função para levar uma coluna de URLs aos 'targets' canônicos
+# Cada par (host, seção) distinto é resolvido uma única vez. Prioridade: alias com seção,
+# domínio extraído que já está na tabela, alias pelo host e, por fim, o domínio extraído
+def canonicalizar(indice, urls):
+    serie = urls if isinstance(urls, pd.Series) else pd.Series(urls)
+    extraidos = dominios.extrair_dominios(serie)
+
+    codigos, unicos = pd.factorize(serie)
+    # Posição extra ao final para o código -1 (URL ausente): fica None
+    pela_secao = np.full(len(unicos) + 1, None, dtype=object)
+    pelo_host = np.full(len(unicos) + 1, None, dtype=object)
+    resolvidos = {}
+    for posicao, url in enumerate(np.asarray(unicos, dtype=object)):
+        partes = _regex_url.match(url) if isinstance(url, str) else None
+        if partes is None:
+            continue
+        par = (partes['host'].lower(), partes['secao'])
+        if par not in resolvidos:
+            resolvidos[par] = resolver(indice, *par)
+        pela_secao[posicao], pelo_host[posicao] = resolvidos[par]
+
+    def por_url(valores):
+        return pd.Series(valores[codigos], index=serie.index, name=serie.name, dtype=object)
+
+    conhecidos = extraidos.where(extraidos.isin(indice['conhecidos']))
+    return (
+        por_url(pela_secao)
+        .fillna(conhecidos)
+        .fillna(por_url(pelo_host))
+        .fillna(extraidos)
+        .astype(object)
+    )
+
+
+# Função para sugerir o domínio conhecido mais parecido para os domínios fora da tabela
+# Os candidatos vêm do LSH; os mais promissores pela estimativa do MinHash são
+# confirmados pela similaridade exata (Jaccard dos trigramas dos nomes sem sufixo).
+# Retorna um DataFrame com 'dominio', 'sugestao' e 'similaridade'
+def sugerir(indice, dominios_sem_dados, similaridade_minima=SIMILARIDADE_MINIMA):
+    colunas = ['dominio', 'sugestao', 'similaridade']
+    originais = pd.unique(pd.Series(dominios_sem_dados, dtype=object).dropna().astype(str).to_numpy(dtype=object))
+    if not len(originais) or not len(indice['hosts']):
+        return pd.DataFrame(columns=colunas)
+
+    nomes = np.array([nome_sem_sufixo(normalizar_host(d.partition('/')[0])) for d in originais], dtype=object)
+    assinaturas_consulta = assinaturas(nomes)
+
+    # Pares candidatos: domínios que caem no mesmo balde em alguma banda
+    pares = _bandas(assinaturas_consulta, 'consulta').merge(indice['bandas'], on=['banda', 'chave'])
+    pares = pares[['consulta', 'id']].drop_duplicates()
+    if pares.empty:
+        return pd.DataFrame(columns=colunas)
+    pares['estimada'] = (
+        assinaturas_consulta[pares['consulta'].to_numpy()] == indice['assinaturas'][pares['id'].to_numpy()]
+    ).mean(axis=1)
+
+    # Confirmação exata apenas dos melhores candidatos de cada domínio
+    pares = pares.sort_values(['consulta', 'estimada'], ascending=[True, False])
+    pares = pares[pares.groupby('consulta').cumcount() < CANDIDATOS_CONFIRMADOS]
+    # Trigramas calculados uma vez por nome (cada nome aparece em vários pares)
+    consultas, ids = pares['consulta'].to_numpy(), pares['id'].to_numpy()
+    trigramas_consulta = {c: _trigramas_nome(nomes[c]) for c in np.unique(consultas)}
+    trigramas_indice = {i: _trigramas_nome(indice['nomes'][i]) for i in np.unique(ids)}
+    pares['similaridade'] = [
+        _jaccard(trigramas_consulta[c], trigramas_indice[i]) for c, i in zip(consultas, ids)
+    ]
+    melhores = pares[pares['similaridade'] >= similaridade_minima]
+    melhores = melhores.sort_values(['consulta', 'similaridade'], ascending=[True, False]).drop_duplicates('consulta')
+
+    aliases = indice['aliases']
+    return pd.DataFrame({
+        'dominio': originais[melhores['consulta'].to_numpy()],
+        'sugestao': [aliases[host] for host in indice['hosts'][melhores['id'].to_numpy()]],
+        'similaridade': melhores['similaridade'].round(3).to_numpy(),
+    })
@@ -0,0 +1,134 @@
+# Índice de trigramas para busca de substrings e prefixos em 'targets'
+#
+# O índice é construído uma vez sobre os valores distintos de uma coluna e
+# responde, sem percorrer todas as linhas:
+#   - quais valores contêm um trecho (sem diferenciar maiúsculas/minúsculas);
+#   - quais linhas da coluna original têm esses valores;
+#   - sugestões de valores para um texto digitado (autocompletar).
+
+import bisect
+
+import numpy as np
+import pandas as pd
+
+
+# Quantidade de valores a partir da qual as linhas são obtidas por máscara
+LIMITE_FATIAS = 1000
+
+
+# Função para gerar os trigramas de um texto
+def trigramas(texto):
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+# Função para construir o índice a partir de uma coluna (valores podem se repetir)
+def construir_indice(valores):
+    codigos, distintos = pd.factorize(pd.Series(valores, dtype=object))
+    distintos = [str(valor) for valor in distintos]
+    minusculos = [valor.lower() for valor in distintos]
+
+    # Listas de ocorrência: trigrama -> ids dos valores distintos que o contêm
+    postagens = {}
+    for id_valor, texto in enumerate(minusculos):
+        for trigrama in trigramas(texto):
+            postagens.setdefault(trigrama, []).append(id_valor)
+    postagens = {trigrama: np.array(ids, dtype=np.int64) for trigrama, ids in postagens.items()}
+
+    # Linhas de cada valor: as linhas ficam agrupadas por código, em ordem crescente
+    validos = codigos >= 0
+    ordem = np.flatnonzero(validos)[np.argsort(codigos[validos], kind='stable')]
+    contagens = np.bincount(codigos[validos], minlength=len(distintos))
+    inicios = np.concatenate(([0], np.cumsum(contagens)[:-1])) if len(distintos) else np.array([], dtype=np.int64)
+
+    # Valores ordenados para a busca por prefixo
+    ordenados = sorted(range(len(distintos)), key=minusculos.__getitem__)
+
+    return {
+        'valores': distintos,
+        'codigos': codigos,
+        'minusculos': minusculos,
+        'postagens': postagens,
+        'ordem_linhas': ordem,
+        'inicios': inicios,
+        'contagens': contagens,
+        'ordenados': ordenados,
+        'chaves_ordenadas': [minusculos[i] for i in ordenados],
+    }
+
+
+# Função para obter os ids dos valores distintos que contêm o trecho
+def buscar(indice, trecho):
+    trecho = (trecho or '').strip().lower()
+    minusculos = indice['minusculos']
+    if not trecho:
+        return np.arange(len(minusculos), dtype=np.int64)
+
+    # Trechos curtos não têm trigramas: percorre apenas os valores distintos
+    if len(trecho) < 3:
+        return np.array([i for i, texto in enumerate(minusculos) if trecho in texto], dtype=np.int64)
+
+    listas = []
+    for trigrama in trigramas(trecho):
+        ids = indice['postagens'].get(trigrama)
+        if ids is None:
+            return np.array([], dtype=np.int64)
+        listas.append(ids)
+
+    # Interseção começando pela lista mais curta; depois confirma o trecho inteiro
+    listas.sort(key=len)
+    candidatos = listas[0]
+    for ids in listas[1:]:
+        candidatos = np.intersect1d(candidatos, ids, assume_unique=True)
+        if not len(candidatos):
+            break
+    return np.array([i for i in candidatos if trecho in minusculos[i]], dtype=np.int64)
+
+
+# Função para obter as posições (linhas) da coluna original que contêm o trecho
+def linhas(indice, trecho):
+    ids = buscar(indice, trecho)
+    if not len(ids):
+        return np.array([], dtype=np.int64)
+
+    # Muitos valores: uma máscara sobre os códigos é mais rápida que juntar fatias
+    if len(ids) > LIMITE_FATIAS:
+        selecionados = np.zeros(len(indice['valores']) + 1, dtype=bool)
+        selecionados[ids] = True
+        # O código -1 (valor ausente) aponta para a última posição, sempre False
+        return np.flatnonzero(selecionados[indice['codigos']])
+
+    inicios = indice['inicios'][ids]
+    contagens = indice['contagens'][ids]
+    partes = [indice['ordem_linhas'][inicio:inicio + contagem] for inicio, contagem in zip(inicios, contagens)]
+    return np.sort(np.concatenate(partes))
+
+
+# Função para obter os ids dos valores que começam com o prefixo
+def buscar_prefixo(indice, prefixo, limite=None):
+    prefixo = (prefixo or '').strip().lower()
+    chaves = indice['chaves_ordenadas']
+    inicio = bisect.bisect_left(chaves, prefixo)
+    fim = len(chaves) if limite is None else min(len(chaves), inicio + limite)
+    ids = []
+    for posicao in range(inicio, fim):
+        if not chaves[posicao].startswith(prefixo):
+            break
+        ids.append(indice['ordenados'][posicao])
+    return ids
+
+
+# Função para sugerir valores para o texto digitado:
+# primeiro os que começam com o texto, depois os que apenas o contêm
+def sugerir(indice, texto, limite=10):
+    texto = (texto or '').strip().lower()
+    if not texto:
+        return []
+    ids = buscar_prefixo(indice, texto, limite)
+    if len(ids) < limite:
+        vistos = set(ids)
+        contem = sorted(
+            (i for i in buscar(indice, texto) if i not in vistos),
+            key=lambda i: (len(indice['minusculos'][i]), indice['minusculos'][i])
+        )
+        ids.extend(contem[:limite - len(ids)])
+    return [indice['valores'][i] for i in ids]
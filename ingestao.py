@@ -0,0 +1,141 @@
+# Leitura em blocos de arquivos CSV/XLSX enviados pelo usuário e enriquecimento
+# de cada bloco com as informações do banco
+#
+# Nenhuma etapa mantém o arquivo inteiro em memória: cada bloco é lido, tem os
+# domínios extraídos, é cruzado com o banco e repassado ao escritor de saída.
+
+import os
+
+import openpyxl
+import pandas as pd
+
+from dominios import extrair_dominios
+
+# Linhas por bloco lido do arquivo
+TAMANHO_BLOCO = 100000
+
+
+# Função para verificar se o arquivo é um CSV pelo nome
+def eh_csv(nome):
+    return nome.lower().endswith('.csv')
+
+
+# Função para obter o tamanho total (em bytes) de um arquivo aberto
+def _tamanho_arquivo(arquivo):
+    tamanho = getattr(arquivo, 'size', None)
+    if tamanho is not None:
+        return tamanho
+    posicao = arquivo.tell()
+    arquivo.seek(0, os.SEEK_END)
+    tamanho = arquivo.tell()
+    arquivo.seek(posicao)
+    return tamanho
+
+
+# Função para ler apenas o cabeçalho (nomes das colunas) do arquivo
+def ler_colunas(arquivo, nome):
+    arquivo.seek(0)
+    try:
+        if eh_csv(nome):
+            return pd.read_csv(arquivo, nrows=0).columns.tolist()
+        workbook = openpyxl.load_workbook(arquivo, read_only=True, data_only=True)
+        try:
+            cabecalho = next(workbook.active.iter_rows(max_row=1, values_only=True), ())
+            return [str(col) for col in cabecalho if col is not None]
+        finally:
+            workbook.close()
+    finally:
+        arquivo.seek(0)
+
+
+# Função para montar os tipos das colunas lidas do CSV ({coluna: str})
+# Com chunksize, o pandas infere os tipos bloco a bloco: uma coluna vazia no primeiro
+# bloco (ex.: URLs ausentes) viria como float e nos seguintes como texto. Todas as
+# colunas (a de URLs e as repassadas do arquivo) são lidas como texto, com os valores
+# exatamente como foram enviados; células vazias continuam nulas
+def _tipos_csv(arquivo, nome, usecols):
+    colunas = usecols if usecols is not None else ler_colunas(arquivo, nome)
+    return {coluna: str for coluna in colunas}
+
+
+# Função para ler um CSV em blocos, apenas com as colunas pedidas
+def _ler_csv_em_blocos(arquivo, usecols, tipos, tamanho_bloco, progresso):
+    tamanho_total = _tamanho_arquivo(arquivo) or 1
+    leitor = pd.read_csv(arquivo, usecols=usecols, dtype=tipos, chunksize=tamanho_bloco)
+    with leitor:
+        for bloco in leitor:
+            if progresso:
+                progresso(min(arquivo.tell() / tamanho_total, 1.0))
+            yield bloco
+
+
+# Função para ler um XLSX em blocos com o modo somente leitura do openpyxl
+def _ler_xlsx_em_blocos(arquivo, usecols, tamanho_bloco, progresso):
+    workbook = openpyxl.load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        worksheet = workbook.active
+        total_linhas = max((worksheet.max_row or 1) - 1, 1)
+        linhas = worksheet.iter_rows(values_only=True)
+        cabecalho = [str(col) if col is not None else '' for col in next(linhas, ())]
+
+        indices = [i for i, col in enumerate(cabecalho) if usecols is None or col in usecols]
+        colunas = [cabecalho[i] for i in indices]
+
+        lidas = 0
+        bloco = []
+        for linha in linhas:
+            bloco.append([linha[i] if i < len(linha) else None for i in indices])
+            if len(bloco) >= tamanho_bloco:
+                lidas += len(bloco)
+                if progresso:
+                    progresso(min(lidas / total_linhas, 1.0))
+                yield pd.DataFrame(bloco, columns=colunas)
+                bloco = []
+        if bloco:
+            yield pd.DataFrame(bloco, columns=colunas)
+        if progresso:
+            progresso(1.0)
+    finally:
+        workbook.close()
+
+
+# Função para ler o arquivo enviado em blocos de DataFrames
+# 'progresso' (opcional) recebe a fração já lida do arquivo, entre 0 e 1
+def ler_em_blocos(arquivo, nome, usecols=None, tamanho_bloco=TAMANHO_BLOCO, progresso=None):
+    arquivo.seek(0)
+    if eh_csv(nome):
+        tipos = _tipos_csv(arquivo, nome, usecols)
+        return _ler_csv_em_blocos(arquivo, usecols, tipos, tamanho_bloco, progresso)
+    return _ler_xlsx_em_blocos(arquivo, usecols, tamanho_bloco, progresso)
+
+
+# Função para enriquecer cada bloco com as informações do banco
+# 'buscar_info' recebe uma lista de domínios e devolve um DataFrame com a coluna
+# 'targets' e as colunas do banco; cada domínio é consultado uma única vez.
+# 'extrair' leva a coluna de URLs aos domínios (ex.: indice_canonico.canonicalizar)
+# As respostas do banco ficam em uma lista (uma parte por consulta) e cada bloco junta,
+# em uma única concatenação, só as linhas dos seus domínios: nada cresce a cada bloco
+def enriquecer_em_blocos(blocos, coluna_url, buscar_info, colunas_db, extrair=extrair_dominios):
+    colunas_info = ['targets'] + [c for c in colunas_db if c != 'targets']
+    partes_info = []
+    consultados = set()
+
+    for bloco in blocos:
+        bloco = bloco.copy()
+        bloco['targets'] = extrair(bloco[coluna_url])
+
+        dominios_bloco = set(bloco['targets'].dropna().unique())
+        novos = sorted(dominios_bloco - consultados)
+        if novos:
+            df_info = buscar_info(novos)
+            consultados.update(novos)
+            if not df_info.empty:
+                partes_info.append(df_info[colunas_info])
+
+        linhas_bloco = [parte[parte['targets'].isin(dominios_bloco)] for parte in partes_info]
+        linhas_bloco = [linhas for linhas in linhas_bloco if not linhas.empty]
+        if linhas_bloco:
+            info_bloco = pd.concat(linhas_bloco, ignore_index=True) if len(linhas_bloco) > 1 else linhas_bloco[0]
+        else:
+            info_bloco = pd.DataFrame(columns=colunas_info)
+        yield bloco.merge(info_bloco, on='targets', how='left')
@@ -0,0 +1,382 @@
+# Enriquecimento em lote (sem interface) de arquivos CSV/XLSX com URLs
+#
+# Usa as mesmas etapas do upload do app: leitura em blocos, extração dos domínios,
+# busca no banco (ou na réplica local) e gravação em streaming no formato escolhido.
+# Os arquivos são processados em paralelo por um pool de processos que compartilham
+# um único cache de domínios (SQLite no diretório de saída), de modo que cada
+# domínio é consultado uma vez por execução, mesmo entre arquivos diferentes.
+#
+# O manifesto (_manifesto.json no diretório de saída) registra cada arquivo
+# concluído; uma execução interrompida pode ser repetida com os mesmos parâmetros
+# e continua a partir dos arquivos pendentes.
+#
+# Uso:
+#   python lote.py entrada/ saida/ --data 2024-06-01 --colunas users,bounce_rate
+#   python lote.py entrada/ saida/ --inicio 2024-01-01 --fim 2024-12-31 --formato-periodo largo \
+#       --colunas users --formato Parquet --processos 4
+
+import argparse
+import datetime
+import json
+import os
+import sqlite3
+import sys
+import time
+import tomllib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import busca_dominios
+import cache
+import consultas
+import db
+import exportacao
+import ingestao
+import pipeline_upload
+import replica
+import tipos
+
+ARQUIVO_MANIFESTO = '_manifesto.json'
+ARQUIVO_CACHE = '_cache_dominios.sqlite'
+EXTENSOES = ('.csv', '.xlsx')
+
+# Estado de cada processo do pool (definido em _iniciar_processo)
+_processo = {'parametros': None, 'cache': None, 'chave_cache': None, 'contadores': None, 'tipos': None}
+
+
+# Função para ler a configuração do banco e da réplica do arquivo de secrets do app
+def ler_configuracao(caminho):
+    with open(caminho, 'rb') as arquivo:
+        secrets = tomllib.load(arquivo)
+    banco = secrets['database']
+    return {
+        'db': {
+            'host': banco['host'],
+            'port': banco['port'],
+            'user': banco['user'],
+            'password': banco['password'],
+            'database': banco['name']
+        },
+        'pool': secrets.get('pool', {}),
+        'replica': secrets.get('replica', {}).get('diretorio'),
+    }
+
+
+# --- Cache de domínios compartilhado entre os processos ---
+
+# Função para abrir o cache de domínios (WAL permite leituras durante as gravações)
+# As linhas de cada domínio são guardadas em JSON: o arquivo fica no diretório de saída,
+# escolhido por quem executa, e ler o cache nunca executa código vindo dele
+def abrir_cache(caminho):
+    conexao = sqlite3.connect(caminho, timeout=60)
+    conexao.execute("PRAGMA journal_mode=WAL")
+    conexao.execute("PRAGMA synchronous=NORMAL")
+    conexao.execute(
+        "CREATE TABLE IF NOT EXISTS linhas_dominios ("
+        "chave TEXT NOT NULL, dominio TEXT NOT NULL, linhas TEXT NOT NULL, "
+        "PRIMARY KEY (chave, dominio))"
+    )
+    conexao.commit()
+    return conexao
+
+
+# Função para converter os valores das linhas que o JSON não representa: datas em texto
+# ISO, escalares do numpy em tipos do Python e nulos do pandas em null (na leitura,
+# normalizar_tipos volta as datas para date32)
+def _valor_json(valor):
+    if valor is pd.NA or valor is pd.NaT:
+        return None
+    convertido = consultas.valor_parametro(valor)
+    if convertido is valor:
+        raise TypeError(f"Valor não suportado no cache de domínios: {type(valor).__name__}")
+    return convertido
+
+
+# Função para ler do cache as linhas já conhecidas de uma lista de domínios
+# Retorna {domínio: [linhas]}; domínios sem dados no banco têm lista vazia
+def obter_do_cache(conexao, chave, dominios):
+    cursor = conexao.execute(
+        "SELECT dominio, linhas FROM linhas_dominios "
+        "WHERE chave = ? AND dominio IN (SELECT value FROM json_each(?))",
+        (chave, json.dumps(dominios))
+    )
+    return {dominio: [tuple(linha) for linha in json.loads(linhas)] for dominio, linhas in cursor}
+
+
+# Função para guardar no cache as linhas de cada domínio consultado
+def guardar_no_cache(conexao, chave, linhas_por_dominio):
+    conexao.executemany(
+        "INSERT OR REPLACE INTO linhas_dominios (chave, dominio, linhas) VALUES (?, ?, ?)",
+        [(chave, dominio, json.dumps(linhas, default=_valor_json)) for dominio, linhas in linhas_por_dominio.items()]
+    )
+    conexao.commit()
+
+
+# --- Processamento de um arquivo (executado nos processos do pool) ---
+
+# Função para preparar um processo do pool (cada processo cria o próprio pool de conexões)
+def _iniciar_processo(configuracao, parametros, caminho_cache):
+    db.configurar(configuracao['db'], **configuracao['pool'])
+    replica.configurar(configuracao['replica'])
+    _processo['parametros'] = parametros
+    _processo['cache'] = abrir_cache(caminho_cache)
+    _processo['chave_cache'] = cache.hash_conteudo('lote', parametros['colunas'], parametros['data'],
+                                                   parametros['inicio'], parametros['fim'])
+    _processo['contadores'] = {'dominios_cache': 0, 'dominios_banco': 0}
+    _processo['tipos'] = tipos.ler_tipos_banco()
+
+
+# Função para buscar no banco as linhas de uma lista de domínios, conforme os parâmetros
+def _consultar_banco(dominios, parametros):
+    if parametros['data']:
+        df = busca_dominios.buscar_info_dominios(dominios, parametros['colunas'], parametros['data'])
+    else:
+        df = busca_dominios.buscar_info_dominios_periodo(
+            dominios, parametros['colunas'], parametros['inicio'], parametros['fim']
+        )
+    return tipos.normalizar_tipos(df, _processo['tipos'])
+
+
+# Função para buscar as informações dos domínios passando pelo cache compartilhado
+def _buscar_info(dominios):
+    parametros = _processo['parametros']
+    conexao, chave = _processo['cache'], _processo['chave_cache']
+    colunas_resultado = colunas_consulta(parametros)
+
+    conhecidos = obter_do_cache(conexao, chave, dominios)
+    faltantes = [d for d in dominios if d not in conhecidos]
+    _processo['contadores']['dominios_cache'] += len(conhecidos)
+    _processo['contadores']['dominios_banco'] += len(faltantes)
+    if faltantes:
+        df = _consultar_banco(faltantes, parametros)
+        novos = {dominio: [] for dominio in faltantes}
+        for linha in df[colunas_resultado].astype(object).itertuples(index=False, name=None):
+            novos.setdefault(linha[0], []).append(linha)
+        guardar_no_cache(conexao, chave, novos)
+        conhecidos.update(novos)
+
+    linhas = [linha for dominio in dominios for linha in conhecidos.get(dominio, [])]
+    df_info = tipos.normalizar_tipos(pd.DataFrame(linhas, columns=colunas_resultado), _processo['tipos'])
+    if parametros['formato_periodo'] == 'largo' and not parametros['data']:
+        # Todas as colunas de todos os meses, mesmo sem dados (esquema fixo entre blocos)
+        largo = pipeline_upload.para_formato_largo(df_info, parametros['colunas'])
+        return largo.reindex(columns=['targets'] + colunas_saida(parametros))
+    return df_info
+
+
+# Função para processar um arquivo: leitura em blocos, enriquecimento e gravação em streaming
+# (a saída é gravada com nome temporário e renomeada apenas ao final)
+def processar_arquivo(caminho, destino):
+    parametros = _processo['parametros']
+    nome = os.path.basename(caminho)
+    inicio = time.perf_counter()
+    contadores_inicio = dict(_processo['contadores'])
+
+    with open(caminho, 'rb') as arquivo:
+        colunas_arquivo = ingestao.ler_colunas(arquivo, nome)
+        coluna_url = parametros['coluna_url'] or next((c for c in colunas_arquivo if 'url' in c.lower()), None)
+        if coluna_url not in colunas_arquivo:
+            raise ValueError(f"Coluna de URLs não encontrada em {nome}")
+
+        linhas = 0
+
+        def contar(blocos):
+            nonlocal linhas
+            for bloco in blocos:
+                linhas += len(bloco)
+                yield bloco
+
+        blocos = ingestao.ler_em_blocos(arquivo, nome, tamanho_bloco=parametros['tamanho_bloco'])
+        enriquecidos = ingestao.enriquecer_em_blocos(blocos, coluna_url, _buscar_info, colunas_saida(parametros))
+
+        temporario = destino + '.parcial'
+        try:
+            with open(temporario, 'wb') as saida:
+                exportacao.escrever(contar(enriquecidos), parametros['formato'], saida)
+            os.replace(temporario, destino)
+        except BaseException:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+
+    return {
+        'linhas': linhas,
+        'segundos': round(time.perf_counter() - inicio, 3),
+        'bytes_entrada': os.path.getsize(caminho),
+        'bytes_saida': os.path.getsize(destino),
+        'dominios_cache': _processo['contadores']['dominios_cache'] - contadores_inicio['dominios_cache'],
+        'dominios_banco': _processo['contadores']['dominios_banco'] - contadores_inicio['dominios_banco'],
+    }
+
+
+# --- Parâmetros, manifesto e execução ---
+
+# Função para obter as colunas devolvidas pela busca (antes do formato largo)
+def colunas_consulta(parametros):
+    colunas = [c for c in parametros['colunas'] if c not in ('targets', 'display_date')]
+    if parametros['data']:
+        return ['targets'] + colunas
+    return ['targets', 'display_date'] + colunas
+
+
+# Função para obter as colunas do banco acrescentadas a cada linha do arquivo
+def colunas_saida(parametros):
+    if parametros['data']:
+        return list(parametros['colunas'])
+    if parametros['formato_periodo'] == 'largo':
+        return pipeline_upload.nomes_formato_largo(parametros['colunas'], parametros['inicio'], parametros['fim'])
+    return colunas_consulta(parametros)[1:]
+
+
+# Função para ler o manifesto de uma execução anterior (ou criar um vazio)
+def ler_manifesto(caminho, parametros, reiniciar=False):
+    if reiniciar or not os.path.exists(caminho):
+        return {'parametros': parametros, 'arquivos': {}, 'execucoes': []}
+    with open(caminho) as arquivo:
+        manifesto = json.load(arquivo)
+    if manifesto.get('parametros') != parametros:
+        raise SystemExit(
+            "O manifesto do diretório de saída foi criado com outros parâmetros. "
+            "Use os mesmos parâmetros para continuar ou --reiniciar para começar de novo."
+        )
+    return manifesto
+
+
+# Função para gravar o manifesto por substituição (nunca fica pela metade)
+def gravar_manifesto(caminho, manifesto):
+    temporario = caminho + '.tmp'
+    with open(temporario, 'w') as arquivo:
+        json.dump(manifesto, arquivo, indent=2, ensure_ascii=False)
+    os.replace(temporario, caminho)
+
+
+# Função para identificar a versão de um arquivo de entrada (tamanho e data de modificação)
+def assinatura(caminho):
+    info = os.stat(caminho)
+    return {'tamanho': info.st_size, 'modificado': info.st_mtime}
+
+
+# Função para listar os arquivos ainda não concluídos (ou alterados desde a conclusão)
+def arquivos_pendentes(entrada, manifesto):
+    pendentes = []
+    for nome in sorted(os.listdir(entrada)):
+        caminho = os.path.join(entrada, nome)
+        if not nome.lower().endswith(EXTENSOES) or not os.path.isfile(caminho):
+            continue
+        registro = manifesto['arquivos'].get(nome, {})
+        if registro.get('status') == 'concluido' and registro.get('entrada') == assinatura(caminho):
+            continue
+        pendentes.append(nome)
+    return pendentes
+
+
+# Função para montar o nome do arquivo de saída
+def nome_saida(nome, formato):
+    extensao, _ = exportacao.FORMATOS[formato]
+    return f"{os.path.splitext(nome)[0]}_enriquecido.{extensao}"
+
+
+# Função para resumir a vazão de uma lista de resultados
+def resumir(resultados, segundos):
+    linhas = sum(r['linhas'] for r in resultados)
+    bytes_entrada = sum(r['bytes_entrada'] for r in resultados)
+    return {
+        'arquivos': len(resultados),
+        'linhas': linhas,
+        'segundos': round(segundos, 3),
+        'linhas_por_s': round(linhas / segundos, 1) if segundos else None,
+        'mb_entrada_por_s': round(bytes_entrada / 2 ** 20 / segundos, 2) if segundos else None,
+        'dominios_cache': sum(r['dominios_cache'] for r in resultados),
+        'dominios_banco': sum(r['dominios_banco'] for r in resultados),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enriquecimento em lote de arquivos CSV/XLSX com URLs")
+    parser.add_argument('entrada', help="Diretório com os arquivos CSV/XLSX")
+    parser.add_argument('saida', help="Diretório dos arquivos enriquecidos e do manifesto")
+    parser.add_argument('--data', type=datetime.date.fromisoformat, help="Data (display_date) da busca")
+    parser.add_argument('--inicio', type=datetime.date.fromisoformat, help="Data inicial do período")
+    parser.add_argument('--fim', type=datetime.date.fromisoformat, help="Data final do período")
+    parser.add_argument('--formato-periodo', choices=['largo', 'longo'], default='largo',
+                        help="Período em colunas por mês (largo) ou em linhas por mês (longo)")
+    parser.add_argument('--colunas', required=True, help="Colunas do banco separadas por vírgula")
+    parser.add_argument('--coluna-url', help="Coluna com as URLs (padrão: a primeira com 'url' no nome)")
+    parser.add_argument('--formato', choices=list(exportacao.FORMATOS), default='CSV')
+    parser.add_argument('--processos', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--tamanho-bloco', type=int, default=ingestao.TAMANHO_BLOCO)
+    parser.add_argument('--secrets', default=os.path.join('.streamlit', 'secrets.toml'),
+                        help="Arquivo de secrets do app (seções [database], [pool] e [replica])")
+    parser.add_argument('--reiniciar', action='store_true', help="Ignora o manifesto e processa tudo de novo")
+    args = parser.parse_args()
+
+    if bool(args.data) == bool(args.inicio and args.fim) or bool(args.inicio) != bool(args.fim):
+        parser.error("informe --data ou --inicio e --fim")
+
+    parametros = {
+        'colunas': [c.strip() for c in args.colunas.split(',') if c.strip()],
+        'data': args.data.isoformat() if args.data else None,
+        'inicio': args.inicio.isoformat() if args.inicio else None,
+        'fim': args.fim.isoformat() if args.fim else None,
+        'formato_periodo': None if args.data else args.formato_periodo,
+        'coluna_url': args.coluna_url,
+        'formato': args.formato,
+        'tamanho_bloco': args.tamanho_bloco,
+    }
+    configuracao = ler_configuracao(args.secrets)
+
+    os.makedirs(args.saida, exist_ok=True)
+    caminho_manifesto = os.path.join(args.saida, ARQUIVO_MANIFESTO)
+    caminho_cache = os.path.join(args.saida, ARQUIVO_CACHE)
+    manifesto = ler_manifesto(caminho_manifesto, parametros, args.reiniciar)
+    if args.reiniciar:
+        for sufixo in ('', '-wal', '-shm'):
+            if os.path.exists(caminho_cache + sufixo):
+                os.remove(caminho_cache + sufixo)
+    abrir_cache(caminho_cache).close()
+
+    pendentes = arquivos_pendentes(args.entrada, manifesto)
+    print(f"{len(pendentes)} arquivo(s) pendente(s) em {args.entrada}", file=sys.stderr)
+
+    inicio = time.perf_counter()
+    resultados = []
+    erros = 0
+    with ProcessPoolExecutor(
+        max_workers=max(1, min(args.processos, len(pendentes) or 1)),
+        initializer=_iniciar_processo,
+        initargs=(configuracao, parametros, caminho_cache)
+    ) as executor:
+        futuros = {
+            executor.submit(
+                processar_arquivo,
+                os.path.join(args.entrada, nome),
+                os.path.join(args.saida, nome_saida(nome, args.formato))
+            ): nome
+            for nome in pendentes
+        }
+        for futuro in as_completed(futuros):
+            nome = futuros[futuro]
+            registro = {'entrada': assinatura(os.path.join(args.entrada, nome))}
+            try:
+                resultado = futuro.result()
+                registro.update(status='concluido', saida=nome_saida(nome, args.formato), **resultado)
+                resultados.append(resultado)
+                print(f"{nome}: {resultado['linhas']} linhas em {resultado['segundos']:.1f}s", file=sys.stderr)
+            except Exception as e:
+                registro.update(status='erro', erro=f"{type(e).__name__}: {e}")
+                erros += 1
+                print(f"{nome}: erro - {e}", file=sys.stderr)
+            manifesto['arquivos'][nome] = registro
+            gravar_manifesto(caminho_manifesto, manifesto)
+
+    resumo = resumir(resultados, time.perf_counter() - inicio)
+    resumo.update(erros=erros, executado_em=datetime.datetime.now().isoformat(timespec='seconds'))
+    manifesto['execucoes'].append(resumo)
+    gravar_manifesto(caminho_manifesto, manifesto)
+    print(json.dumps(resumo, indent=2, ensure_ascii=False))
+    return 1 if erros else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,307 @@
+# Instrumentação das requisições: tempo por etapa, linhas, bytes, cache e espera do pool
+#
+# Cada execução de página é uma requisição com uma lista de etapas (consultas,
+# leituras, cruzamentos, exportações). As etapas podem ser aninhadas: o tempo de
+# cada uma inclui o das etapas internas, e o campo 'nivel' indica a profundidade.
+#
+# Ao final de cada requisição:
+#   - o resumo vai para o log em uma linha JSON (logger 'semrush.metricas');
+#   - os totais por etapa são acumulados e gravados, se configurado, em um
+#     arquivo no formato texto do Prometheus (para o textfile collector);
+#   - as últimas N requisições ficam em memória para o painel de desempenho.
+
+import contextvars
+import datetime
+import functools
+import itertools
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Configurações padrão (podem ser sobrescritas na seção [metricas] dos secrets)
+CONFIG_PADRAO = {
+    'max_requisicoes': 50,        # Requisições mantidas para o painel
+    'arquivo_prometheus': None,   # Caminho do arquivo no formato texto do Prometheus
+    'arquivo_log': None           # Caminho do log JSON (padrão: stderr)
+}
+
+# Campos acumulados por etapa -> (nome da métrica, descrição)
+METRICAS_ETAPA = {
+    'execucoes': ('semrush_etapa_execucoes_total', 'Execuções da etapa'),
+    'segundos': ('semrush_etapa_segundos_total', 'Tempo total da etapa em segundos'),
+    'linhas': ('semrush_etapa_linhas_total', 'Linhas retornadas pela etapa'),
+    'bytes': ('semrush_etapa_bytes_total', 'Bytes retornados pela etapa'),
+    'espera_pool': ('semrush_etapa_espera_pool_segundos_total', 'Espera por conexões do pool em segundos'),
+    'erros': ('semrush_etapa_erros_total', 'Execuções da etapa que terminaram em erro'),
+}
+
+_config = dict(CONFIG_PADRAO)
+_requisicoes = deque(maxlen=CONFIG_PADRAO['max_requisicoes'])
+_totais_etapas = {}
+_totais_paginas = {}
+_ids = itertools.count(1)
+_lock = threading.Lock()
+_logger = logging.getLogger('semrush.metricas')
+# Erros da própria instrumentação (o logger acima recebe só os registros das requisições)
+_logger_erros = logging.getLogger(__name__)
+
+# Requisição em andamento e pilha de etapas abertas (por thread/contexto)
+_requisicao = contextvars.ContextVar('requisicao', default=None)
+_pilha = contextvars.ContextVar('pilha_etapas', default=())
+
+
+# Função para registrar as opções de instrumentação (chamadas repetidas com as
+# mesmas opções não têm efeito)
+def configurar(**opcoes):
+    global _config, _requisicoes
+    nova = dict(CONFIG_PADRAO)
+    nova.update({k: v for k, v in opcoes.items() if k in CONFIG_PADRAO})
+
+    with _lock:
+        if nova == _config and _logger.handlers:
+            return
+        _config = nova
+        _requisicoes = deque(_requisicoes, maxlen=int(nova['max_requisicoes']))
+
+        for handler in list(_logger.handlers):
+            _logger.removeHandler(handler)
+            handler.close()
+        if nova['arquivo_log']:
+            handler = logging.FileHandler(nova['arquivo_log'], encoding='utf-8')
+        else:
+            handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        _logger.addHandler(handler)
+        _logger.setLevel(logging.INFO)
+        _logger.propagate = False
+
+
+# Contexto de uma requisição (uma execução de página)
+@contextmanager
+def requisicao(pagina, usuario=None):
+    registro = {
+        'id': next(_ids),
+        'pagina': pagina,
+        'usuario': usuario,
+        'inicio': datetime.datetime.now().isoformat(timespec='seconds'),
+        'segundos': 0.0,
+        'erro': None,
+        'etapas': [],
+    }
+    token_requisicao = _requisicao.set(registro)
+    token_pilha = _pilha.set(())
+    inicio = time.perf_counter()
+    try:
+        yield registro
+    except Exception as e:
+        registro['erro'] = type(e).__name__
+        raise
+    finally:
+        registro['segundos'] = time.perf_counter() - inicio
+        _pilha.reset(token_pilha)
+        _requisicao.reset(token_requisicao)
+        _finalizar(registro)
+
+
+# Contexto de uma etapa da requisição atual
+# O registro devolvido pode receber 'linhas' e 'bytes' dentro do bloco. Etapas com
+# 'cacheado' começam como acerto de cache; registrar_falha_cache() as marca como falha.
+# Fora de uma requisição, a etapa forma uma requisição própria (ex.: downloads).
+@contextmanager
+def etapa(nome, cacheado=False, **atributos):
+    if _requisicao.get() is None:
+        with requisicao(nome):
+            with etapa(nome, cacheado, **atributos) as registro:
+                yield registro
+        return
+
+    pilha = _pilha.get()
+    registro = {
+        'etapa': nome,
+        'nivel': len(pilha),
+        'segundos': 0.0,
+        'linhas': None,
+        'bytes': None,
+        'cache': 'acerto' if cacheado else None,
+        'espera_pool': 0.0,
+        'erro': None,
+    }
+    registro.update(atributos)
+    _requisicao.get()['etapas'].append(registro)
+    token = _pilha.set(pilha + (registro,))
+    inicio = time.perf_counter()
+    try:
+        yield registro
+    except Exception as e:
+        registro['erro'] = type(e).__name__
+        raise
+    finally:
+        registro['segundos'] = time.perf_counter() - inicio
+        _pilha.reset(token)
+
+
+# Decorador que mede cada chamada da função como uma etapa
+# (aplicado por fora de st.cache_data/st.cache_resource, mede também os acertos)
+def medir(nome, cacheado=False):
+    def decorar(funcao):
+        @functools.wraps(funcao)
+        def envolvida(*args, **kwargs):
+            with etapa(nome, cacheado) as registro:
+                resultado = funcao(*args, **kwargs)
+                registrar_resultado(registro, resultado)
+                return resultado
+
+        # Preserva o clear() das funções em cache do Streamlit
+        if hasattr(funcao, 'clear'):
+            envolvida.clear = funcao.clear
+        return envolvida
+    return decorar
+
+
+# Função para preencher linhas e bytes de uma etapa a partir do seu resultado
+# (o pandas não é importado aqui: se ainda não foi carregado, não há DataFrames a medir)
+def registrar_resultado(registro, resultado):
+    tipo_dataframe = getattr(sys.modules.get('pandas'), 'DataFrame', ())
+    if isinstance(resultado, tuple):
+        resultado = next((valor for valor in resultado if isinstance(valor, tipo_dataframe)), None)
+    if isinstance(resultado, tipo_dataframe):
+        registro['linhas'] = len(resultado)
+        registro['bytes'] = int(resultado.memory_usage(index=True, deep=True).sum())
+    elif isinstance(resultado, (bytes, bytearray)):
+        registro['bytes'] = len(resultado)
+    elif isinstance(resultado, list):
+        registro['linhas'] = len(resultado)
+
+
+# Função para contar as linhas dos blocos que passam por uma etapa (sem materializá-los)
+def contar_blocos(blocos, registro):
+    registro['linhas'] = registro['linhas'] or 0
+    for bloco in blocos:
+        registro['linhas'] += len(bloco)
+        yield bloco
+
+
+# Função para marcar a etapa em cache mais interna como falha (chamada no corpo
+# das funções em cache, que só executa quando o valor não estava guardado)
+def registrar_falha_cache():
+    for registro in reversed(_pilha.get()):
+        if registro['cache'] is not None:
+            registro['cache'] = 'falha'
+            return
+
+
+# Função para somar a espera por uma conexão do pool às etapas abertas
+def registrar_espera_pool(segundos):
+    for registro in _pilha.get():
+        registro['espera_pool'] += segundos
+
+
+# Função para consultar as últimas requisições (da mais antiga para a mais recente)
+def ultimas_requisicoes():
+    with _lock:
+        return list(_requisicoes)
+
+
+# Função para acumular os totais, registrar o log e gravar o arquivo do Prometheus
+def _finalizar(registro):
+    with _lock:
+        _requisicoes.append(registro)
+
+        pagina = _totais_paginas.setdefault(registro['pagina'], {'execucoes': 0, 'segundos': 0.0})
+        pagina['execucoes'] += 1
+        pagina['segundos'] += registro['segundos']
+
+        for item in registro['etapas']:
+            totais = _totais_etapas.setdefault(item['etapa'], {
+                'execucoes': 0, 'segundos': 0.0, 'linhas': 0, 'bytes': 0, 'espera_pool': 0.0,
+                'erros': 0, 'cache_acertos': 0, 'cache_falhas': 0
+            })
+            totais['execucoes'] += 1
+            totais['segundos'] += item['segundos']
+            totais['linhas'] += item['linhas'] or 0
+            totais['bytes'] += item['bytes'] or 0
+            totais['espera_pool'] += item['espera_pool']
+            totais['erros'] += 1 if item['erro'] else 0
+            if item['cache'] == 'acerto':
+                totais['cache_acertos'] += 1
+            elif item['cache'] == 'falha':
+                totais['cache_falhas'] += 1
+
+        texto_prometheus = _texto_prometheus() if _config['arquivo_prometheus'] else None
+        arquivo_prometheus = _config['arquivo_prometheus']
+
+    if _logger.handlers:
+        _logger.info(json.dumps(registro, ensure_ascii=False, default=str))
+    if texto_prometheus is not None:
+        try:
+            _gravar_atomicamente(arquivo_prometheus, texto_prometheus)
+        except OSError:
+            _logger_erros.exception("Erro ao gravar as métricas do Prometheus")
+
+
+# Função para escapar valores de rótulos do Prometheus
+def _rotulo(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Função para montar o texto no formato do Prometheus (chamada com _lock adquirido)
+def _texto_prometheus():
+    linhas = []
+    for campo, (metrica, descricao) in METRICAS_ETAPA.items():
+        linhas.append(f"# HELP {metrica} {descricao}")
+        linhas.append(f"# TYPE {metrica} counter")
+        for nome, totais in sorted(_totais_etapas.items()):
+            linhas.append(f'{metrica}{{etapa="{_rotulo(nome)}"}} {totais[campo]}')
+
+    linhas.append("# HELP semrush_etapa_cache_total Acertos e falhas de cache por etapa")
+    linhas.append("# TYPE semrush_etapa_cache_total counter")
+    for nome, totais in sorted(_totais_etapas.items()):
+        if totais['cache_acertos'] or totais['cache_falhas']:
+            linhas.append(f'semrush_etapa_cache_total{{etapa="{_rotulo(nome)}",resultado="acerto"}} {totais["cache_acertos"]}')
+            linhas.append(f'semrush_etapa_cache_total{{etapa="{_rotulo(nome)}",resultado="falha"}} {totais["cache_falhas"]}')
+
+    for campo, metrica, descricao in [
+        ('execucoes', 'semrush_requisicoes_total', 'Requisições por página'),
+        ('segundos', 'semrush_requisicoes_segundos_total', 'Tempo total das requisições por página em segundos'),
+    ]:
+        linhas.append(f"# HELP {metrica} {descricao}")
+        linhas.append(f"# TYPE {metrica} counter")
+        for pagina, totais in sorted(_totais_paginas.items(), key=lambda item: str(item[0])):
+            linhas.append(f'{metrica}{{pagina="{_rotulo(pagina)}"}} {totais[campo]}')
+
+    # Estado atual do pool de conexões (import local: db registra a espera aqui)
+    import db
+    pool = db.metricas_pool()
+    for campo, descricao in [
+        ('em_uso', 'Conexões do pool em uso'),
+        ('overflow', 'Conexões extras abertas além do tamanho do pool'),
+        ('espera_max', 'Maior espera por uma conexão do pool em segundos'),
+        ('espera_media', 'Espera média por uma conexão do pool em segundos'),
+    ]:
+        linhas.append(f"# HELP semrush_pool_{campo} {descricao}")
+        linhas.append(f"# TYPE semrush_pool_{campo} gauge")
+        linhas.append(f"semrush_pool_{campo} {pool[campo]}")
+    linhas.append("# HELP semrush_pool_checkouts_total Conexões retiradas do pool")
+    linhas.append("# TYPE semrush_pool_checkouts_total counter")
+    linhas.append(f"semrush_pool_checkouts_total {pool['checkouts']}")
+    return '\n'.join(linhas) + '\n'
+
+
+# Função para gravar um arquivo por substituição (o coletor nunca lê um arquivo pela metade)
+def _gravar_atomicamente(caminho, texto):
+    diretorio = os.path.dirname(os.path.abspath(caminho))
+    descritor, temporario = tempfile.mkstemp(dir=diretorio, prefix='.metricas_')
+    try:
+        with os.fdopen(descritor, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(texto)
+        os.replace(temporario, caminho)
+    except OSError:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
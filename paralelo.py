@@ -0,0 +1,87 @@
+# Execução concorrente de leituras independentes e pré-carregamento em segundo plano
+#
+# As leituras independentes de uma página (esquema, contagem, página de dados) são
+# disparadas juntas em um pool de threads: a espera total passa a ser a da leitura
+# mais lenta, e não a soma de todas. Cada tarefa roda com uma cópia do contexto de
+# quem a disparou, de modo que as etapas entram na mesma requisição das métricas.
+#
+# O pré-carregamento (próxima página, mês anterior) roda em um pool separado e menor,
+# para nunca atrasar as leituras da página. Tarefas com a mesma chave já em andamento
+# são ignoradas, cada tarefa é registrada como uma requisição própria nas métricas e
+# os erros vão apenas para o log: o objetivo é só aquecer os caches.
+#
+# As funções executadas aqui não devem chamar elementos do Streamlit (st.error etc.):
+# os erros das leituras da página voltam para quem espera o resultado.
+
+import contextvars
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import metricas
+
+logger = logging.getLogger(__name__)
+
+# Configurações padrão (podem ser sobrescritas na seção [paralelo] dos secrets)
+CONFIG_PADRAO = {
+    'max_leituras': 8,           # Leituras simultâneas das páginas (por processo)
+    'max_pre_carregamentos': 2   # Pré-carregamentos simultâneos (por processo)
+}
+
+# Estado do processo: configuração, pools (criados no primeiro uso) e chaves em andamento
+_estado = {'config': dict(CONFIG_PADRAO), 'leituras': None, 'pre_carregamentos': None, 'em_andamento': set()}
+_trava = threading.Lock()
+
+
+# Função para registrar a configuração (vale para os pools ainda não criados)
+def configurar(**opcoes):
+    _estado['config'] = {**CONFIG_PADRAO, **opcoes}
+
+
+# Função para obter (criando no primeiro uso) um dos pools de threads
+def _pool(nome, max_threads):
+    with _trava:
+        if _estado[nome] is None:
+            _estado[nome] = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix=nome)
+        return _estado[nome]
+
+
+# Função para disparar uma leitura no pool; retorna um Future
+def iniciar(funcao, *args, **kwargs):
+    contexto = contextvars.copy_context()
+    pool = _pool('leituras', _estado['config']['max_leituras'])
+    return pool.submit(contexto.run, funcao, *args, **kwargs)
+
+
+# Função para disparar várias leituras de uma vez ({nome: função}); retorna {nome: Future}
+def iniciar_varias(tarefas):
+    return {nome: iniciar(funcao) for nome, funcao in tarefas.items()}
+
+
+# Função para pré-carregar um resultado em segundo plano (ignorada se a chave já está em andamento)
+# Retorna o Future da tarefa ou None quando ela foi ignorada
+def pre_carregar(chave, funcao, *args, **kwargs):
+    with _trava:
+        if chave in _estado['em_andamento']:
+            return None
+        _estado['em_andamento'].add(chave)
+
+    def executar():
+        try:
+            with metricas.requisicao('pre_carregamento'):
+                funcao(*args, **kwargs)
+        except Exception:
+            logger.exception("Erro ao pré-carregar %s", getattr(funcao, '__name__', funcao))
+        finally:
+            with _trava:
+                _estado['em_andamento'].discard(chave)
+
+    pool = _pool('pre_carregamentos', _estado['config']['max_pre_carregamentos'])
+    # Contexto vazio: o pré-carregamento não faz parte da requisição de quem o disparou
+    return pool.submit(contextvars.Context().run, executar)
+
+
+# Função para obter a quantidade de pré-carregamentos em andamento (painel de desempenho)
+def pre_carregamentos_em_andamento():
+    with _trava:
+        return len(_estado['em_andamento'])
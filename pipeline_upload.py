@@ -0,0 +1,171 @@
+# Etapas do enriquecimento de arquivos enviados, com memoização por etapa
+#
+# leitura -> extração -> (sugestões) -> busca -> cruzamento -> mapeamento -> exportação
+#
+# Cada etapa devolve (chave, resultado). A chave é um hash do conteúdo das
+# entradas: a leitura usa os bytes do arquivo e as demais combinam a chave da
+# etapa anterior com os próprios parâmetros. Assim, ao mudar apenas o
+# mapeamento, somente o mapeamento e a exportação são recalculados.
+# Os resultados guardados no cache são compartilhados: nenhuma etapa altera
+# o DataFrame recebido.
+
+import io
+
+import numpy as np
+import pandas as pd
+
+import busca_dominios
+import cache
+import exportacao
+import indice_canonico
+from dominios import extrair_dominios
+
+
+# Etapa 1: leitura do arquivo (CSV ou XLSX) a partir dos bytes enviados
+def ler_arquivo(cache_etapas, conteudo, nome):
+    chave = cache.hash_conteudo('leitura', nome.lower().endswith('.csv'), conteudo)
+
+    def calcular():
+        if nome.lower().endswith('.csv'):
+            return pd.read_csv(io.BytesIO(conteudo))
+        return pd.read_excel(io.BytesIO(conteudo), engine='openpyxl')
+
+    return chave, cache.memoizar(cache_etapas, chave, calcular)
+
+
+# Etapa 2: extração dos domínios da coluna de URLs
+# Com o índice de aliases (indice_canonico), os hosts são levados ao 'targets' canônico
+# Retorna o DataFrame com a coluna 'targets' e a lista de domínios únicos
+def extrair(cache_etapas, chave_arquivo, df, coluna_url, indice=None):
+    chave = cache.hash_conteudo('extracao', chave_arquivo, coluna_url, indice['chave'] if indice else None)
+
+    def calcular():
+        df_extraido = df.copy()
+        if indice:
+            df_extraido['targets'] = indice_canonico.canonicalizar(indice, df_extraido[coluna_url])
+        else:
+            df_extraido['targets'] = extrair_dominios(df_extraido[coluna_url])
+        dominios_unicos = df_extraido['targets'].dropna().unique().tolist()
+        return df_extraido, dominios_unicos
+
+    return chave, cache.memoizar(cache_etapas, chave, calcular)
+
+
+# Etapa 2b: sugestões de domínios conhecidos para os domínios extraídos fora da tabela
+def sugerir(cache_etapas, chave_extracao, dominios, indice):
+    chave = cache.hash_conteudo('sugestoes', chave_extracao, indice['chave'])
+
+    def calcular():
+        return indice_canonico.sugerir(indice, [d for d in dominios if d not in indice['conhecidos']])
+
+    return chave, cache.memoizar(cache_etapas, chave, calcular)
+
+
+# Etapa 2c: aplicação das sugestões aceitas ({domínio extraído: domínio sugerido})
+def aplicar_sugestoes(cache_etapas, chave_extracao, df, substituicoes):
+    chave = cache.hash_conteudo('substituicoes', chave_extracao, sorted(substituicoes.items()))
+
+    def calcular():
+        df_substituido = df.copy()
+        df_substituido['targets'] = df_substituido['targets'].replace(substituicoes)
+        dominios_unicos = df_substituido['targets'].dropna().unique().tolist()
+        return df_substituido, dominios_unicos
+
+    return chave, cache.memoizar(cache_etapas, chave, calcular)
+
+
+# Etapa 3: busca das colunas selecionadas no banco para os domínios únicos
+# (resultados vazios não são guardados, para não memorizar falhas de consulta)
+def buscar(cache_etapas, dominios, colunas, display_date, buscar_info):
+    chave = cache.hash_conteudo('busca', busca_dominios.chave_dominios(dominios), tuple(colunas), str(display_date))
+    df_info = cache.memoizar(
+        cache_etapas,
+        chave,
+        lambda: buscar_info(dominios, colunas, display_date),
+        guardar_se=lambda resultado: not resultado.empty
+    )
+    return chave, df_info
+
+
+# Função para converter as informações de um período (uma linha por domínio e mês)
+# em uma linha por domínio, com uma coluna por métrica e mês (ex.: users_2024_01)
+def para_formato_largo(df_info, colunas):
+    if df_info.empty:
+        return pd.DataFrame(columns=['targets'])
+    # O nome de cada mês é formatado uma vez por data distinta, não por linha
+    codigos, datas = pd.factorize(df_info['display_date'])
+    nomes = np.array([pd.Timestamp(str(data)).strftime('%Y_%m') for data in datas], dtype=object)
+    df = df_info.assign(mes=nomes[codigos])
+    if isinstance(df['targets'].dtype, pd.CategoricalDtype):
+        df['targets'] = df['targets'].cat.remove_unused_categories()
+    df = df.drop_duplicates(['targets', 'mes'], keep='last')
+    largo = df.pivot(index='targets', columns='mes', values=list(colunas))
+    largo.columns = [f"{coluna}_{mes}" for coluna, mes in largo.columns]
+    return largo.reset_index()
+
+
+# Função para listar as colunas do formato largo de todos os meses de um período
+# (mesmos nomes gerados por para_formato_largo, incluindo meses sem dados)
+def nomes_formato_largo(colunas, data_inicio, data_fim):
+    meses = pd.period_range(pd.Timestamp(str(data_inicio)), pd.Timestamp(str(data_fim)), freq='M')
+    return [f"{coluna}_{mes.strftime('%Y_%m')}" for coluna in colunas for mes in meses]
+
+
+# Etapa 3 (período): busca de todos os meses do período em uma única consulta por lote,
+# no formato largo (uma coluna por métrica e mês) ou longo (uma linha por domínio e mês)
+def buscar_periodo(cache_etapas, dominios, colunas, data_inicio, data_fim, formato, buscar_info_periodo):
+    chave = cache.hash_conteudo(
+        'busca_periodo', busca_dominios.chave_dominios(dominios), tuple(colunas),
+        str(data_inicio), str(data_fim), formato
+    )
+
+    def calcular():
+        df_info = buscar_info_periodo(dominios, colunas, data_inicio, data_fim)
+        if formato == 'largo':
+            return para_formato_largo(df_info, colunas)
+        return df_info
+
+    df_info = cache.memoizar(cache_etapas, chave, calcular, guardar_se=lambda resultado: not resultado.empty)
+    return chave, df_info
+
+
+# Etapa 4: cruzamento do arquivo com as informações do banco
+def cruzar(cache_etapas, chave_extracao, df, chave_busca, df_info, colunas):
+    chave = cache.hash_conteudo('cruzamento', chave_extracao, chave_busca, tuple(colunas))
+
+    def calcular():
+        return df.merge(df_info[['targets'] + list(colunas)], on='targets', how='left')
+
+    return chave, cache.memoizar(cache_etapas, chave, calcular)
+
+
+# Função para aplicar o mapeamento {coluna do banco: coluna do arquivo} a uma cópia do DataFrame
+def aplicar_mapeamento(df, mapping):
+    df = df.copy()
+    for db_col, file_col in mapping.items():
+        if file_col.startswith("Nova coluna") or file_col not in df.columns:
+            # Criar a nova coluna com os dados do banco
+            if 'Nova coluna para' in file_col and 'new_' in file_col:
+                # Evitar sobrescrever
+                col_name = mapping[db_col]
+                df[col_name] = df[db_col]
+        else:
+            # Preencher a coluna existente com os dados do banco
+            df[file_col] = df[db_col]
+    return df
+
+
+# Etapa 5: mapeamento das colunas do banco para as colunas do arquivo
+def mapear(cache_etapas, chave_cruzamento, df, mapping):
+    chave = cache.hash_conteudo('mapeamento', chave_cruzamento, sorted(mapping.items()))
+    return chave, cache.memoizar(cache_etapas, chave, lambda: aplicar_mapeamento(df, mapping))
+
+
+# Etapa 6: exportação do arquivo final no formato escolhido (bytes do arquivo)
+def exportar(cache_etapas, chave_mapeamento, df, formato):
+    chave = cache.hash_conteudo('exportacao', chave_mapeamento, formato)
+
+    def calcular():
+        return exportacao.exportar_bytes(exportacao.blocos_dataframe(df), formato)
+
+    return chave, cache.memoizar(cache_etapas, chave, calcular)
@@ -0,0 +1,355 @@
+# Réplica local (Parquet) da tabela semrush_prod.traffic_analytics_month
+#
+# Os dados mensais só recebem novos meses (display_date), então a réplica guarda
+# uma partição por mês e, a cada sincronização, busca apenas os meses mais novos
+# que a maior data local. Os arquivos são lidos com memory map, de modo que os
+# processos do Streamlit compartilham as mesmas páginas em cache do sistema.
+#
+# Estrutura do diretório:
+#   <diretorio>/display_date=AAAA-MM-DD/dados.parquet
+#   <diretorio>/_estado.json   (gravado ao final de cada sincronização completa)
+#   <diretorio>/_esquema.arrow (tipos declarados no banco, usados como esquema do dataset)
+#   <diretorio>/_sync.lock     (trava entre processos durante a sincronização)
+#   <diretorio>/_tmp_*         (partições ainda em cópia, ignoradas na leitura)
+
+import datetime
+import fcntl
+import json
+import os
+import shutil
+import threading
+import time
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+
+import consultas
+import db
+import exportacao
+import tipos
+
+PREFIXO_PARTICAO = 'display_date='
+ARQUIVO_ESTADO = '_estado.json'
+ARQUIVO_TRAVA = '_sync.lock'
+ARQUIVO_ESQUEMA = '_esquema.arrow'
+ARQUIVO_DADOS = 'dados.parquet'
+
+_diretorio = None
+_cache_dataset = {'versao': None, 'dataset': None}
+_lock = threading.Lock()
+
+
+# Função para definir o diretório da réplica (None desativa a réplica)
+def configurar(diretorio):
+    global _diretorio
+    _diretorio = diretorio
+    if diretorio:
+        os.makedirs(diretorio, exist_ok=True)
+
+
+# Função para verificar se a réplica foi configurada
+def configurada():
+    return bool(_diretorio)
+
+
+# Função para ler o estado da última sincronização completa
+def estado():
+    if not configurada():
+        return None
+    try:
+        with open(os.path.join(_diretorio, ARQUIVO_ESTADO)) as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        return None
+
+
+# Função para obter a versão dos dados locais (muda a cada sincronização)
+def versao():
+    atual = estado()
+    return atual['versao'] if atual else None
+
+
+# Função para listar os meses presentes localmente
+def meses_locais():
+    if not configurada():
+        return []
+    meses = []
+    for nome in os.listdir(_diretorio):
+        if nome.startswith(PREFIXO_PARTICAO):
+            meses.append(datetime.date.fromisoformat(nome[len(PREFIXO_PARTICAO):]))
+    return sorted(meses)
+
+
+# Função para verificar se a réplica pode responder por uma data (ou por todas)
+def cobre(display_date=None):
+    if estado() is None:
+        return False
+    if not display_date:
+        return True
+    data = _data(display_date)
+    return os.path.isdir(_caminho_particao(data))
+
+
+# Função para verificar se a réplica pode responder por um período inteiro
+# (a réplica espelha todos os meses da tabela até o mais recente sincronizado)
+def cobre_periodo(data_inicio, data_fim):
+    if estado() is None:
+        return False
+    meses = meses_locais()
+    return bool(meses) and meses[-1] >= _data(data_fim).replace(day=1)
+
+
+def _caminho_particao(data):
+    return os.path.join(_diretorio, f"{PREFIXO_PARTICAO}{data.isoformat()}")
+
+
+# Função para gravar uma partição (um mês) a partir de blocos de DataFrames
+# 'esquema' fixa os tipos do arquivo (ver exportacao.esquema_arrow)
+# Um mês novo é gravado em um diretório temporário e renomeado ao final; um mês já
+# existente tem apenas o arquivo substituído com os.replace, de modo que a partição
+# nunca fica ausente ou vazia para quem está lendo (os leitores com o arquivo antigo
+# mapeado continuam a vê-lo até terminar a leitura)
+def gravar_particao(data, blocos, esquema):
+    final = _caminho_particao(data)
+    temporario = os.path.join(_diretorio, '_tmp_' + os.path.basename(final))
+    shutil.rmtree(temporario, ignore_errors=True)
+    os.makedirs(temporario)
+
+    blocos = (bloco.drop(columns=['display_date'], errors='ignore') for bloco in blocos)
+    esquema = pa.schema([campo for campo in esquema if campo.name != 'display_date'])
+    with open(os.path.join(temporario, ARQUIVO_DADOS), 'wb') as destino:
+        exportacao.escrever_parquet(blocos, destino, esquema)
+
+    try:
+        os.rename(temporario, final)
+    except OSError:
+        if not os.path.isdir(final):
+            raise
+        os.replace(os.path.join(temporario, ARQUIVO_DADOS), os.path.join(final, ARQUIVO_DADOS))
+        shutil.rmtree(temporario, ignore_errors=True)
+
+
+# Função para gravar o esquema da tabela usado na leitura do dataset
+def gravar_esquema(esquema):
+    caminho_temporario = os.path.join(_diretorio, ARQUIVO_ESQUEMA + '.tmp')
+    with pa.OSFile(caminho_temporario, 'wb') as arquivo:
+        arquivo.write(esquema.serialize())
+    os.replace(caminho_temporario, os.path.join(_diretorio, ARQUIVO_ESQUEMA))
+
+
+# Função para montar o esquema do dataset: tipos gravados na sincronização mais a
+# partição 'display_date'
+def _esquema_dataset():
+    with pa.memory_map(os.path.join(_diretorio, ARQUIVO_ESQUEMA)) as arquivo:
+        esquema = pa.ipc.read_schema(arquivo)
+    campos = [campo for campo in esquema if campo.name != 'display_date']
+    return pa.schema(campos + [pa.field('display_date', pa.date32())])
+
+
+# Função para copiar um mês do PostgreSQL para uma partição local
+def _copiar_mes(data, esquema):
+    query = f"SELECT * FROM {consultas.TABELA} WHERE display_date = %s"
+    gravar_particao(data, exportacao.ler_em_blocos(query, (data.isoformat(),)), esquema)
+
+
+# Função para registrar uma nova versão dos dados locais (fim de uma sincronização)
+def registrar_estado():
+    marca = max(meses_locais(), default=None)
+    novo_estado = {
+        'versao': time.time_ns(),
+        'marca': marca.isoformat() if marca else None,
+        'sincronizado_em': datetime.datetime.now().isoformat(timespec='seconds')
+    }
+    caminho_temporario = os.path.join(_diretorio, ARQUIVO_ESTADO + '.tmp')
+    with open(caminho_temporario, 'w') as arquivo:
+        json.dump(novo_estado, arquivo)
+    os.replace(caminho_temporario, os.path.join(_diretorio, ARQUIVO_ESTADO))
+    return novo_estado
+
+
+# Função para contar as linhas de um mês no banco e na réplica
+def _linhas_mes(data):
+    with db.conexao() as connection:
+        remoto = connection.exec_driver_sql(
+            f"SELECT COUNT(*) FROM {consultas.TABELA} WHERE display_date = %s", (data.isoformat(),)
+        ).scalar()
+    local = ds.dataset(_caminho_particao(data), format='parquet').count_rows()
+    return remoto, local
+
+
+# Função para sincronizar a réplica com o banco
+# Busca os meses mais novos que a maior data local; o último mês local também é
+# recarregado se a contagem de linhas mudou (carga do mês ainda em andamento).
+# Retorna a lista de meses copiados, ou None se outro processo já está sincronizando.
+def sincronizar():
+    if not configurada():
+        return None
+
+    with open(os.path.join(_diretorio, ARQUIVO_TRAVA), 'w') as trava:
+        try:
+            fcntl.flock(trava, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+
+        locais = meses_locais()
+        marca = locais[-1] if locais else None
+
+        query = f"SELECT DISTINCT display_date FROM {consultas.TABELA}"
+        params = ()
+        if marca:
+            query += " WHERE display_date > %s"
+            params = (marca.isoformat(),)
+        with db.conexao() as connection:
+            novos = [linha[0] for linha in connection.exec_driver_sql(query + " ORDER BY 1", params)]
+
+        copiados = []
+        esquema = exportacao.esquema_arrow(tipos.ler_tipos_banco())
+        gravar_esquema(esquema)
+        if marca:
+            remoto, local = _linhas_mes(marca)
+            if remoto != local:
+                _copiar_mes(marca, esquema)
+                copiados.append(marca)
+        for data in novos:
+            _copiar_mes(data, esquema)
+            copiados.append(data)
+
+        if copiados or estado() is None:
+            registrar_estado()
+
+        return copiados
+
+
+# Função para obter o dataset da réplica (recriado quando a versão muda)
+def _dataset():
+    atual = versao()
+    with _lock:
+        if _cache_dataset['versao'] != atual or _cache_dataset['dataset'] is None:
+            _cache_dataset['dataset'] = ds.dataset(
+                _diretorio,
+                schema=_esquema_dataset(),
+                format='parquet',
+                filesystem=pafs.LocalFileSystem(use_mmap=True),
+                partitioning=ds.partitioning(pa.schema([('display_date', pa.date32())]), flavor='hive'),
+                exclude_invalid_files=True,
+                ignore_prefixes=['_', '.']
+            )
+            _cache_dataset['versao'] = atual
+        return _cache_dataset['dataset']
+
+
+# Função para converter um valor de data em datetime.date
+def _data(valor):
+    return datetime.date.fromisoformat(str(consultas.valor_parametro(valor))[:10])
+
+
+# Função para converter um valor da chave de paginação em escalar comparável
+def _escalar(coluna, valor):
+    if coluna == 'display_date':
+        return pa.scalar(_data(valor), pa.date32())
+    return valor
+
+
+# Função para montar o filtro de paginação por chave (comparação lexicográfica)
+def _filtro_keyset(chave, valores, descendente=False):
+    filtro = None
+    for coluna, valor in reversed(list(zip(chave, valores))):
+        campo = ds.field(coluna)
+        valor = _escalar(coluna, valor)
+        comparacao = campo < valor if descendente else campo > valor
+        filtro = comparacao if filtro is None else comparacao | ((campo == valor) & filtro)
+    return filtro
+
+
+# Função para montar o filtro de data e de targets (sem as linhas com nulos na chave
+# de paginação, como em consultas.montar_consulta_dados)
+def _filtro_dados(display_date, targets_filter):
+    filtro = None
+    for coluna in consultas.CHAVE_PAGINACAO:
+        condicao = ds.field(coluna).is_valid()
+        filtro = condicao if filtro is None else filtro & condicao
+    if display_date:
+        filtro = filtro & (ds.field('display_date') == _escalar('display_date', display_date))
+    if targets_filter:
+        condicao = pc.match_substring(ds.field('targets'), targets_filter, ignore_case=True)
+        filtro = filtro & condicao
+    return filtro
+
+
+# Função para ler dados da réplica com os mesmos filtros de get_data
+def ler_dados(display_date=None, targets_filter=None, selected_columns=None,
+              limite=consultas.LIMITE_PADRAO, apos=None, ordenar_por=None, descendente=False):
+    display_date, targets_filter, colunas = consultas.normalizar_filtros(
+        display_date, targets_filter, selected_columns
+    )
+    chave = consultas.chave_ordenacao(ordenar_por)
+
+    filtro = _filtro_dados(display_date, targets_filter)
+    if apos is not None:
+        filtro = filtro & _filtro_keyset(chave, apos, descendente)
+
+    if colunas:
+        projecao = list(colunas) + [c for c in chave if c not in colunas]
+    else:
+        projecao = None
+
+    direcao = 'descending' if descendente else 'ascending'
+    ordem = [(c, direcao) for c in chave]
+    if not limite:
+        return _dataset().to_table(columns=projecao, filter=filtro).sort_by(ordem).to_pandas()
+    return _primeiras_linhas(_dataset(), projecao, filtro, ordem, int(limite)).to_pandas()
+
+
+# Função para obter as 'limite' primeiras linhas de uma leitura na ordem pedida
+# Os lotes chegam do scanner já filtrados (data, targets e keyset) e só as melhores
+# linhas vistas até o momento são mantidas (top-k), sem materializar a leitura
+# inteira nem ordenar todas as linhas a cada página
+def _primeiras_linhas(dataset, colunas, filtro, ordem, limite):
+    melhores = None
+    for lote in dataset.to_batches(columns=colunas, filter=filtro):
+        if lote.num_rows == 0:
+            continue
+        tabela = pa.Table.from_batches([lote])
+        if melhores is not None:
+            tabela = pa.concat_tables([melhores, tabela])
+        if tabela.num_rows > limite:
+            tabela = tabela.take(pc.select_k_unstable(tabela, k=limite, sort_keys=ordem))
+        melhores = tabela
+    if melhores is None:
+        return dataset.schema.empty_table().select(colunas or dataset.schema.names)
+    return melhores.sort_by(ordem)
+
+
+# Função para contar as linhas da réplica que atendem aos filtros
+def contar(display_date=None, targets_filter=None):
+    display_date, targets_filter, _ = consultas.normalizar_filtros(display_date, targets_filter)
+    return _dataset().count_rows(filter=_filtro_dados(display_date, targets_filter))
+
+
+# Função para ler da réplica as informações de um conjunto de domínios
+def ler_info_dominios(dominios, colunas, display_date=None):
+    colunas_resultado = ['targets'] + [c for c in colunas if c != 'targets']
+    filtro = ds.field('targets').isin(list(dominios))
+    if display_date:
+        filtro = filtro & (ds.field('display_date') == _escalar('display_date', display_date))
+    return _dataset().to_table(columns=colunas_resultado, filter=filtro).to_pandas()
+
+
+# Função para ler da réplica as informações de um conjunto de domínios em um período
+def ler_info_dominios_periodo(dominios, colunas, data_inicio, data_fim):
+    colunas_resultado = ['targets', 'display_date'] + [c for c in colunas if c not in ('targets', 'display_date')]
+    filtro = (
+        ds.field('targets').isin(list(dominios))
+        & (ds.field('display_date') >= _escalar('display_date', data_inicio))
+        & (ds.field('display_date') <= _escalar('display_date', data_fim))
+    )
+    tabela = _dataset().to_table(columns=colunas_resultado, filter=filtro)
+    return tabela.sort_by([('targets', 'ascending'), ('display_date', 'ascending')]).to_pandas()
+
+
+# Função para ler da réplica os valores distintos de 'targets'
+def ler_targets_distintos():
+    coluna = _dataset().to_table(columns=['targets']).column('targets')
+    return pc.unique(coluna).drop_null().to_pylist()
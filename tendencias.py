@@ -0,0 +1,79 @@
+# Manutenção das visões materializadas de tendências (opcionais)
+#
+# As visões guardam a agregação mensal por domínio e os totais por mês. Elas são
+# criadas na primeira manutenção e atualizadas quando a tabela recebe um mês mais
+# novo que o das visões. A atualização usa uma trava consultiva do PostgreSQL,
+# de modo que apenas um processo atualiza as visões por vez.
+
+import zlib
+
+import consultas
+import db
+
+# Identificador da trava consultiva usada durante a criação e a atualização
+CHAVE_TRAVA = zlib.crc32(consultas.VIEW_MENSAL.encode('utf-8'))
+
+
+# Função para executar comandos em uma transação com a trava consultiva
+# Retorna False (sem executar nada) quando outro processo já está com a trava
+def _executar_com_trava(comandos):
+    with db.conexao_dbapi() as conn:
+        cursor = conn.cursor()
+        try:
+            # Atualizações podem passar do statement_timeout configurado no pool
+            cursor.execute("SET LOCAL statement_timeout = 0")
+            cursor.execute("SELECT pg_try_advisory_xact_lock(%s)", (CHAVE_TRAVA,))
+            if not cursor.fetchone()[0]:
+                conn.rollback()
+                return False
+            for comando in comandos:
+                cursor.execute(comando)
+            conn.commit()
+            return True
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+
+# Função para verificar se as duas visões existem e estão populadas
+def views_prontas():
+    query, params = consultas.montar_consulta_views_existentes()
+    with db.conexao_dbapi() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        existentes = {linha[0] for linha in cursor.fetchall()}
+        cursor.close()
+    return existentes == {consultas.VIEW_MENSAL, consultas.VIEW_TOTAIS}
+
+
+# Função para verificar se a tabela tem um mês mais novo que o das visões
+def views_desatualizadas():
+    query, params = consultas.montar_consulta_datas_views()
+    with db.conexao_dbapi() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        data_tabela, data_views = cursor.fetchone()
+        cursor.close()
+    return data_tabela is not None and (data_views is None or data_tabela > data_views)
+
+
+# Função para criar as visões que ainda não existem
+def criar_views():
+    return _executar_com_trava(consultas.montar_comandos_criar_views())
+
+
+# Função para atualizar as visões (sem bloquear as leituras)
+def atualizar_views():
+    return _executar_com_trava(consultas.montar_comandos_atualizar_views())
+
+
+# Função para criar ou atualizar as visões quando necessário
+# Retorna 'criadas', 'atualizadas' ou None (nada a fazer ou outro processo trabalhando)
+def manter_views():
+    if not views_prontas():
+        return 'criadas' if criar_views() else None
+    if views_desatualizadas():
+        return 'atualizadas' if atualizar_views() else None
+    return None
@@ -0,0 +1,95 @@
+# Verificações do cache LRU limitado em bytes: descarte das entradas mais antigas,
+# tempo de vida e cálculo único por chave entre threads (memoizar)
+
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache  # noqa: E402
+
+
+def test_descarta_as_entradas_usadas_ha_mais_tempo():
+    c = cache.criar_cache(limite_bytes=250)
+    cache.guardar(c, 'a', b'a' * 100)
+    cache.guardar(c, 'b', b'b' * 100)
+    assert cache.obter(c, 'a') == (True, b'a' * 100)
+
+    cache.guardar(c, 'c', b'c' * 100)
+    assert cache.obter(c, 'b') == (False, None)
+    assert [e['chave'] for e in cache.entradas(c)] == ['c', 'a']
+    assert cache.estatisticas(c)['bytes'] == 200
+
+
+def test_substitui_chave_e_ignora_valor_maior_que_o_limite():
+    c = cache.criar_cache(limite_bytes=250)
+    cache.guardar(c, 'a', b'a' * 100)
+    cache.guardar(c, 'a', b'a' * 150)
+    assert cache.estatisticas(c)['bytes'] == 150
+
+    cache.guardar(c, 'grande', b'g' * 300)
+    assert cache.obter(c, 'grande') == (False, None)
+    assert cache.obter(c, 'a')[0]
+
+
+def test_entradas_expiram_apos_o_tempo_de_vida(monkeypatch):
+    agora = [1000.0]
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: agora[0])
+    c = cache.criar_cache(limite_bytes=1000, ttl=60)
+    cache.guardar(c, 'a', b'a')
+    agora[0] += 59
+    assert cache.obter(c, 'a')[0]
+    agora[0] += 2
+    assert cache.obter(c, 'a') == (False, None)
+    assert cache.estatisticas(c)['entradas'] == 0
+
+
+def test_tamanho_de_estruturas_soma_os_itens():
+    assert cache.tamanho_em_bytes({'a': b'x' * 1000}) > 1000
+    assert cache.tamanho_em_bytes([b'x' * 500, b'y' * 500]) > 1000
+
+
+def test_memoizar_calcula_uma_vez_por_chave():
+    c = cache.criar_cache(limite_bytes=10_000)
+    liberar = threading.Event()
+    chamadas = []
+
+    def calcular():
+        chamadas.append(1)
+        liberar.wait(5)
+        return b'resultado'
+
+    with ThreadPoolExecutor(4) as pool:
+        futuros = [pool.submit(cache.memoizar, c, 'k', calcular) for _ in range(4)]
+        while not c['em_calculo']:
+            time.sleep(0.001)
+        liberar.set()
+        resultados = [futuro.result(5) for futuro in futuros]
+
+    assert resultados == [b'resultado'] * 4
+    assert len(chamadas) == 1
+    assert cache.memoizar(c, 'k', calcular) == b'resultado'
+    assert len(chamadas) == 1
+
+
+def test_memoizar_repassa_a_excecao_sem_guardar():
+    c = cache.criar_cache(limite_bytes=10_000)
+
+    def falhar():
+        raise ValueError('falhou')
+
+    with pytest.raises(ValueError):
+        cache.memoizar(c, 'k', falhar)
+    assert c['em_calculo'] == {}
+    assert cache.memoizar(c, 'k', lambda: b'ok') == b'ok'
+
+
+def test_memoizar_guardar_se():
+    c = cache.criar_cache(limite_bytes=10_000)
+    assert cache.memoizar(c, 'k', lambda: b'', guardar_se=len) == b''
+    assert cache.obter(c, 'k') == (False, None)
@@ -0,0 +1,125 @@
+# Verificações da montagem das consultas: paginação por chave (keyset) e contagem
+
+import datetime
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import consultas  # noqa: E402
+
+
+def test_dados_excluem_nulos_na_chave():
+    query, params = consultas.montar_consulta_dados(limite=10, apos=('2024-01-01', 'site1.com.br'))
+    assert "display_date IS NOT NULL AND targets IS NOT NULL" in query
+    assert '("display_date", "targets") > (%s, %s)' in query
+    assert params == ('2024-01-01', 'site1.com.br', 10)
+
+
+def test_contagem_exclui_nulos_na_chave():
+    query, params, exato = consultas.montar_consulta_contagem('2024-01-01')
+    assert query.endswith("WHERE display_date = %s AND display_date IS NOT NULL AND targets IS NOT NULL")
+    assert params == ('2024-01-01',)
+    assert exato
+
+
+def test_dados_projecao_filtros_e_primeira_pagina():
+    query, params = consultas.montar_consulta_dados(
+        datetime.date(2024, 1, 1), '  Site_1% ', ['users', 'targets', 'users'], limite=50
+    )
+    assert query == (
+        'SELECT "users", "targets", "display_date" FROM semrush_prod.traffic_analytics_month '
+        'WHERE display_date = %s AND targets ILIKE %s AND display_date IS NOT NULL AND targets IS NOT NULL '
+        'ORDER BY "display_date" ASC, "targets" ASC LIMIT %s'
+    )
+    assert params == ('2024-01-01', '%site\\_1\\%%', 50)
+
+
+def test_dados_keyset_por_outra_coluna_descendente():
+    apos = (np.int64(7), datetime.date(2024, 1, 1), 'site1.com.br')
+    query, params = consultas.montar_consulta_dados(
+        limite=None, apos=apos, ordenar_por='rank', descendente=True
+    )
+    assert '("rank", "display_date", "targets") < (%s, %s, %s)' in query
+    assert query.endswith('ORDER BY "rank" DESC, "display_date" DESC, "targets" DESC')
+    assert params == (7, '2024-01-01', 'site1.com.br')
+    assert type(params[0]) is int
+
+
+def test_contagem_sem_filtros_usa_estimativa():
+    query, params, exato = consultas.montar_consulta_contagem(None, '   ')
+    assert 'reltuples' in query
+    assert params == (consultas.TABELA,)
+    assert not exato
+
+
+def test_contagem_com_filtro_de_targets():
+    query, params, exato = consultas.montar_consulta_contagem(targets_filter='Globo')
+    assert query.startswith(f"SELECT COUNT(*) FROM {consultas.TABELA} WHERE targets ILIKE %s")
+    assert params == ('%globo%',)
+    assert exato
+
+
+def test_proximo_cursor():
+    pagina = pd.DataFrame({
+        'targets': ['a.com', 'b.com'],
+        'display_date': [datetime.date(2024, 1, 1)] * 2,
+        'rank': pd.Series([3, 9], dtype='Int32'),
+    })
+    assert consultas.proximo_cursor(pagina, limite=2) == ('2024-01-01', 'b.com')
+    assert consultas.proximo_cursor(pagina, limite=2, ordenar_por='rank') == (9, '2024-01-01', 'b.com')
+    assert consultas.proximo_cursor(pagina, limite=3) is None
+    assert consultas.proximo_cursor(pagina[['targets']], limite=2) is None
+
+
+def test_resumo_tendencias_parametros():
+    query, params = consultas.montar_consulta_resumo_tendencias(
+        datetime.date(2024, 1, 1), datetime.date(2024, 6, 1), ' Site ', limite=20
+    )
+    assert "display_date BETWEEN %s::date - INTERVAL '1 month' AND %s::date" in query
+    assert f"FROM {consultas.TABELA} WHERE" in query
+    assert ' '.join(query.split()).endswith("ORDER BY soma_users DESC NULLS LAST, targets LIMIT %s")
+    assert params == ('2024-01-01', '2024-06-01', '%site%', '2024-01-01', 20)
+
+
+def test_resumo_tendencias_pelas_views():
+    query, _ = consultas.montar_consulta_resumo_tendencias('2024-01-01', '2024-06-01', usar_views=True)
+    assert f"FROM {consultas.VIEW_MENSAL} WHERE" in query
+    assert consultas.TABELA + ' ' not in query
+
+
+def test_series_tendencias_de_uma_lista_de_dominios():
+    query, params = consultas.montar_consulta_series_tendencias('2024-01-01', '2024-06-01', ('a.com', 'b.com'))
+    assert "targets = ANY(%s)" in query
+    assert params == ('2024-01-01', '2024-06-01', ['a.com', 'b.com'], '2024-01-01')
+
+
+def test_totais_tendencias_conforme_a_fonte():
+    query, params = consultas.montar_consulta_totais_tendencias('2024-01-01', '2024-06-01', usar_views=True)
+    assert f"SELECT display_date, qtd_targets, soma_users, media_users FROM {consultas.VIEW_TOTAIS}" in query
+    assert params == ('2024-01-01', '2024-06-01', '2024-01-01')
+
+    # Com filtro de targets, os totais são agregados a partir da visão mensal
+    query, params = consultas.montar_consulta_totais_tendencias('2024-01-01', '2024-06-01', 'globo', usar_views=True)
+    assert consultas.VIEW_TOTAIS not in query
+    assert "COUNT(*) AS qtd_targets" in query and f"FROM {consultas.VIEW_MENSAL} WHERE" in query
+    assert params == ('2024-01-01', '2024-06-01', '%globo%', '2024-01-01')
+
+    query, _ = consultas.montar_consulta_totais_tendencias('2024-01-01', '2024-06-01')
+    assert f"FROM {consultas.TABELA} WHERE" in query and "GROUP BY targets, display_date" in query
+
+
+def test_comandos_das_views():
+    comandos = consultas.montar_comandos_criar_views()
+    assert comandos[0].startswith(f"CREATE MATERIALIZED VIEW IF NOT EXISTS {consultas.VIEW_MENSAL} AS ")
+    assert "WHERE targets IS NOT NULL GROUP BY targets, display_date" in comandos[0]
+    assert all('IF NOT EXISTS' in comando for comando in comandos)
+    assert consultas.montar_comandos_atualizar_views() == [
+        f"REFRESH MATERIALIZED VIEW CONCURRENTLY {consultas.VIEW_MENSAL}",
+        f"REFRESH MATERIALIZED VIEW CONCURRENTLY {consultas.VIEW_TOTAIS}",
+    ]
+    _, params = consultas.montar_consulta_views_existentes()
+    assert params == ([consultas.VIEW_MENSAL, consultas.VIEW_TOTAIS],)
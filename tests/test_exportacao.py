@@ -0,0 +1,110 @@
+# Verificações da exportação: conteúdo e tipo MIME de cada formato, arquivo temporário
+# devolvido somente para leitura (aceito pelo st.download_button) e tipos do Parquet
+
+import gzip
+import io
+import os
+import sys
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import exportacao  # noqa: E402
+
+# Início esperado do conteúdo e tipo MIME de cada formato
+ASSINATURAS = {
+    'CSV': (b'targets,rank,bounce_rate\n', 'text/csv'),
+    'CSV (gzip)': (b'\x1f\x8b', 'application/gzip'),
+    'XLSX': (b'PK\x03\x04', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'Parquet': (b'PAR1', 'application/vnd.apache.parquet'),
+}
+
+
+def dados():
+    return pd.DataFrame({
+        'targets': ['g1.globo.com', 'site1.com.br', None],
+        'rank': [1, 2, 3],
+        'bounce_rate': [0.5, None, 0.25],
+    })
+
+
+def ler_parquet(conteudo):
+    return pq.read_table(io.BytesIO(conteudo))
+
+
+@pytest.mark.parametrize('formato', list(exportacao.FORMATOS))
+def test_exportar_devolve_leitor_com_o_conteudo(formato):
+    inicio, mime = ASSINATURAS[formato]
+    with exportacao.exportar(exportacao.blocos_dataframe(dados()), formato) as arquivo:
+        assert isinstance(arquivo, io.BufferedReader)
+        assert not arquivo.writable()
+        assert not os.path.exists(arquivo.name)
+        conteudo = arquivo.read()
+    assert conteudo.startswith(inicio)
+    assert exportacao.FORMATOS[formato][1] == mime
+
+
+@pytest.mark.parametrize('formato', list(exportacao.FORMATOS))
+def test_exportar_bytes(formato):
+    conteudo = exportacao.exportar_bytes(exportacao.blocos_dataframe(dados(), tamanho_bloco=2), formato)
+    assert isinstance(conteudo, bytes)
+    assert conteudo.startswith(ASSINATURAS[formato][0])
+
+
+def test_exportar_csv_em_blocos():
+    conteudo = exportacao.exportar_bytes(exportacao.blocos_dataframe(dados(), tamanho_bloco=2), 'CSV')
+    assert conteudo.decode().splitlines() == [
+        'targets,rank,bounce_rate', 'g1.globo.com,1,0.5', 'site1.com.br,2,', ',3,0.25'
+    ]
+
+
+def test_exportar_csv_gzip():
+    conteudo = exportacao.exportar_bytes(exportacao.blocos_dataframe(dados(), tamanho_bloco=2), 'CSV (gzip)')
+    assert gzip.decompress(conteudo).decode().splitlines()[1] == 'g1.globo.com,1,0.5'
+
+
+def test_exportar_remove_temporario_em_erro(tmp_path, monkeypatch):
+    monkeypatch.setattr(exportacao.tempfile, 'tempdir', str(tmp_path))
+    with pytest.raises(ValueError):
+        exportacao.exportar(exportacao.blocos_dataframe(dados()), 'TXT')
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_parquet_primeiro_bloco_nulo():
+    blocos = [pd.DataFrame({'a': [None, None]}), pd.DataFrame({'a': ['x', 'y']})]
+    tabela = ler_parquet(exportacao.exportar_bytes(blocos, 'Parquet'))
+    assert tabela.column('a').to_pylist() == [None, None, 'x', 'y']
+
+
+def test_parquet_inteiro_compacto_seguido_de_float():
+    blocos = [pd.DataFrame({'rank': pd.Series([1, 2], dtype='int8')}), pd.DataFrame({'rank': [1000.0, None]})]
+    tabela = ler_parquet(exportacao.exportar_bytes(blocos, 'Parquet'))
+    assert tabela.column('rank').to_pylist() == [1, 2, 1000, None]
+
+
+def test_parquet_tipos_incompativeis_viram_texto():
+    blocos = [pd.DataFrame({'a': [1, 2]}), pd.DataFrame({'a': ['x', None]})]
+    tabela = ler_parquet(exportacao.exportar_bytes(blocos, 'Parquet'))
+    assert tabela.column('a').to_pylist() == ['1', '2', 'x', None]
+
+
+def test_esquema_arrow_dos_tipos_declarados():
+    esquema = exportacao.esquema_arrow({'targets': 'text', 'rank': 'integer', 'display_date': 'date', 'x': 'jsonb'})
+    assert esquema == pa.schema([
+        ('targets', pa.string()), ('rank', pa.int32()), ('display_date', pa.date32()), ('x', pa.string())
+    ])
+
+
+def test_parquet_com_esquema_declarado():
+    esquema = exportacao.esquema_arrow({'targets': 'text', 'rank': 'integer', 'users': 'bigint'})
+    blocos = [
+        pd.DataFrame({'targets': ['a', 'a', 'a'], 'rank': pd.Series([1, 2, 3], dtype='int8'), 'users': [None] * 3}),
+        pd.DataFrame({'targets': ['b', 'c', 'd'], 'rank': [70000, None, 5], 'users': [7, 8, 9]}),
+    ]
+    tabela = ler_parquet(exportacao.exportar_bytes(blocos, 'Parquet', esquema))
+    assert tabela.schema == esquema
+    assert tabela.column('rank').to_pylist() == [1, 2, 3, 70000, None, 5]
@@ -0,0 +1,65 @@
+# Verificações do índice de aliases dos domínios: prefixos de acesso, seções,
+# domínios-pai e sugestões por similaridade para os domínios fora da tabela
+
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import indice_canonico  # noqa: E402
+
+TARGETS = [
+    'globo.com', 'g1.globo.com/sp', 'uol.com.br', 'folha.uol.com.br', 'site1.com.br',
+    'www.exemplo.com.br', 'portal.com.br', 'uol.com.br', None,
+]
+
+
+def canonicalizar(urls):
+    indice = indice_canonico.construir_indice(TARGETS)
+    return indice_canonico.canonicalizar(indice, pd.Series(urls)).tolist()
+
+
+def test_prefixos_de_acesso():
+    assert canonicalizar([
+        'https://m.globo.com/x', 'http://amp.site1.com.br/a?b=1', 'https://www2.exemplo.com.br/',
+        'https://m.www.uol.com.br', 'HTTPS://WWW.Site1.com.br.:443/pagina',
+    ]) == ['globo.com', 'site1.com.br', 'www.exemplo.com.br', 'uol.com.br', 'site1.com.br']
+
+
+def test_secoes_e_dominios_pai():
+    assert canonicalizar([
+        'https://g1.globo.com/sp/noticia', 'https://g1.globo.com/SP', 'https://g1.globo.com/rj/noticia',
+        'https://blog.folha.uol.com.br/texto', 'https://esporte.uol.com.br/',
+    ]) == ['g1.globo.com/sp', 'g1.globo.com/sp', 'globo.com', 'folha.uol.com.br', 'uol.com.br']
+
+
+def test_urls_sem_alias_e_ausentes():
+    assert canonicalizar(['https://naoexiste.com.br/p', None, 'lixo']) == ['naoexiste.com.br', None, None]
+
+
+def test_normalizacao_do_host():
+    assert indice_canonico.normalizar_host('M.WWW.Site.com.') == 'site.com'
+    assert indice_canonico.normalizar_host('www2.site.com.br') == 'site.com.br'
+    # Sem o prefixo, não sobraria um host com ponto
+    assert indice_canonico.normalizar_host('m.com') == 'm.com'
+    assert indice_canonico.dominio_registravel('a.b.site.com.br') == 'site.com.br'
+    assert indice_canonico.dominio_registravel('meu.blogspot.com.br') == 'meu.blogspot.com.br'
+    assert indice_canonico.ancestrais('blog.folha.uol.com.br') == [
+        'blog.folha.uol.com.br', 'folha.uol.com.br', 'uol.com.br'
+    ]
+    assert indice_canonico.nome_sem_sufixo('site.com.br') == 'site'
+
+
+def test_sugerir_dominio_parecido():
+    indice = indice_canonico.construir_indice(TARGETS)
+    sugestoes = indice_canonico.sugerir(indice, ['site1.com', 'zzzqqq.com', None, 'site1.com'])
+    assert sugestoes.to_dict('records') == [{'dominio': 'site1.com', 'sugestao': 'site1.com.br', 'similaridade': 1.0}]
+    assert indice_canonico.sugerir(indice, []).columns.tolist() == ['dominio', 'sugestao', 'similaridade']
+
+
+def test_assinaturas_iguais_para_nomes_iguais():
+    assinaturas = indice_canonico.assinaturas(['site', 'site', 'outro'])
+    assert (assinaturas[0] == assinaturas[1]).all()
+    assert not (assinaturas[0] == assinaturas[2]).all()
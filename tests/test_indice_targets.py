@@ -0,0 +1,62 @@
+# Verificações do índice de trigramas de 'targets': busca de trechos, linhas da
+# coluna original, busca por prefixo e sugestões do autocompletar
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import indice_targets  # noqa: E402
+
+VALORES = [
+    'site1.com.br', 'G1.globo.com', 'site10.com.br', None, 'site1.com.br',
+    'globoesporte.com', 'meusite.com', 'site2.com.br', 'site10.com.br',
+]
+
+
+def valores(indice, ids):
+    return sorted(indice['valores'][i] for i in ids)
+
+
+def test_buscar_trecho_sem_diferenciar_maiusculas():
+    indice = indice_targets.construir_indice(VALORES)
+    assert valores(indice, indice_targets.buscar(indice, 'GLOBO')) == ['G1.globo.com', 'globoesporte.com']
+    assert valores(indice, indice_targets.buscar(indice, 'site1')) == ['site1.com.br', 'site10.com.br']
+    assert valores(indice, indice_targets.buscar(indice, 'g1')) == ['G1.globo.com']
+    assert len(indice_targets.buscar(indice, 'nada.com')) == 0
+    assert len(indice_targets.buscar(indice, '  ')) == len(indice['valores'])
+
+
+def test_linhas_da_coluna_original():
+    indice = indice_targets.construir_indice(VALORES)
+    assert indice_targets.linhas(indice, 'site1').tolist() == [0, 2, 4, 8]
+    assert indice_targets.linhas(indice, 'xyz').tolist() == []
+
+
+def test_linhas_por_mascara_com_muitos_valores(monkeypatch):
+    monkeypatch.setattr(indice_targets, 'LIMITE_FATIAS', 1)
+    indice = indice_targets.construir_indice(VALORES)
+    esperadas = [i for i, valor in enumerate(VALORES) if valor and '.com.br' in valor]
+    assert indice_targets.linhas(indice, '.com.br').tolist() == esperadas
+    assert isinstance(indice_targets.linhas(indice, '.com.br'), np.ndarray)
+
+
+def test_buscar_prefixo():
+    indice = indice_targets.construir_indice(VALORES)
+    assert valores(indice, indice_targets.buscar_prefixo(indice, 'Site1')) == ['site1.com.br', 'site10.com.br']
+    assert [indice['valores'][i] for i in indice_targets.buscar_prefixo(indice, 'site', limite=2)] == [
+        'site1.com.br', 'site10.com.br'
+    ]
+    assert indice_targets.buscar_prefixo(indice, 'zz') == []
+
+
+def test_sugerir_prefixos_antes_de_trechos():
+    indice = indice_targets.construir_indice(VALORES)
+    assert indice_targets.sugerir(indice, 'site') == [
+        'site1.com.br', 'site10.com.br', 'site2.com.br', 'meusite.com'
+    ]
+    assert indice_targets.sugerir(indice, 'globo', limite=1) == ['globoesporte.com']
+    assert indice_targets.sugerir(indice, 'glo', limite=2) == ['globoesporte.com', 'G1.globo.com']
+    assert indice_targets.sugerir(indice, '') == []
@@ -0,0 +1,57 @@
+# Verificações da leitura em blocos dos arquivos enviados: tipos estáveis entre os
+# blocos do CSV e enriquecimento bloco a bloco
+
+import io
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ingestao  # noqa: E402
+
+# CSV cujo primeiro bloco (2 linhas) não tem nenhuma URL
+CSV_PRIMEIRO_BLOCO_SEM_URL = (
+    "page_url,id,categoria\n"
+    ",001,a\n"
+    ",002,\n"
+    "https://www.site1.com.br/pagina,003,b\n"
+    "https://g1.globo.com/sp/noticia,4,c\n"
+    ",5,c\n"
+)
+
+
+def arquivo_csv(conteudo):
+    return io.BytesIO(conteudo.encode())
+
+
+def test_csv_le_todas_as_colunas_como_texto():
+    blocos = list(ingestao.ler_em_blocos(arquivo_csv(CSV_PRIMEIRO_BLOCO_SEM_URL), 'upload.csv', tamanho_bloco=2))
+    assert len(blocos) == 3
+    for bloco in blocos:
+        assert all(pd.api.types.is_string_dtype(dtype) for dtype in bloco.dtypes)
+    assert blocos[0]['page_url'].isna().all()
+    assert blocos[1]['page_url'].tolist() == ['https://www.site1.com.br/pagina', 'https://g1.globo.com/sp/noticia']
+    assert pd.concat(blocos)['id'].tolist() == ['001', '002', '003', '4', '5']
+
+
+def test_csv_somente_colunas_pedidas():
+    blocos = ingestao.ler_em_blocos(
+        arquivo_csv(CSV_PRIMEIRO_BLOCO_SEM_URL), 'upload.csv', usecols=['page_url', 'id'], tamanho_bloco=2
+    )
+    assert [bloco.columns.tolist() for bloco in blocos] == [['page_url', 'id']] * 3
+
+
+def test_enriquecer_com_primeiro_bloco_sem_url():
+    consultas = []
+
+    def buscar_info(dominios):
+        consultas.append(dominios)
+        return pd.DataFrame({'targets': dominios, 'rank': range(1, len(dominios) + 1)})
+
+    blocos = ingestao.ler_em_blocos(arquivo_csv(CSV_PRIMEIRO_BLOCO_SEM_URL), 'upload.csv', tamanho_bloco=2)
+    resultado = pd.concat(ingestao.enriquecer_em_blocos(blocos, 'page_url', buscar_info, ['rank']), ignore_index=True)
+    assert consultas == [['g1.globo.com/sp', 'site1.com.br']]
+    assert resultado['targets'].tolist() == [None, None, 'site1.com.br', 'g1.globo.com/sp', None]
+    assert resultado['rank'].tolist()[2:4] == [2, 1]
@@ -0,0 +1,45 @@
+# Verificações do cache de domínios do enriquecimento em lote (SQLite com as linhas em JSON)
+
+import datetime
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lote  # noqa: E402
+
+
+def test_cache_guarda_linhas_em_json(tmp_path):
+    conexao = lote.abrir_cache(str(tmp_path / lote.ARQUIVO_CACHE))
+    linhas = {
+        'site1.com.br': [
+            ('site1.com.br', datetime.date(2024, 1, 1), np.int64(10), 0.5),
+            ('site1.com.br', pd.Timestamp('2024-02-01'), pd.NA, float('nan')),
+        ],
+        'sem-dados.com.br': [],
+    }
+    lote.guardar_no_cache(conexao, 'chave', linhas)
+
+    armazenado = conexao.execute(
+        "SELECT linhas FROM linhas_dominios WHERE dominio = 'site1.com.br'"
+    ).fetchone()[0]
+    assert armazenado.startswith('[["site1.com.br", "2024-01-01", 10, 0.5]')
+
+    conhecidos = lote.obter_do_cache(conexao, 'chave', ['site1.com.br', 'sem-dados.com.br', 'outro.com.br'])
+    assert conhecidos['sem-dados.com.br'] == []
+    assert 'outro.com.br' not in conhecidos
+    primeira, segunda = conhecidos['site1.com.br']
+    assert primeira == ('site1.com.br', '2024-01-01', 10, 0.5)
+    assert segunda[:3] == ('site1.com.br', '2024-02-01T00:00:00', None)
+    assert np.isnan(segunda[3])
+    assert lote.obter_do_cache(conexao, 'outra chave', ['site1.com.br']) == {}
+
+
+def test_cache_recusa_valores_sem_representacao(tmp_path):
+    conexao = lote.abrir_cache(str(tmp_path / lote.ARQUIVO_CACHE))
+    with pytest.raises(TypeError):
+        lote.guardar_no_cache(conexao, 'chave', {'site1.com.br': [('site1.com.br', object())]})
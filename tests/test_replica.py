@@ -0,0 +1,79 @@
+# Verificações da réplica local: paginação por chave (keyset) sobre as partições,
+# com a mesma ordem e os mesmos filtros das consultas ao PostgreSQL
+
+import datetime
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import consultas  # noqa: E402
+import exportacao  # noqa: E402
+import replica  # noqa: E402
+
+TIPOS = {'targets': 'text', 'display_date': 'date', 'rank': 'integer', 'users': 'bigint'}
+MESES = [datetime.date(2024, 1, 1), datetime.date(2024, 2, 1)]
+
+
+def linhas_mes(data):
+    # Domínios fora de ordem, em vários blocos (lotes do scanner) e com um domínio nulo
+    dominios = [f"site{i}.com.br" for i in (7, 3, 11, 1, 5, 9, 2, 10, 4, 8, 6)] + [None]
+    deslocamento = data.month * 100
+    return pd.DataFrame({
+        'targets': dominios,
+        'rank': [deslocamento + i for i in range(len(dominios))],
+        'users': [1000 - i for i in range(len(dominios))],
+    })
+
+
+@pytest.fixture
+def dados(tmp_path, monkeypatch):
+    monkeypatch.setattr(replica, '_diretorio', str(tmp_path))
+    monkeypatch.setattr(replica, '_cache_dataset', {'versao': None, 'dataset': None})
+    esquema = exportacao.esquema_arrow(TIPOS)
+    replica.gravar_esquema(esquema)
+    for data in MESES:
+        df = linhas_mes(data)
+        replica.gravar_particao(data, [df.iloc[:4], df.iloc[4:8], df.iloc[8:]], esquema)
+    replica.registrar_estado()
+    return pd.concat([linhas_mes(data).assign(display_date=data) for data in MESES], ignore_index=True)
+
+
+def paginar(limite, **filtros):
+    paginas = []
+    apos = None
+    while True:
+        pagina = replica.ler_dados(limite=limite, apos=apos, **filtros)
+        paginas.append(pagina)
+        apos = consultas.proximo_cursor(pagina, limite, filtros.get('ordenar_por'))
+        if apos is None:
+            return paginas
+
+
+def test_paginas_seguem_a_chave_e_ignoram_targets_nulos(dados):
+    paginas = paginar(5)
+    assert [len(pagina) for pagina in paginas] == [5, 5, 5, 5, 2]
+    lidas = pd.concat(paginas, ignore_index=True)
+    esperadas = dados.dropna(subset=['targets']).sort_values(['display_date', 'targets'], ignore_index=True)
+    chave = list(consultas.CHAVE_PAGINACAO)
+    assert lidas[chave].values.tolist() == esperadas[chave].values.tolist()
+    assert replica.contar() == len(esperadas)
+
+
+def test_paginas_por_coluna_descendente_com_filtros(dados):
+    filtros = {'display_date': '2024-02-01', 'targets_filter': 'SITE1', 'selected_columns': ['rank']}
+    paginas = paginar(2, ordenar_por='rank', descendente=True, **filtros)
+    lidas = pd.concat(paginas, ignore_index=True)
+    assert list(lidas.columns) == ['rank', 'display_date', 'targets']
+    assert lidas['targets'].tolist() == ['site10.com.br', 'site1.com.br', 'site11.com.br']
+    assert lidas['rank'].tolist() == [207, 203, 202]
+    assert replica.contar('2024-02-01', 'site1') == 3
+
+
+def test_cobre_somente_meses_locais(dados):
+    assert replica.cobre('2024-01-01')
+    assert not replica.cobre('2024-03-01')
+    assert replica.meses_locais() == MESES
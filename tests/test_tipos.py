@@ -0,0 +1,64 @@
+# Verificações da normalização de tipos dos resultados: datas em date32, domínios
+# em categoria e inteiros no tipo declarado no banco
+
+import datetime
+import os
+import sys
+
+import pandas as pd
+import pyarrow as pa
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tipos  # noqa: E402
+
+TIPOS_DB = {'targets': 'text', 'display_date': 'date', 'rank': 'integer', 'users': 'bigint',
+            'bounce_rate': 'double precision'}
+
+
+def resultado():
+    return pd.DataFrame({
+        'targets': ['site1.com.br', 'g1.globo.com', 'site1.com.br', None],
+        'display_date': [datetime.date(2024, 1, 1), datetime.date(2024, 2, 1), None, datetime.date(2024, 1, 1)],
+        'rank': [1.0, None, 3.0, 4.0],
+        'users': [10, 20, 30, 40],
+        'bounce_rate': [0.5, None, 0.25, 1.0],
+    })
+
+
+def test_normalizar_tipos():
+    df = tipos.normalizar_tipos(resultado(), TIPOS_DB)
+    assert df['display_date'].dtype == pd.ArrowDtype(pa.date32())
+    assert df['display_date'].tolist()[:2] == [datetime.date(2024, 1, 1), datetime.date(2024, 2, 1)]
+    assert df['display_date'].isna().tolist() == [False, False, True, False]
+    assert isinstance(df['targets'].dtype, pd.CategoricalDtype)
+    assert sorted(df['targets'].cat.categories) == ['g1.globo.com', 'site1.com.br']
+    assert df['targets'].isna().tolist() == [False, False, False, True]
+    assert df['rank'].dtype == 'Int32'
+    assert df['rank'].tolist()[2:] == [3, 4]
+    assert df['users'].dtype == 'Int64'
+    assert df['bounce_rate'].dtype == 'float64'
+
+
+def test_datas_em_texto_e_timestamps():
+    serie = tipos.converter_data(pd.Series(['2024-03-01', 'inválida']))
+    assert serie.dtype == tipos.TIPO_DATA
+    assert serie.tolist()[0] == datetime.date(2024, 3, 1)
+    assert serie.isna().tolist() == [False, True]
+    assert tipos.converter_data(pd.Series(pd.to_datetime(['2024-04-01']))).tolist() == [datetime.date(2024, 4, 1)]
+
+
+def test_colunas_ja_normalizadas_e_valores_nao_inteiros():
+    df = tipos.normalizar_tipos(resultado(), TIPOS_DB)
+    novamente = tipos.normalizar_tipos(df, TIPOS_DB)
+    assert novamente.dtypes.equals(df.dtypes)
+    pd.testing.assert_frame_equal(novamente, df)
+    categorias = df['targets']
+    assert tipos.converter_dominio(categorias) is categorias
+    media = pd.Series([1.5, 2.0])
+    assert tipos.converter_inteiro(media, 'Int32') is media
+
+
+def test_sem_tipos_do_banco_mantem_inteiros():
+    df = tipos.normalizar_tipos(resultado()[['users', 'bounce_rate']])
+    assert df['users'].dtype == 'int64'
@@ -0,0 +1,85 @@
+# Tipos compactos para os resultados da tabela de tráfego
+#
+# Os DataFrames lidos do PostgreSQL (e da réplica) chegam com datas como objetos
+# Python e inteiros em 64 bits (ou em float, quando há nulos). A normalização é
+# aplicada uma única vez, quando o resultado é carregado, antes de ir para o cache:
+#   - datas viram date32 do Arrow (4 bytes por valor, exibidas e exportadas como data);
+#   - domínios ('targets', 'dominio') viram categorias;
+#   - métricas inteiras usam o inteiro do tipo declarado no banco (smallint -> Int16,
+#     integer -> Int32, bigint -> Int64), com nulos.
+# Os tipos dependem só da coluna, nunca dos valores: todos os blocos de um mesmo
+# resultado têm os mesmos dtypes. Colunas de ponto flutuante ficam em float64 para
+# não alterar os valores exportados.
+
+import pandas as pd
+import pyarrow as pa
+
+import consultas
+import db
+
+# Colunas de data e colunas de domínio da tabela
+COLUNAS_DATA = ['display_date']
+COLUNAS_DOMINIO = ['targets', 'dominio']
+
+TIPO_DATA = pd.ArrowDtype(pa.date32())
+
+# Tipos inteiros declarados no PostgreSQL -> dtype do pandas (inteiros com nulos)
+TIPOS_PANDAS_DB = {
+    'smallint': 'Int16',
+    'integer': 'Int32',
+    'bigint': 'Int64',
+}
+
+
+# Função para converter uma coluna de datas (objetos date, Timestamps ou textos) em date32
+def converter_data(serie):
+    if serie.dtype == TIPO_DATA:
+        return serie
+    if not pd.api.types.is_datetime64_any_dtype(serie.dtype):
+        serie = pd.to_datetime(serie, errors='coerce')
+    return serie.astype(TIPO_DATA)
+
+
+# Função para converter uma coluna de domínios em categoria
+def converter_dominio(serie):
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie
+    return serie.astype('category')
+
+
+# Função para converter uma coluna numérica no inteiro do tipo declarado
+# (colunas que não são inteiras, como agregações com casas decimais, ficam como estão)
+def converter_inteiro(serie, dtype):
+    if serie.dtype == dtype:
+        return serie
+    try:
+        return serie.astype(dtype)
+    except (TypeError, ValueError):
+        return serie
+
+
+# Função para normalizar os tipos de um resultado da tabela (retorna um novo DataFrame)
+# 'tipos_db' traz os tipos declarados no banco ({coluna: data_type}); sem ele, as
+# colunas inteiras ficam com o dtype lido
+def normalizar_tipos(df, tipos_db=None):
+    tipos_db = tipos_db or {}
+    colunas = {}
+    for coluna in df.columns:
+        serie = df[coluna]
+        if coluna in COLUNAS_DATA:
+            colunas[coluna] = converter_data(serie)
+        elif coluna in COLUNAS_DOMINIO:
+            colunas[coluna] = converter_dominio(serie)
+        elif tipos_db.get(coluna) in TIPOS_PANDAS_DB:
+            colunas[coluna] = converter_inteiro(serie, TIPOS_PANDAS_DB[tipos_db[coluna]])
+    if not colunas:
+        return df
+    return df.assign(**colunas)
+
+
+# Função para ler do catálogo do banco os tipos declarados das colunas da tabela
+# ({coluna: data_type}); o app usa o esquema em cache (obter_esquema)
+def ler_tipos_banco():
+    query, params = consultas.montar_consulta_esquema()
+    with db.conexao() as connection:
+        return dict(connection.exec_driver_sql(query, params).fetchall())